@@ -0,0 +1,115 @@
+"""Per-callback cart overhead: SessionStore with and without a persistence backend.
+
+Each simulated callback does what button_handler does around its handler:
+SessionStore.get() for the user's cart, a change to it, and mark_dirty().
+Every `callbacks per flush` callbacks (the callbacks that arrive within one
+CART_FLUSH_INTERVAL) the store is flushed, and that flush's time is spread
+over those callbacks. "after restart" gets every cart from a new store on
+the same backend, so each first callback of a user loads the cart from it.
+
+- memory: no backend, the cost of the store itself
+- sqlite: SQLiteCartBackend on a temporary file
+- postgres: PostgresCartBackend, only when DATABASE_URL is set; it only
+  creates (and drops) the "benchmark" schema
+
+The target is under 1 ms of cart overhead per callback.
+
+Usage:
+    python benchmarks/bench_cart_store.py [callbacks] [users]   # default: 20000 2000
+"""
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+from common import BENCH_OPTIONS, benchmark_schema, database_configured, print_table  # puts the repo root on sys.path
+from catalog import get_catalog
+from config import OrderItem
+from cart_store import PostgresCartBackend, SQLiteCartBackend
+import database
+from database import DATABASE_URL, DB_POOL_MAX_SIZE, DatabasePool
+from session_store import SessionStore
+
+TARGET = 1e-3  # seconds per callback
+FLUSH_BATCHES = (1, 10, 100)
+
+def _items():
+    catalog = get_catalog()
+    level = catalog.sweet_levels[0]
+    return [OrderItem(item.category, item.name, level, item.price) for item in catalog.items]
+
+async def callbacks(store: SessionStore, count: int, users: int, per_flush: int):
+    """Run count callbacks over users, flushing every per_flush; returns (callback seconds, flush seconds)"""
+    items = _items()
+    in_callbacks = in_flushes = 0.0
+    for number in range(count):
+        user_id = number % users
+        start = time.perf_counter()
+        order = await store.get(user_id)
+        if not order.can_add_more():
+            order.clear()
+        order.add_item(items[number % len(items)])
+        store.mark_dirty(user_id)
+        in_callbacks += time.perf_counter() - start
+        if (number + 1) % per_flush == 0:
+            start = time.perf_counter()
+            await store.flush()
+            in_flushes += time.perf_counter() - start
+    start = time.perf_counter()
+    await store.flush()
+    return in_callbacks, in_flushes + time.perf_counter() - start
+
+def _row(name: str, per_flush, count: int, in_callbacks: float, in_flushes: float):
+    total = (in_callbacks + in_flushes) / count
+    return (name, per_flush, f"{in_callbacks / count * 1e6:.1f} us", f"{in_flushes / count * 1e6:.1f} us",
+            f"{total * 1e3:.3f} ms", "yes" if total < TARGET else "NO")
+
+async def run(name: str, make_backend, count: int, users: int):
+    rows = []
+    for per_flush in FLUSH_BATCHES:
+        store = SessionStore(backend=make_backend(), max_sessions=users)
+        if store.backend is not None:
+            await store.backend.open()
+        # Warm up: every user has a cart in memory (and in the backend)
+        await callbacks(store, users, users, users)
+        rows.append(_row(name, per_flush, count, *await callbacks(store, count, users, per_flush)))
+        if store.backend is not None:
+            await store.backend.close()
+
+    if make_backend() is not None:
+        # A restarted bot: the first callback of every user reloads the cart from the backend
+        store = SessionStore(backend=make_backend(), max_sessions=users)
+        await store.backend.open()
+        rows.append(_row(name, "after restart", users, *await callbacks(store, users, users, users)))
+        await store.backend.close()
+    return rows
+
+async def run_postgres(count: int, users: int):
+    # PostgresCartBackend goes through database.primary_pool
+    database.primary_pool = DatabasePool('benchmark', DATABASE_URL, 1, DB_POOL_MAX_SIZE, options=BENCH_OPTIONS)
+    try:
+        return await run("postgres", PostgresCartBackend, count, users)
+    finally:
+        await database.primary_pool.close()
+
+def main(argv):
+    count = int(argv[0]) if argv else 20000
+    users = int(argv[1]) if len(argv) > 1 else 2000
+
+    rows = asyncio.run(run("memory", lambda: None, count, users))
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "carts.db"
+        rows += asyncio.run(run("sqlite", lambda: SQLiteCartBackend(path), count, users))
+    if database_configured():
+        with benchmark_schema():
+            rows += asyncio.run(run_postgres(count, users))
+    else:
+        print("DATABASE_URL is not set, skipping the postgres backend")
+
+    print(f"{count} callbacks over {users} users, target {TARGET * 1e3:g} ms of cart overhead per callback")
+    print_table(("backend", "callbacks per flush", "get + mark_dirty", "flush share", "per callback", "under target"),
+                rows)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
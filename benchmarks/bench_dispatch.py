@@ -0,0 +1,89 @@
+"""Callback dispatch: the original if/elif startswith chain vs parse_callback_data + ROUTES.
+
+Only the routing is timed: turning callback_data into the handler to run
+and its argument, not the handler itself. "before" is the original
+sales_ regex pattern (its CallbackQueryHandler was registered first)
+followed by button_handler's if/elif chain on display-name payloads.
+"after" parses the compact payloads the bot issues now, which includes
+validating the argument and decoding catalog ids, and looks up the route.
+"done" is the Complete button of an open order in the owner feed; "done
+(older)" is one the feed no longer knows, whose format is checked.
+
+Usage:
+    python benchmarks/bench_dispatch.py [iterations]
+"""
+import re
+import sys
+from common import per_call, print_table  # puts the repo root on sys.path
+from catalog import get_catalog
+from config import UserOrder
+from handlers.router import ROUTES, parse_callback_data
+from owner_feed import owner_feed
+
+_SALES_PATTERN = re.compile("^sales_")
+
+def route_before(data: str):
+    if _SALES_PATTERN.match(data):
+        return "sales", data[6:]
+    if data.startswith("store_"):
+        return "store", data[6:]
+    if data == "order_now":
+        return "order_now", None
+    elif data.startswith("cat_"):
+        return "cat", data[4:]
+    elif data.startswith("item_"):
+        return "item", data[5:]
+    elif data.startswith("sweet_"):
+        return "sweet", data[6:]
+    elif data == "order_more":
+        return "order_more", None
+    elif data == "confirm_order":
+        return "confirm_order", None
+    elif data.startswith("pay_"):
+        return "pay", data[4:]
+    elif data.startswith("done_"):
+        return "done", data[5:]
+    return None
+
+def route_after(data: str):
+    action = parse_callback_data(data)
+    if action is None:
+        return None
+    return ROUTES[action.kind].handler, action.arg
+
+def _payloads():
+    """(action, payload before, payload after) for every kind of button"""
+    catalog = get_catalog()
+    category = catalog.categories[-1]
+    item = catalog.items[-1]
+    level = catalog.sweet_levels[-1]
+    pending = owner_feed.add("3fa9c1d2e4b5a6978877665544332211", 123456789, "@boba_fan_99", UserOrder())
+    return [
+        ("store", "store_open", "store_open"),
+        ("order_now", "order_now", "order_now"),
+        ("cat", f"cat_{category}", catalog.category_data(category)),
+        ("item", f"item_{item.name}", catalog.item_data(item)),
+        ("sweet", f"sweet_{level}", catalog.sweetness_data(level)),
+        ("order_more", "order_more", "order_more"),
+        ("confirm_order", "confirm_order", "confirm_order"),
+        ("pay", "pay_aba", "pay_aba"),
+        ("done", "done_123456789", pending.done_data),
+        ("done (older)", "done_123456789", "done_0123456789abcdef0123456789abcdef_123456789"),
+        ("sales", "sales_month", "sales_month"),
+    ]
+
+def main(argv):
+    iterations = int(argv[0]) if argv else 50000
+    rows = []
+    for kind, before_data, after_data in _payloads():
+        assert route_before(before_data)[0] == kind.split()[0] and route_after(after_data) is not None
+        before_time = per_call(lambda: route_before(before_data), iterations)
+        after_time = per_call(lambda: route_after(after_data), iterations)
+        rows.append((kind, f"{before_time * 1e6:.3f} us", f"{after_time * 1e6:.3f} us",
+                     f"{before_time / after_time:.2f}x"))
+    print(f"Callback routing, best of 5 x {iterations} calls")
+    print_table(("action", "before", "after", "speedup"), rows)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
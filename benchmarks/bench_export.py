@@ -0,0 +1,105 @@
+"""Peak memory of /export: COPY streaming vs fetching the range into Python.
+
+Loads synthetic orders into the benchmark schema, then exports ranges of
+increasing size. Each export runs in a fresh interpreter so its peak
+resident size is its own:
+
+- csv: sales_export.export_sales(), COPY streamed to a temporary file
+- parquet: the same plus the block-by-block Parquet conversion (needs pyarrow)
+- fetchall: a cursor.fetchall() of the same rows written with csv.writer,
+  the simple way to build the file; only run up to FETCHALL_LIMIT rows
+
+Needs DATABASE_URL; only the "benchmark" schema is created and dropped.
+
+Usage:
+    python benchmarks/bench_export.py [rows ...]   # default: 1000 5000000
+"""
+import csv
+import json
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from common import (  # puts the repo root on sys.path
+    benchmark_schema, connect, load_sales, mib, peak_rss_bytes, print_table, require_database, rss_bytes, timed
+)
+from sales_export import export_sales, parquet_available
+
+# The fetchall variant holds every row in memory; don't let it take the machine down
+FETCHALL_LIMIT = 1_000_000
+
+def export_fetchall(conn, start: datetime, end: datetime):
+    fd, name = tempfile.mkstemp(prefix="sales-", suffix=".csv")
+    path = Path(name)
+    with conn.cursor() as cur, open(fd, "w", encoding="utf-8", newline="") as f:
+        cur.execute("""
+            SELECT id, created_at, user_id, username, payment_method, total_amount, items
+            FROM sales WHERE created_at >= %s AND created_at < %s ORDER BY created_at, id
+        """, (start, end))
+        rows = cur.fetchall()
+        writer = csv.writer(f)
+        writer.writerow([column.name for column in cur.description])
+        writer.writerows(rows)
+    return path, len(rows)
+
+def child(variant: str, start: str, end: str):
+    """Run one export and print its row count, time and memory as JSON"""
+    conn = connect()
+    try:
+        baseline = rss_bytes()
+        start, end = datetime.fromisoformat(start), datetime.fromisoformat(end)
+        if variant == "fetchall":
+            (path, rows), seconds = timed(export_fetchall, conn, start, end)
+        else:
+            (path, rows), seconds = timed(export_sales, conn, start, end, variant)
+        conn.rollback()
+        size = path.stat().st_size
+        path.unlink()
+    finally:
+        conn.close()
+    print(json.dumps({"rows": rows, "seconds": seconds, "size": size,
+                      "baseline": baseline, "peak": peak_rss_bytes()}))
+
+def _run(variant: str, start: datetime, end: datetime) -> dict:
+    command = [sys.executable, __file__, "--child", variant, start.isoformat(), end.isoformat()]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode:
+        sys.exit(f"{variant} export failed:\n{result.stderr}")
+    return json.loads(result.stdout.splitlines()[-1])
+
+def main(argv):
+    if argv and argv[0] == "--child":
+        child(*argv[1:4])
+        return 0
+
+    require_database()
+    sizes = sorted(int(arg) for arg in argv) or [1000, 5_000_000]
+    total = max(sizes)
+    # Orders are spread evenly, so the first n of them end at first + span * n / total
+    last = datetime.now(timezone.utc).replace(microsecond=0)
+    first = last - timedelta(days=30)
+    variants = ["csv"] + (["parquet"] if parquet_available() else []) + ["fetchall"]
+
+    rows = []
+    with benchmark_schema():
+        conn = connect()
+        try:
+            load_sales(conn, total, first, last, derived=False)
+        finally:
+            conn.close()
+        for size in sizes:
+            end = last if size == total else first + (last - first) * size / total
+            for variant in variants:
+                if variant == "fetchall" and size > FETCHALL_LIMIT:
+                    rows.append((size, variant, "-", "-", "-", f"skipped (over {FETCHALL_LIMIT} rows)"))
+                    continue
+                result = _run(variant, first, end)
+                rows.append((result["rows"], variant, f"{result['seconds']:.2f} s", mib(result["size"]),
+                             mib(result["baseline"]), mib(result["peak"] - result["baseline"])))
+    print("Export of a date range, one process per export")
+    print_table(("rows", "variant", "time", "file", "RSS before", "peak RSS growth"), rows)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,82 @@
+"""Order writes: one transaction per checkout vs the group-commit OrderWriter.
+
+"before" is the original checkout path: every customer awaits its own
+save_order(), one INSERT and one commit per order, with CONCURRENCY
+customers checking out at once through the connection pool. "after"
+queues the same orders on an OrderWriter, which commits them in batches
+of up to ORDER_WRITER_BATCH_SIZE. Both go through the bot's DatabasePool,
+so each order also writes its sales_items rows and rollups.
+
+Needs DATABASE_URL; only the "benchmark" schema is created and dropped.
+
+Usage:
+    python benchmarks/bench_group_commit.py [orders] [concurrency]
+"""
+import asyncio
+import sys
+import time
+from common import BENCH_OPTIONS, benchmark_schema, print_table, require_database  # puts the repo root on sys.path
+from config import ORDER_WRITER_BATCH_SIZE
+import database
+from database import DATABASE_URL, DB_POOL_MAX_SIZE, DatabasePool, save_order
+from order_writer import OrderWriter
+
+ITEMS = [{"category": "Coffee", "item": "Iced Latte", "sweetness": "Normal sweet", "price": 1.25}]
+
+def _order(number: int) -> dict:
+    return dict(user_id=number % 5000, username=f"customer_{number % 5000}", items=ITEMS,
+                total_amount=1.25, payment_method="cash")
+
+async def one_commit_per_order(orders: int, concurrency: int) -> int:
+    numbers = iter(range(orders))
+    saved = 0
+
+    async def customer():
+        nonlocal saved
+        for number in numbers:
+            if await save_order(**_order(number)) is not None:
+                saved += 1
+
+    await asyncio.gather(*(customer() for _ in range(concurrency)))
+    return saved
+
+async def group_commit(orders: int, concurrency: int) -> int:
+    writer = OrderWriter()
+    await writer.start()
+    # Checkouts don't wait for the commit, so every order is queued right away
+    futures = [writer.submit(**_order(number)) for number in range(orders)]
+    rows = await asyncio.gather(*futures)
+    await writer.stop()
+    return sum(row is not None for row in rows)
+
+async def run(orders: int, concurrency: int):
+    pool = DatabasePool('benchmark', DATABASE_URL, 1, DB_POOL_MAX_SIZE, options=BENCH_OPTIONS)
+    # save_orders() goes through database.primary_pool
+    database.primary_pool = pool
+    await pool.open()
+    rows = []
+    try:
+        # Warm up the pool's connections
+        await one_commit_per_order(DB_POOL_MAX_SIZE, DB_POOL_MAX_SIZE)
+        for name, variant in (("before: commit per order", one_commit_per_order), ("after: group commit", group_commit)):
+            start = time.perf_counter()
+            saved = await variant(orders, concurrency)
+            seconds = time.perf_counter() - start
+            rows.append((name, saved, f"{seconds:.2f} s", f"{saved / seconds:.0f}"))
+    finally:
+        await pool.close()
+    return rows
+
+def main(argv):
+    require_database()
+    orders = int(argv[0]) if argv else 5000
+    concurrency = int(argv[1]) if len(argv) > 1 else 50
+    with benchmark_schema():
+        rows = asyncio.run(run(orders, concurrency))
+    print(f"{orders} orders, {concurrency} concurrent checkouts, pool of {DB_POOL_MAX_SIZE}, "
+          f"batches of up to {ORDER_WRITER_BATCH_SIZE}")
+    print_table(("variant", "saved", "time", "orders/s"), rows)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,71 @@
+"""Inline keyboards: built on every callback vs the shared KeyboardRegistry.
+
+"before" builds each keyboard the way the original button_handler did,
+from the menu on every callback. "after" is the attribute lookup on
+keyboards.keyboards. The byte columns are the peak tracemalloc allocation
+of one call. The last column is the to_dict() python-telegram-bot does
+when sending either one, for scale.
+
+Usage:
+    python benchmarks/bench_keyboards.py [iterations]
+"""
+import sys
+from common import per_call, print_table, traced  # puts the repo root on sys.path
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from catalog import get_catalog
+from keyboards import keyboards
+
+def _menu():
+    catalog = get_catalog()
+    return {category: [item.name for item in items] for category, items in catalog.items_by_category.items()}, \
+        list(catalog.sweet_levels)
+
+MENU, SWEET_LEVELS = _menu()
+CATEGORY = next(iter(MENU))
+
+def categories_before():
+    return InlineKeyboardMarkup([[InlineKeyboardButton(cat, callback_data=f"cat_{cat}")] for cat in MENU])
+
+def items_before():
+    return InlineKeyboardMarkup([[InlineKeyboardButton(item, callback_data=f"item_{item}")] for item in MENU[CATEGORY]])
+
+def sweetness_before():
+    return InlineKeyboardMarkup([[InlineKeyboardButton(level, callback_data=f"sweet_{level}")] for level in SWEET_LEVELS])
+
+def order_more_before():
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("🛍️ Order More", callback_data="order_more")],
+        [InlineKeyboardButton("✅ Confirm Order", callback_data="confirm_order")]
+    ])
+
+def payment_before():
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("💵 Pay by Cash", callback_data="pay_cash"),
+        InlineKeyboardButton("🏦 Pay by ABA", callback_data="pay_aba")
+    ]])
+
+CASES = [
+    ("categories", categories_before, lambda: keyboards.categories),
+    ("items", items_before, lambda: keyboards.items[CATEGORY]),
+    ("sweetness", sweetness_before, lambda: keyboards.sweetness),
+    ("order more / confirm", order_more_before, lambda: keyboards.order_more_or_confirm),
+    ("payment", payment_before, lambda: keyboards.payment),
+]
+
+def main(argv):
+    iterations = int(argv[0]) if argv else 20000
+    rows = []
+    for name, before, after in CASES:
+        before_time = per_call(before, iterations)
+        after_time = per_call(after, iterations)
+        _, _, before_peak = traced(before)
+        _, _, after_peak = traced(after)
+        serialize_time = per_call(lambda: after().to_dict(), iterations)
+        rows.append((name, f"{before_time * 1e6:.2f} us", f"{after_time * 1e6:.3f} us",
+                     before_peak, after_peak, f"{serialize_time * 1e6:.2f} us"))
+    print(f"Keyboard per callback, best of 5 x {iterations} calls")
+    print_table(("keyboard", "before", "after", "before bytes", "after bytes", "to_dict()"), rows)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,66 @@
+"""Menu photo upload: the original image vs its optimized variant.
+
+For menu.jpg and every category image in images/ (or the files given on
+the command line) reports the original and variant sizes and the time to
+encode the variant (Pillow), with IMAGE_MAX_SIDE and IMAGE_QUALITY as
+configured. Encoding happens in memory; nothing is written to
+images/.variants.
+
+Uploads are simulated from those sizes: a round trip plus the bytes at the
+uplink speed. Before, the original was uploaded on the first /start after
+every restart (its file_id was only kept in memory). Now the variant is
+encoded and uploaded once per image version ("first send"), both the
+variant and its file_id survive restarts, and every later /start sends
+the cached file_id: one round trip whatever the image size.
+
+Usage:
+    python benchmarks/bench_menu_image.py [image ...]
+"""
+import sys
+from pathlib import Path
+from common import print_table, timed  # puts the repo root on sys.path
+from catalog import get_catalog
+from config import IMAGE_MAX_SIDE, IMAGE_QUALITY, MENU_IMAGE_PATH
+from image_pipeline import Image, _encode, find_category_images
+
+# Uplink speeds to simulate, in megabits per second
+UPLINKS = (2, 10, 50)
+ROUND_TRIP = 0.15  # seconds, bot host to the Bot API
+
+def upload_seconds(size: int, mbps: float) -> float:
+    return ROUND_TRIP + size * 8 / (mbps * 1e6)
+
+def _kb(size: int) -> str:
+    return f"{size / 1024:.0f} KB"
+
+def main(argv):
+    if Image is None:
+        sys.exit("Pillow is not installed (pip install -r requirements.txt)")
+    paths = [Path(arg) for arg in argv] or [MENU_IMAGE_PATH, *find_category_images(get_catalog().categories)]
+
+    sizes, uploads = [], []
+    for path in paths:
+        data = path.read_bytes()
+        # Best of 3: the first decode also pays for loading Pillow's codecs
+        encoded, seconds = min((timed(_encode, data) for _ in range(3)), key=lambda result: result[1])
+        # optimize_image() keeps the original when the variant isn't smaller
+        variant = min(len(encoded), len(data))
+        sizes.append((path.name, _kb(len(data)), _kb(variant), f"{1 - variant / len(data):.0%}",
+                      f"{seconds * 1e3:.0f} ms"))
+        for mbps in UPLINKS:
+            before = upload_seconds(len(data), mbps)
+            first = seconds + upload_seconds(variant, mbps)
+            uploads.append((path.name, f"{mbps} Mbit/s", f"{before * 1e3:.0f} ms",
+                            f"{upload_seconds(variant, mbps) * 1e3:.0f} ms", f"{first * 1e3:.0f} ms",
+                            f"{ROUND_TRIP * 1e3:.0f} ms"))
+
+    print(f"Variants at IMAGE_MAX_SIDE={IMAGE_MAX_SIDE}, IMAGE_QUALITY={IMAGE_QUALITY}")
+    print_table(("image", "original", "variant", "saved", "encode"), sizes)
+    print()
+    print(f"Simulated time to first photo ({ROUND_TRIP * 1e3:.0f} ms round trip + upload)")
+    print_table(("image", "uplink", "original upload", "variant upload", "first send", "after a restart"),
+                uploads)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,88 @@
+"""Menu reload cost for menus of several hundred items.
+
+Generates menu.json files of growing size (10 items per category, the
+current four sweetness levels) in a temporary directory, points MENU_PATH
+at it and times reload_catalog(): reading and validating the file,
+building the MenuCatalog and running every on_catalog_change listener
+(keyboards, the router's payload table and the rendering fragments, which
+prerender one line per item and sweetness level). Each reload changes one
+price so the version changes and the listeners run. The listeners are also
+timed one by one on the new catalog.
+
+Usage:
+    python benchmarks/bench_menu_reload.py [items ...]   # default: 12 100 300 600
+"""
+import asyncio
+import json
+import logging
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from common import print_table  # puts the repo root on sys.path
+
+ITEMS_PER_CATEGORY = 10
+SWEET_LEVELS = ["More sweet", "Normal sweet", "Less sweet", "No sweet"]
+RELOADS = 20
+
+def write_menu(path: Path, items: int, revision: int = 0):
+    categories = {}
+    for number in range(items):
+        category = categories.setdefault(f"Category {number // ITEMS_PER_CATEGORY + 1}", {})
+        category[f"Drink number {number + 1}"] = 1.25 + (number % 4) * 0.25
+    # A different price per revision, so every reload is a new menu version
+    categories["Category 1"]["Drink number 1"] = 1.0 + revision / 100
+    document = {"max_drinks_per_order": 4, "sweet_levels": SWEET_LEVELS, "categories": categories}
+    path.write_text(json.dumps(document, indent=4), encoding="utf-8")
+
+# config.py reads these at import, and the catalog loads the file then
+MENU_DIR = Path(tempfile.mkdtemp(prefix="bench-menu-"))
+MENU_FILE = MENU_DIR / "menu.json"
+write_menu(MENU_FILE, ITEMS_PER_CATEGORY)
+os.environ["MENU_PATH"] = str(MENU_FILE)
+os.environ["MENU_SOURCE"] = "file"
+
+import catalog
+from catalog import reload_catalog
+from config import logger
+# Importing these registers their on_catalog_change listeners
+import handlers.router, keyboards, rendering  # noqa: E401,F401
+
+def _median_ms(samples) -> str:
+    return f"{statistics.median(samples) * 1e3:.2f} ms"
+
+async def measure(items: int, listeners):
+    reloads, per_listener = [], {name: [] for name, _ in listeners}
+    for revision in range(1, RELOADS + 1):
+        write_menu(MENU_FILE, items, revision)
+        changed, current, seconds = await reload_catalog()
+        assert changed and len(current.items) == items
+        reloads.append(seconds)
+        for name, listener in listeners:
+            start = time.perf_counter()
+            listener(current)
+            per_listener[name].append(time.perf_counter() - start)
+    return reloads, per_listener
+
+def main(argv):
+    sizes = [int(arg) for arg in argv] or [12, 100, 300, 600]
+    # Every reload logs the swap
+    logger.setLevel(logging.WARNING)
+    listeners = [(f"{listener.__module__}.{listener.__qualname__}", listener) for listener in catalog._listeners]
+    rows = []
+    try:
+        for items in sizes:
+            reloads, per_listener = asyncio.run(measure(items, listeners))
+            rows.append((items, _median_ms(reloads), *(_median_ms(samples) for samples in per_listener.values())))
+    finally:
+        shutil.rmtree(MENU_DIR)
+
+    print(f"reload_catalog() from menu.json, median of {RELOADS} reloads; listeners also timed on their own")
+    print_table(("items", "reload_catalog", *(name for name, _ in listeners)), rows)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,112 @@
+"""Partition pruning: monthly partitioned sales vs one unpartitioned table.
+
+Loads two years of synthetic orders into the partitioned sales table of
+the benchmark schema and copies them into sales_flat, an unpartitioned
+table with the same created_at index (the schema before partitioning).
+Each query is timed on both (best of 3, warm cache), and EXPLAIN shows how
+many sales partitions the partitioned plan still reads. The last row
+retires the oldest month: a DELETE on the flat table vs detaching and
+dropping its partition, as SALES_RETENTION_ACTION=drop does (both rolled
+back afterwards).
+
+Needs DATABASE_URL; only the "benchmark" schema is created and dropped.
+
+Usage:
+    python benchmarks/bench_partitions.py [orders]   # default: 3000000
+"""
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+from common import benchmark_schema, connect, load_sales, print_table, require_database, timed
+from partitions import add_months, month_start, partition_name
+
+REPEAT = 3
+
+QUERIES = {
+    "one month, totals": "SELECT SUM(total_amount), COUNT(*) FROM {table} WHERE created_at >= %s AND created_at < %s",
+    "one day, rows": "SELECT * FROM {table} WHERE created_at >= %s AND created_at < %s",
+    "one month, per customer": """
+        SELECT user_id, COUNT(*) FROM {table}
+        WHERE created_at >= %s AND created_at < %s
+        GROUP BY user_id ORDER BY 2 DESC LIMIT 10
+    """,
+}
+
+def _relations(plan: dict) -> set:
+    relations = {plan["Relation Name"]} if "Relation Name" in plan else set()
+    for child in plan.get("Plans", ()):
+        relations |= _relations(child)
+    return relations
+
+def scanned_partitions(cur, sql: str, params) -> int:
+    cur.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return len(_relations(plan[0]["Plan"]))
+
+def best_time(cur, sql: str, params) -> float:
+    def run():
+        cur.execute(sql, params)
+        return cur.fetchall()
+    return min(timed(run)[1] for _ in range(REPEAT))
+
+def retire_time(conn, statements) -> float:
+    def run():
+        with conn.cursor() as cur:
+            for sql, params in statements:
+                cur.execute(sql, params)
+    seconds = timed(run)[1]
+    conn.rollback()
+    return seconds
+
+def main(argv):
+    require_database()
+    orders = int(argv[0]) if argv else 3_000_000
+    now = datetime.now(timezone.utc)
+    first = add_months(month_start(now), -24)
+    # A month and a day in the middle of the data
+    month = add_months(first, 12)
+    day = month + timedelta(days=14)
+    ranges = {
+        "one month, totals": (month, add_months(month, 1)),
+        "one day, rows": (day, day + timedelta(days=1)),
+        "one month, per customer": (month, add_months(month, 1)),
+    }
+
+    with benchmark_schema():
+        conn = connect()
+        try:
+            load_sales(conn, orders, first, now, derived=False)
+            with conn.cursor() as cur:
+                cur.execute("CREATE TABLE sales_flat AS SELECT * FROM sales")
+                cur.execute("CREATE INDEX idx_sales_flat_created_at ON sales_flat (created_at)")
+                cur.execute("ANALYZE sales_flat")
+                cur.execute("SELECT COUNT(*) FROM pg_inherits WHERE inhparent = 'sales'::regclass")
+                partitions = cur.fetchone()[0]
+                conn.commit()
+
+                rows = []
+                for name, sql in QUERIES.items():
+                    params = ranges[name]
+                    flat_sql, partitioned_sql = sql.format(table="sales_flat"), sql.format(table="sales")
+                    flat_time = best_time(cur, flat_sql, params)
+                    partitioned_time = best_time(cur, partitioned_sql, params)
+                    rows.append((name, f"{flat_time * 1000:.1f} ms", f"{partitioned_time * 1000:.1f} ms",
+                                 f"{scanned_partitions(cur, partitioned_sql, params)} of {partitions}"))
+                conn.rollback()
+
+            flat_time = retire_time(conn, [("DELETE FROM sales_flat WHERE created_at < %s", (add_months(first, 1),))])
+            oldest = partition_name(first)
+            partitioned_time = retire_time(conn, [(f"ALTER TABLE sales DETACH PARTITION {oldest}", ()),
+                                                  (f"DROP TABLE {oldest}", ())])
+            rows.append(("retire the oldest month", f"{flat_time * 1000:.1f} ms", f"{partitioned_time * 1000:.1f} ms", "-"))
+        finally:
+            conn.close()
+
+    print(f"{orders} orders over 24 months, best of {REPEAT}")
+    print_table(("query", "unpartitioned", "partitioned", "partitions read"), rows)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
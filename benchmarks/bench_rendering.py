@@ -0,0 +1,114 @@
+"""MarkdownV2 rendering: the old per-message replace chains vs rendering.py.
+
+The "before" functions are the implementations the handlers used before
+rendering.py (a .replace() per special character and += concatenation).
+They left item names and sweetness levels unescaped in the customer's
+summary, so they are also timed with every field run through the old
+escape_markdown ("before, escaped"), which is what correct output cost.
+All three are timed on the same carts of 1 to 4 drinks. The owner's
+header is cached per customer, so it is also timed with a new customer for
+every message.
+
+Usage:
+    python benchmarks/bench_rendering.py [iterations]
+"""
+import itertools
+import sys
+from common import per_call, print_table  # puts the repo root on sys.path
+from config import OrderItem, PaymentMethod
+from catalog import get_catalog
+from rendering import escape, render_order_summary, render_owner_order
+
+def escape_markdown(text: str) -> str:
+    special_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
+    for char in special_chars:
+        text = text.replace(char, f"\\{char}")
+    return text
+
+def format_order_summary_before(items, total: float, escaper=str) -> str:
+    summary = "🧋 *Your Order:*\n\n"
+    for idx, item in enumerate(items, 1):
+        price_str = f"{item.price:.2f}".replace(".", "\\.")
+        summary += f"{idx}\\. {escaper(item.item)} \\- {escaper(item.sweetness)} \\- \\${price_str}\n"
+    total_str = f"{total:.2f}".replace(".", "\\.")
+    summary += f"\n💰 *Total: \\${total_str}*"
+    return summary
+
+def owner_order_before(user_id: int, username: str, items, total: float, payment_method: str,
+                       escaped: bool = False) -> str:
+    if escaped:
+        escaped_username = escape_markdown(username)
+    else:
+        escaped_username = username.replace("_", "\\_").replace("*", "\\*").replace("[", "\\[").replace("]", "\\]")\
+            .replace(".", "\\.").replace("(", "\\(").replace(")", "\\)").replace("`", "\\`")
+    if username.startswith("@"):
+        username_link = f"[{escaped_username}](https://t\\.me/{username[1:]})"
+    else:
+        username_link = f"[{escaped_username}](tg://user?id={user_id})"
+    msg = f"📥 *New Order Received from* {username_link}\\!\n\n"
+    for idx, item in enumerate(items, 1):
+        escaped_item = item.item.replace("_", "\\_").replace("*", "\\*").replace("[", "\\[").replace("]", "\\]")\
+            .replace("`", "\\`")
+        escaped_sweet = item.sweetness.replace("_", "\\_").replace("*", "\\*").replace("[", "\\[")\
+            .replace("]", "\\]").replace("`", "\\`")
+        price_str = f"{item.price:.2f}".replace(".", "\\.")
+        msg += f"{idx}\\. `{escaped_item}` \\- `{escaped_sweet}` \\- \\${price_str}\n"
+    total_str = f"{total:.2f}".replace(".", "\\.")
+    msg += f"\n💰 *Total: \\${total_str}*"
+    payment_info = "💵 *Payment Method:* `Cash`" if payment_method == PaymentMethod.CASH \
+        else "🏦 *Payment Method:* `ABA Pay`"
+    msg += f"\n{payment_info}"
+    return msg
+
+def _carts():
+    catalog = get_catalog()
+    menu = catalog.items
+    carts = []
+    for size in range(1, catalog.max_drinks_per_order + 1):
+        items = [
+            OrderItem(item.category, item.name, catalog.sweet_levels[i % len(catalog.sweet_levels)], item.price)
+            for i, item in enumerate(menu[size:size * 2])
+        ]
+        carts.append((items, sum(item.price for item in items)))
+    return carts
+
+def main(argv):
+    iterations = int(argv[0]) if argv else 20000
+    carts = _carts()
+    username = "@boba_fan_99"
+    text = "Strawberry Matcha (large) - 50% sweet!"
+    customers = itertools.count(1000)
+
+    cases = [
+        ("escape one string", lambda: escape_markdown(text), None, lambda: escape(text)),
+        ("customer order summary",
+         lambda: [format_order_summary_before(items, total) for items, total in carts],
+         lambda: [format_order_summary_before(items, total, escape_markdown) for items, total in carts],
+         lambda: [render_order_summary(items, total) for items, total in carts]),
+        ("owner order message",
+         lambda: [owner_order_before(7, username, items, total, "cash") for items, total in carts],
+         lambda: [owner_order_before(7, username, items, total, "cash", escaped=True) for items, total in carts],
+         lambda: [render_owner_order("3FA9C1", 7, username, items, total, "cash") for items, total in carts]),
+        ("owner order, new customers",
+         lambda: [owner_order_before(next(customers), username, items, total, "cash") for items, total in carts],
+         lambda: [owner_order_before(next(customers), username, items, total, "cash", escaped=True)
+                  for items, total in carts],
+         lambda: [render_owner_order("3FA9C1", next(customers), username, items, total, "cash")
+                  for items, total in carts]),
+    ]
+    rows = []
+    for name, before, before_escaped, after in cases:
+        before_time = per_call(before, iterations)
+        escaped_time = per_call(before_escaped, iterations) if before_escaped else None
+        after_time = per_call(after, iterations)
+        rows.append((
+            name, f"{before_time * 1e6:.2f} us",
+            f"{escaped_time * 1e6:.2f} us" if escaped_time else "-",
+            f"{after_time * 1e6:.2f} us", f"{(escaped_time or before_time) / after_time:.2f}x"
+        ))
+    print(f"Rendering, best of 5 x {iterations} calls ({len(carts)} carts per call for whole messages)")
+    print_table(("case", "before", "before, escaped", "after", "vs escaped"), rows)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,88 @@
+"""Sales summary: SELECT * plus a Python loop vs SQL aggregation vs the rollups.
+
+For each table size, a year of synthetic orders is loaded into the
+benchmark schema and the "overall" and "month" summaries are computed
+three ways:
+
+- before: the original get_sales_summary query (every row of the period
+  through a RealDictCursor, totals and item counts in Python)
+- sql: database._aggregate_sales_since (SUM/COUNT in Postgres, item counts
+  from the sales_items index)
+- rollups: rollups.aggregate_rollups_since, what reports use now
+
+Needs DATABASE_URL; only the "benchmark" schema is created and dropped.
+
+Usage:
+    python benchmarks/bench_sales_summary.py [orders ...]   # default: 10000 100000 1000000
+"""
+import sys
+from datetime import datetime, timedelta, timezone
+from psycopg2.extras import RealDictCursor
+from common import benchmark_schema, connect, load_sales, print_table, require_database, timed
+from database import _aggregate_sales_since, period_start
+from rollups import aggregate_rollups_since
+
+REPEAT = 3
+
+def summary_before(conn, start_date: datetime):
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+            SELECT * FROM sales
+            WHERE created_at >= %s
+            ORDER BY created_at DESC
+        """, (start_date,))
+        orders = cur.fetchall()
+    total_sales = sum(float(order['total_amount']) for order in orders)
+    total_orders = len(orders)
+    items_sold = {}
+    for order in orders:
+        for item in order['items']:
+            item_name = item.get('item')
+            if item_name:
+                items_sold[item_name] = items_sold.get(item_name, 0) + 1
+    items_sold = dict(sorted(items_sold.items(), key=lambda x: x[1], reverse=True))
+    return total_sales, total_orders, items_sold
+
+METHODS = (
+    ("before", summary_before),
+    ("sql", _aggregate_sales_since),
+    ("rollups", aggregate_rollups_since),
+)
+
+def best_time(conn, func, start_date: datetime):
+    times = []
+    for _ in range(REPEAT):
+        result, seconds = timed(func, conn, start_date)
+        conn.rollback()
+        times.append(seconds)
+    return result, min(times)
+
+def main(argv):
+    require_database()
+    sizes = [int(arg) for arg in argv] or [10_000, 100_000, 1_000_000]
+    now = datetime.now(timezone.utc)
+    rows = []
+    for size in sizes:
+        with benchmark_schema():
+            conn = connect()
+            try:
+                load_sales(conn, size, now - timedelta(days=365), now)
+                for period in ("overall", "month"):
+                    start_date = period_start(period, now)
+                    results = {}
+                    for name, func in METHODS:
+                        result, seconds = best_time(conn, func, start_date)
+                        results[name] = (result, seconds)
+                    # All three must agree, or the comparison means nothing
+                    orders = {result[1] for result, _ in results.values()}
+                    assert len(orders) == 1, f"methods disagree on the order count: {orders}"
+                    rows.append((size, period, orders.pop(),
+                                 *(f"{results[name][1] * 1000:.1f} ms" for name, _ in METHODS)))
+            finally:
+                conn.close()
+    print(f"Sales summary, best of {REPEAT}")
+    print_table(("orders", "period", "in period", *(name for name, _ in METHODS)), rows)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,97 @@
+"""Memory of a growing read: cursor.fetchall() vs server_cursor.iter_rows().
+
+Loads synthetic orders into the benchmark schema, then reads the
+sales_items rows of ranges of increasing size and counts the drinks sold
+per item in Python, the way the reports aggregate. Each read runs in a
+fresh interpreter so its peak resident size is its own:
+
+- fetchall: a client-side cursor; libpq receives the whole result and
+  fetchall() turns all of it into tuples before the first is counted
+- iter_rows: a named cursor fetching STREAM_BATCH_SIZE rows per round trip
+
+The reports themselves group in SQL and read one row per item; this reads
+one row per drink so the result grows with history.
+
+Needs DATABASE_URL; only the "benchmark" schema is created and dropped.
+
+Usage:
+    python benchmarks/bench_server_cursor.py [orders ...]   # default: 10000 100000 1000000
+"""
+import json
+import subprocess
+import sys
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from common import (  # puts the repo root on sys.path
+    benchmark_schema, connect, load_sales, mib, peak_rss_bytes, print_table, require_database, rss_bytes, timed
+)
+from server_cursor import STREAM_BATCH_SIZE, iter_rows
+
+QUERY = "SELECT item, sweetness FROM sales_items WHERE created_at >= %s AND created_at < %s"
+
+def count_fetchall(conn, start: datetime, end: datetime):
+    with conn.cursor() as cur:
+        cur.execute(QUERY, (start, end))
+        rows = cur.fetchall()
+    return len(rows), Counter(item for item, _ in rows)
+
+def count_iter_rows(conn, start: datetime, end: datetime):
+    rows = 0
+    counts = Counter()
+    for item, _ in iter_rows(conn, QUERY, (start, end)):
+        rows += 1
+        counts[item] += 1
+    return rows, counts
+
+VARIANTS = {"fetchall": count_fetchall, "iter_rows": count_iter_rows}
+
+def child(variant: str, start: str, end: str):
+    """Run one read and print its row count, time and memory as JSON"""
+    conn = connect()
+    try:
+        baseline = rss_bytes()
+        start, end = datetime.fromisoformat(start), datetime.fromisoformat(end)
+        (rows, _), seconds = timed(VARIANTS[variant], conn, start, end)
+        conn.rollback()
+    finally:
+        conn.close()
+    print(json.dumps({"rows": rows, "seconds": seconds, "baseline": baseline, "peak": peak_rss_bytes()}))
+
+def _run(variant: str, start: datetime, end: datetime) -> dict:
+    command = [sys.executable, __file__, "--child", variant, start.isoformat(), end.isoformat()]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode:
+        sys.exit(f"{variant} read failed:\n{result.stderr}")
+    return json.loads(result.stdout.splitlines()[-1])
+
+def main(argv):
+    if argv and argv[0] == "--child":
+        child(*argv[1:4])
+        return 0
+
+    require_database()
+    sizes = sorted(int(arg) for arg in argv) or [10_000, 100_000, 1_000_000]
+    total = max(sizes)
+    # Orders are spread evenly, so the first n of them end at first + span * n / total
+    last = datetime.now(timezone.utc).replace(microsecond=0)
+    first = last - timedelta(days=30)
+
+    rows = []
+    with benchmark_schema():
+        conn = connect()
+        try:
+            load_sales(conn, total, first, last)
+        finally:
+            conn.close()
+        for size in sizes:
+            end = last + timedelta(seconds=1) if size == total else first + (last - first) * size / total
+            for variant in VARIANTS:
+                result = _run(variant, first, end)
+                rows.append((size, result["rows"], variant, f"{result['seconds']:.2f} s",
+                             mib(result["baseline"]), mib(result["peak"] - result["baseline"])))
+    print(f"Per-item count over sales_items rows, batches of {STREAM_BATCH_SIZE}, one process per read")
+    print_table(("orders", "rows", "variant", "time", "RSS before", "peak RSS growth"), rows)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
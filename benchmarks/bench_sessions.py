@@ -0,0 +1,107 @@
+"""Memory held by abandoned carts: a plain dict of unslotted orders vs SessionStore.
+
+Simulates users who pick a drink and never check out. "before" is
+the original handler state: a dict that keeps every cart forever, orders
+without __slots__, and names sliced out of each callback's data (a new
+string per cart). "after, unbounded" is the slotted, interned classes in a
+SessionStore too large to evict, and "after" is SessionStore with its
+default SESSION_MAX_CARTS bound. Each variant runs in a fresh interpreter
+so resident-size deltas don't include the others' garbage.
+
+Usage:
+    python benchmarks/bench_sessions.py [carts]
+"""
+import asyncio
+import json
+import subprocess
+import sys
+from typing import List
+from common import mib, print_table, rss_bytes, traced  # puts the repo root on sys.path
+from config import OrderItem, OrderState, SESSION_MAX_CARTS
+from catalog import get_catalog
+from session_store import SessionStore
+
+class OrderItemBefore:
+    def __init__(self, category: str, item: str = None, sweetness: str = None, price: float = 0.0):
+        self.category = category
+        self.item = item
+        self.sweetness = sweetness
+        self.price = price
+
+class UserOrderBefore:
+    def __init__(self):
+        self.items: List[OrderItemBefore] = []
+        self.current_item: OrderItemBefore = None
+        self.state: str = OrderState.SELECTING_CATEGORY
+        self.payment_method: str = None
+
+def _choices(carts: int):
+    """(user id, category/item/sweetness callback data the user tapped, price) per cart"""
+    catalog = get_catalog()
+    for user_id in range(carts):
+        item = catalog.items[user_id % len(catalog.items)]
+        level = catalog.sweet_levels[user_id % len(catalog.sweet_levels)]
+        yield user_id, f"cat_{item.category}", f"item_{item.name}", f"sweet_{level}", item.price
+
+def fill_before(carts: int):
+    user_orders = {}
+    for user_id, cat_data, item_data, sweet_data, price in _choices(carts):
+        order = UserOrderBefore()
+        # The old handlers split names out of callback data, so every cart has its own copies
+        order.current_item = OrderItemBefore(cat_data[4:], item_data[5:], sweet_data[6:], price)
+        order.items.append(order.current_item)
+        order.current_item = None
+        order.state = OrderState.CONFIRMING_ORDER
+        user_orders[user_id] = order
+    return user_orders
+
+def fill_after(carts: int, max_sessions: int):
+    store = SessionStore(max_sessions=max_sessions)
+
+    async def fill():
+        for user_id, cat_data, item_data, sweet_data, price in _choices(carts):
+            order = await store.get(user_id)
+            order.current_item = OrderItem(cat_data[4:], item_data[5:], sweet_data[6:], price)
+            order.add_item(order.current_item)
+            order.state = OrderState.CONFIRMING_ORDER
+
+    asyncio.run(fill())
+    return store
+
+def measure(variant: str, carts: int, trace: bool) -> dict:
+    fill = {
+        "before": lambda: fill_before(carts),
+        "after, unbounded": lambda: fill_after(carts, carts + 1),
+        "after": lambda: fill_after(carts, SESSION_MAX_CARTS),
+    }[variant]
+    if trace:
+        held, allocated, _ = traced(fill)
+        return {"kept": len(held), "allocated": allocated}
+    rss_before = rss_bytes()
+    held = fill()
+    return {"kept": len(held), "rss": rss_bytes() - rss_before}
+
+def _run(variant: str, carts: int, trace: bool) -> dict:
+    # tracemalloc inflates resident size, so allocations and RSS come from separate runs
+    command = [sys.executable, __file__, "--variant", variant, str(carts)] + (["--trace"] if trace else [])
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+def main(argv):
+    if argv and argv[0] == "--variant":
+        print(json.dumps(measure(argv[1], int(argv[2]), "--trace" in argv)))
+        return 0
+
+    carts = int(argv[0]) if argv else 100_000
+    rows = []
+    for variant in ("before", "after, unbounded", "after"):
+        allocated = _run(variant, carts, trace=True)
+        resident = _run(variant, carts, trace=False)
+        rows.append((variant, allocated["kept"], mib(allocated["allocated"]), mib(resident["rss"]),
+                     f"{resident['rss'] / carts:.0f}"))
+    print(f"{carts} abandoned carts, one drink each")
+    print_table(("variant", "carts kept", "allocated", "RSS growth", "resident bytes/cart"), rows)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,120 @@
+"""Load test of the webhook endpoint: concurrent POSTs of synthetic callback updates.
+
+Starts webhook_server.start_http_server() in webhook mode for an
+Application built without an updater (as main.py does for BOT_MODE=webhook)
+and POSTs synthetic callback_query updates to WEBHOOK_PATH from
+`concurrency` clients at once. A consumer drains the application's update
+queue, so an update counts once the handler has parsed and queued it; no
+handler runs and nothing is sent to Telegram. The same load is then sent
+without the secret token header, which must be answered with 403.
+
+The clients share the server's event loop and CPU, so the numbers are a
+lower bound on what the endpoint alone can take.
+
+Usage:
+    python benchmarks/bench_webhook.py [updates] [concurrency]   # default: 5000 50
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import sys
+import time
+from common import print_table  # puts the repo root on sys.path
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+# config.py reads these at import
+os.environ["PORT"] = str(_free_port())
+os.environ["WEBHOOK_SECRET"] = "benchmark-secret"
+
+from tornado.httpclient import AsyncHTTPClient
+from telegram.ext import ApplicationBuilder
+from config import PORT, WEBHOOK_PATH, WEBHOOK_SECRET
+from webhook_server import start_http_server, stop_http_server
+
+URL = f"http://127.0.0.1:{PORT}{WEBHOOK_PATH}"
+
+def _update(number: int) -> bytes:
+    user = {"id": 1000 + number % 500, "is_bot": False, "first_name": "Customer"}
+    return json.dumps({
+        "update_id": number,
+        "callback_query": {
+            "id": str(number),
+            "from": user,
+            "chat_instance": "1",
+            "data": "order_now",
+            "message": {"message_id": number, "date": 0, "chat": {"id": user["id"], "type": "private"},
+                        "text": "Menu"},
+        },
+    }).encode()
+
+def _percentile(values, fraction: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+async def load(updates: int, concurrency: int, headers: dict):
+    """POST updates from concurrency clients; returns (seconds, latencies, status counts)"""
+    client = AsyncHTTPClient(max_clients=concurrency)
+    bodies = [_update(number) for number in range(updates)]
+    numbers = iter(range(updates))
+    latencies = []
+    statuses = {}
+
+    async def sender():
+        for number in numbers:
+            start = time.perf_counter()
+            response = await client.fetch(URL, method="POST", body=bodies[number], headers=headers,
+                                          raise_error=False)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.code] = statuses.get(response.code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(sender() for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+    return seconds, sorted(latencies), statuses
+
+async def run(updates: int, concurrency: int):
+    app = ApplicationBuilder().token("0:benchmark").updater(None).build()
+    received = 0
+
+    async def consume():
+        nonlocal received
+        while True:
+            await app.update_queue.get()
+            received += 1
+
+    # One access log line per rejected request would swamp the output
+    logging.getLogger("tornado.access").setLevel(logging.ERROR)
+    consumer = asyncio.create_task(consume())
+    start_http_server(app, webhook=True)
+    rows = []
+    try:
+        for name, headers in (("with secret token", {"X-Telegram-Bot-Api-Secret-Token": WEBHOOK_SECRET,
+                                                      "Content-Type": "application/json"}),
+                              ("without token", {"Content-Type": "application/json"})):
+            before = received
+            seconds, latencies, statuses = await load(updates, concurrency, headers)
+            await asyncio.sleep(0)
+            rows.append((name, " ".join(f"{code}: {count}" for code, count in sorted(statuses.items())),
+                         received - before, f"{updates / seconds:.0f}",
+                         f"{_percentile(latencies, 0.5) * 1e3:.2f} ms", f"{_percentile(latencies, 0.95) * 1e3:.2f} ms",
+                         f"{_percentile(latencies, 0.99) * 1e3:.2f} ms"))
+    finally:
+        consumer.cancel()
+        await stop_http_server()
+    return rows
+
+def main(argv):
+    updates = int(argv[0]) if argv else 5000
+    concurrency = int(argv[1]) if len(argv) > 1 else 50
+    rows = asyncio.run(run(updates, concurrency))
+    print(f"{updates} callback updates POSTed to {WEBHOOK_PATH}, {concurrency} concurrent clients")
+    print_table(("request", "responses", "queued", "requests/s", "p50", "p95", "p99"), rows)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
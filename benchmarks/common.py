@@ -0,0 +1,181 @@
+"""Shared helpers for the benchmark scripts.
+
+Importing this module puts the repository root on sys.path and loads .env,
+so `python benchmarks/<script>.py` imports the bot's modules the way
+main.py does. BOT_TOKEN, OWNER_CHAT_ID and DATABASE_URL get placeholders
+when they are unset: config.py and database.py need them at import, no
+benchmark talks to Telegram, and the pure-Python ones never connect.
+Database benchmarks call require_database() first, and work in their own
+"benchmark" schema (search_path), which they recreate with the bot's
+migrations and drop afterwards, so the bot's tables are never touched.
+"""
+import gc
+import os
+import resource
+import sys
+import time
+import timeit
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Sequence, Tuple
+from dotenv import load_dotenv
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+load_dotenv(ROOT / ".env")
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("OWNER_CHAT_ID", "1")
+_DATABASE_CONFIGURED = bool(os.getenv("DATABASE_URL"))
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/benchmark-placeholder")
+
+def database_configured() -> bool:
+    """True when DATABASE_URL was set rather than given the placeholder"""
+    return _DATABASE_CONFIGURED
+
+def require_database():
+    if not database_configured():
+        sys.exit("Set DATABASE_URL (in the environment or .env) to a Postgres database to benchmark against")
+
+BENCH_SCHEMA = "benchmark"
+BENCH_OPTIONS = f"-c search_path={BENCH_SCHEMA}"
+
+# Orders per INSERT when loading synthetic sales
+LOAD_CHUNK = 500_000
+
+def connect():
+    """New connection to DATABASE_URL that works in the benchmark schema"""
+    import psycopg2
+    return psycopg2.connect(os.environ["DATABASE_URL"], options=BENCH_OPTIONS)
+
+def _execute(statement: str):
+    conn = connect()
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(statement)
+    finally:
+        conn.close()
+
+@contextmanager
+def benchmark_schema():
+    """Recreate the benchmark schema with the bot's migrations applied, and drop it on exit"""
+    from migrations import apply_migrations
+    _execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+    _execute(f"CREATE SCHEMA {BENCH_SCHEMA}")
+    try:
+        conn = connect()
+        try:
+            apply_migrations(conn)
+        finally:
+            conn.close()
+        yield
+    finally:
+        _execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+
+def load_sales(conn, orders: int, first: datetime, last: datetime, derived: bool = True) -> int:
+    """Add synthetic one-drink orders spread evenly over [first, last), with their line items and rollups.
+
+    Orders cycle through the menu, sweetness levels and 5000 customers.
+    derived=False skips sales_items and the rollups. Returns how many orders
+    the tables hold afterwards.
+    """
+    from catalog import get_catalog
+    from partitions import PARTITIONED_TABLES, create_partitions_between
+    from rollups import rebuild_rollups
+    from sales_items import rebuild_sale_items
+
+    catalog = get_catalog()
+    menu = {
+        "categories": [item.category for item in catalog.items],
+        "items": [item.name for item in catalog.items],
+        "prices": [item.price for item in catalog.items],
+        "levels": list(catalog.sweet_levels),
+        "first": first,
+        "last": last,
+        "orders": orders,
+    }
+    with conn.cursor() as cur:
+        for table in PARTITIONED_TABLES:
+            create_partitions_between(cur, first, last, table)
+        conn.commit()
+        for offset in range(0, orders, LOAD_CHUNK):
+            cur.execute("""
+                INSERT INTO sales (user_id, username, items, total_amount, payment_method, created_at)
+                SELECT (g %% 5000)::text,
+                       'customer_' || (g %% 5000),
+                       jsonb_build_array(jsonb_build_object(
+                           'category', m.categories[1 + g %% m.n],
+                           'item', m.items[1 + g %% m.n],
+                           'sweetness', m.levels[1 + g %% cardinality(m.levels)],
+                           'price', m.prices[1 + g %% m.n]
+                       )),
+                       m.prices[1 + g %% m.n],
+                       CASE WHEN g %% 3 = 0 THEN 'cash' ELSE 'aba' END,
+                       %(first)s::timestamptz + (%(last)s::timestamptz - %(first)s::timestamptz) * (g::float8 / %(orders)s)
+                FROM generate_series(%(offset)s, %(end)s - 1) AS g,
+                     (SELECT %(categories)s::text[] AS categories, %(items)s::text[] AS items,
+                             %(prices)s::numeric[] AS prices, %(levels)s::text[] AS levels,
+                             cardinality(%(items)s::text[]) AS n) AS m
+            """, {**menu, "offset": offset, "end": min(offset + LOAD_CHUNK, orders)})
+            conn.commit()
+        if derived:
+            rebuild_sale_items(conn)
+            rebuild_rollups(conn)
+            conn.commit()
+        cur.execute("SELECT COUNT(*) FROM sales")
+        total = cur.fetchone()[0]
+    conn.commit()
+    # Fresh statistics, or the planner guesses at the new rows
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE sales, sales_items, sales_rollup_daily, sales_rollup_daily_items")
+    finally:
+        conn.autocommit = False
+    return total
+
+def per_call(func: Callable, number: int = 10000, repeat: int = 5) -> float:
+    """Best-of-repeat seconds per call of func()"""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+def timed(func: Callable, *args) -> Tuple[object, float]:
+    """(result, seconds) of one call"""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def traced(func: Callable, *args) -> Tuple[object, int, int]:
+    """(result, bytes func left allocated, peak bytes while it ran), measured with tracemalloc"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = func(*args)
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, current, peak
+
+def rss_bytes() -> int:
+    """Current resident set size (Linux)"""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def mib(size: float) -> str:
+    return f"{size / (1024 * 1024):.1f} MiB"
+
+def print_table(headers: Sequence[str], rows: List[Sequence]):
+    cells = [list(map(str, headers))] + [[str(cell) for cell in row] for row in rows]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(headers))]
+    for index, row in enumerate(cells):
+        print("  ".join(cell.rjust(width) if i else cell.ljust(width) for i, (cell, width) in enumerate(zip(row, widths))))
+        if index == 0:
+            print("  ".join("-" * width for width in widths))
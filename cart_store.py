@@ -0,0 +1,136 @@
+"""Persistence backends for in-progress carts.
+
+Backends store each user's serialized UserOrder together with the wall-clock
+time it was last written. They are only used by SessionStore, which keeps
+the hot copy in memory and batches writes.
+"""
+import asyncio
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from psycopg2.extras import execute_values
+from config import logger, CART_BACKEND, CART_DB_PATH
+from database import init_db_pool, run_in_transaction
+
+class SQLiteCartBackend:
+    """Carts in a local SQLite file (WAL mode), accessed from a worker thread"""
+
+    def __init__(self, path: Path = CART_DB_PATH):
+        self.path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS carts (
+                user_id INTEGER PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn = conn
+
+    def _load(self, user_id: int) -> Optional[Tuple[float, str]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT updated_at, data FROM carts WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return row
+
+    def _save(self, upserts: Dict[int, Tuple[float, str]], deletes: List[int]):
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN")
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO carts (user_id, data, updated_at) VALUES (?, ?, ?)",
+                    [(user_id, data, updated_at) for user_id, (updated_at, data) in upserts.items()]
+                )
+                conn.executemany("DELETE FROM carts WHERE user_id = ?", [(user_id,) for user_id in deletes])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _purge(self, older_than: float) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM carts WHERE updated_at < ?", (older_than,)).rowcount
+
+    def _close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    async def open(self):
+        await asyncio.to_thread(self._open)
+
+    async def load(self, user_id: int) -> Optional[Tuple[float, str]]:
+        return await asyncio.to_thread(self._load, user_id)
+
+    async def save(self, upserts: Dict[int, Tuple[float, str]], deletes: List[int]):
+        await asyncio.to_thread(self._save, upserts, deletes)
+
+    async def purge(self, older_than: float) -> int:
+        return await asyncio.to_thread(self._purge, older_than)
+
+    async def close(self):
+        await asyncio.to_thread(self._close)
+
+class PostgresCartBackend:
+    """Carts in the main Postgres database, through the shared connection pool"""
+
+    @staticmethod
+    def _load(conn, user_id: int):
+        with conn.cursor() as cur:
+            cur.execute("SELECT updated_at, data::text FROM carts WHERE user_id = %s", (user_id,))
+            return cur.fetchone()
+
+    @staticmethod
+    def _save(conn, upserts: Dict[int, Tuple[float, str]], deletes: List[int]):
+        with conn.cursor() as cur:
+            if upserts:
+                execute_values(cur, """
+                    INSERT INTO carts (user_id, data, updated_at) VALUES %s
+                    ON CONFLICT (user_id) DO UPDATE SET data = EXCLUDED.data, updated_at = EXCLUDED.updated_at
+                """, [(user_id, data, updated_at) for user_id, (updated_at, data) in upserts.items()],
+                    template="(%s, %s::jsonb, %s)")
+            if deletes:
+                cur.execute("DELETE FROM carts WHERE user_id = ANY(%s)", (deletes,))
+
+    @staticmethod
+    def _purge(conn, older_than: float) -> int:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM carts WHERE updated_at < %s", (older_than,))
+            return cur.rowcount
+
+    async def open(self):
+        # The carts table is created by migrations.py when the pool opens
+        await init_db_pool()
+
+    async def load(self, user_id: int) -> Optional[Tuple[float, str]]:
+        return await run_in_transaction(self._load, user_id)
+
+    async def save(self, upserts: Dict[int, Tuple[float, str]], deletes: List[int]):
+        await run_in_transaction(self._save, upserts, deletes)
+
+    async def purge(self, older_than: float) -> int:
+        return await run_in_transaction(self._purge, older_than)
+
+    async def close(self):
+        pass
+
+def create_cart_backend(kind: str = CART_BACKEND):
+    """Build the configured cart backend (None keeps carts in memory only)"""
+    if kind == "memory":
+        return None
+    if kind == "postgres":
+        return PostgresCartBackend()
+    if kind != "sqlite":
+        logger.warning(f"Unknown CART_BACKEND {kind!r}, using sqlite")
+    return SQLiteCartBackend()
\ No newline at end of file
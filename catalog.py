@@ -0,0 +1,226 @@
+"""Menu catalog with compact ids for callback payloads.
+
+The menu is loaded from menu.json (or the menu_catalog table) into an
+immutable MenuCatalog. Every category, item and sweetness level gets a
+small numeric id, so buttons carry payloads like "item_3fa9c1_4" instead of
+display names. The middle part is the menu version (a hash of the menu
+contents). When the menu changes, buttons from an older version no longer
+decode, and the customer is sent back to the category list instead of
+hitting a KeyError.
+
+The current catalog is replaced atomically by reload_catalog(), either from
+the background watcher or the owner's /reloadmenu command. Items already in
+a cart keep the price they were quoted.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+import psycopg2.extras
+from config import logger, MAX_DRINKS_PER_ORDER, MENU_SOURCE, MENU_PATH, MENU_WATCH_INTERVAL
+from database import run_in_transaction
+import metrics
+
+class MenuItem(NamedTuple):
+    id: int
+    name: str
+    category: str
+    price: float
+
+class MenuCatalog:
+    """Immutable index of the menu: id -> name/price/category and back"""
+
+    def __init__(self, menu: Dict[str, Dict[str, float]], sweet_levels: List[str],
+                 max_drinks_per_order: int = MAX_DRINKS_PER_ORDER):
+        self.categories: Tuple[str, ...] = tuple(menu)
+        self.items: Tuple[MenuItem, ...] = tuple(
+            MenuItem(item_id, name, category, float(price))
+            for item_id, (category, name, price) in enumerate(
+                (category, name, price) for category, items in menu.items() for name, price in items.items()
+            )
+        )
+        self.sweet_levels: Tuple[str, ...] = tuple(sweet_levels)
+        self.max_drinks_per_order = max_drinks_per_order
+
+        self.items_by_category: Dict[str, Tuple[MenuItem, ...]] = {
+            category: tuple(item for item in self.items if item.category == category)
+            for category in self.categories
+        }
+        self._category_ids = {category: cat_id for cat_id, category in enumerate(self.categories)}
+        self._item_ids = {(item.category, item.name): item.id for item in self.items}
+        self._sweet_ids = {level: sweet_id for sweet_id, level in enumerate(self.sweet_levels)}
+        self._tables = {"cat": self.categories, "item": self.items, "sweet": self.sweet_levels}
+
+        contents = json.dumps([menu, list(sweet_levels), max_drinks_per_order], sort_keys=True).encode()
+        self.version = hashlib.sha1(contents).hexdigest()[:6]
+
+    @classmethod
+    def from_document(cls, document: Dict[str, Any]) -> "MenuCatalog":
+        """Build a catalog from the menu.json structure, rejecting malformed menus"""
+        categories = document.get("categories")
+        sweet_levels = document.get("sweet_levels")
+        max_drinks = document.get("max_drinks_per_order", MAX_DRINKS_PER_ORDER)
+
+        if not isinstance(categories, dict) or not categories:
+            raise ValueError("menu needs at least one category")
+        for category, items in categories.items():
+            if not isinstance(items, dict) or not items:
+                raise ValueError(f"category {category!r} has no items")
+            for name, price in items.items():
+                if not isinstance(price, (int, float)) or price < 0:
+                    raise ValueError(f"invalid price for {category}/{name}: {price!r}")
+        if not isinstance(sweet_levels, list) or not sweet_levels:
+            raise ValueError("menu needs at least one sweetness level")
+        if not isinstance(max_drinks, int) or max_drinks < 1:
+            raise ValueError(f"invalid max_drinks_per_order: {max_drinks!r}")
+
+        return cls(categories, sweet_levels, max_drinks)
+
+    def get_item(self, category: str, name: str) -> Optional[MenuItem]:
+        item_id = self._item_ids.get((category, name))
+        return self.items[item_id] if item_id is not None else None
+
+    # Callback payload encoding: <kind>_<version>_<id>
+    def category_data(self, category: str) -> str:
+        return f"cat_{self.version}_{self._category_ids[category]}"
+
+    def item_data(self, item: MenuItem) -> str:
+        return f"item_{self.version}_{item.id}"
+
+    def sweetness_data(self, level: str) -> str:
+        return f"sweet_{self.version}_{self._sweet_ids[level]}"
+
+    def decode(self, kind: str, payload: str):
+        """Resolve the part after "<kind>_" to a category name, MenuItem or sweetness level.
+
+        Returns None for payloads from another menu version or unknown ids.
+        """
+        version, _, index = payload.partition("_")
+        if version != self.version or not index.isdigit():
+            return None
+        table = self._tables.get(kind)
+        index = int(index)
+        if table is None or index >= len(table):
+            return None
+        return table[index]
+
+def load_catalog_file(path=MENU_PATH) -> MenuCatalog:
+    with open(path, encoding="utf-8") as f:
+        return MenuCatalog.from_document(json.load(f))
+
+def _fetch_menu_document(conn) -> Optional[Dict[str, Any]]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT document FROM menu_catalog WHERE id = 1")
+        row = cur.fetchone()
+        return row[0] if row else None
+
+def _store_menu_document(conn, document: Dict[str, Any]):
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO menu_catalog (id, document, updated_at) VALUES (1, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (id) DO UPDATE SET document = EXCLUDED.document, updated_at = EXCLUDED.updated_at
+        """, (psycopg2.extras.Json(document),))
+
+async def load_catalog_database() -> MenuCatalog:
+    """Load the menu from the database, seeding it from menu.json the first time"""
+    document = await run_in_transaction(_fetch_menu_document)
+    if document is None:
+        with open(MENU_PATH, encoding="utf-8") as f:
+            document = json.load(f)
+        await run_in_transaction(_store_menu_document, document)
+        logger.info("Seeded menu_catalog table from menu.json")
+    return MenuCatalog.from_document(document)
+
+# The menu file is read at import so handlers and keyboards always have a catalog
+_current = load_catalog_file()
+_listeners: List[Callable[[MenuCatalog], None]] = []
+_reload_lock = asyncio.Lock()
+
+def get_catalog() -> MenuCatalog:
+    return _current
+
+def on_catalog_change(listener: Callable[[MenuCatalog], None]):
+    """Call listener(new_catalog) after every swap (e.g. to rebuild keyboards)"""
+    _listeners.append(listener)
+
+def swap_catalog(new_catalog: MenuCatalog) -> bool:
+    """Make new_catalog current; returns False if the menu didn't actually change"""
+    global _current
+    if new_catalog.version == _current.version:
+        return False
+    _current = new_catalog
+    for listener in _listeners:
+        listener(new_catalog)
+    logger.info(f"Menu catalog swapped to version {new_catalog.version} ({len(new_catalog.items)} items)")
+    return True
+
+async def reload_catalog() -> Tuple[bool, MenuCatalog, float]:
+    """Reload the menu from its source; returns (changed, current catalog, seconds taken).
+
+    A menu that fails to load or validate is logged and the current catalog is kept.
+    """
+    async with _reload_lock:
+        started = time.perf_counter()
+        if MENU_SOURCE == "database":
+            new_catalog = await load_catalog_database()
+        else:
+            new_catalog = await asyncio.to_thread(load_catalog_file)
+        changed = swap_catalog(new_catalog)
+        elapsed = time.perf_counter() - started
+        metrics.observe('menu.reload', elapsed)
+        return changed, _current, elapsed
+
+class MenuWatcher:
+    """Background task that reloads the menu when its source changes"""
+
+    def __init__(self, interval: float = MENU_WATCH_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._mtime: Optional[float] = None
+
+    async def start(self):
+        if MENU_SOURCE == "database":
+            # Switch to the stored menu right away
+            await self._reload()
+        if self.interval <= 0 or self._task is not None:
+            return
+        self._mtime = self._file_mtime()
+        self._task = asyncio.create_task(self._run(), name="menu-watcher")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    @staticmethod
+    def _file_mtime() -> Optional[float]:
+        try:
+            return MENU_PATH.stat().st_mtime
+        except OSError:
+            return None
+
+    async def _reload(self):
+        try:
+            await reload_catalog()
+        except Exception as e:
+            logger.error(f"Menu reload failed, keeping version {_current.version}: {str(e)}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if MENU_SOURCE == "database":
+                await self._reload()
+                continue
+            mtime = self._file_mtime()
+            if mtime is not None and mtime != self._mtime:
+                self._mtime = mtime
+                await self._reload()
+
+# Global watcher instance
+menu_watcher = MenuWatcher()
\ No newline at end of file
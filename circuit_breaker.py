@@ -0,0 +1,69 @@
+"""Circuit breaker for the database.
+
+After `failure_threshold` consecutive connection-level failures the circuit
+opens and calls fail immediately with CircuitOpenError instead of each
+waiting out a connect timeout. After `reset_timeout` seconds one caller is
+let through as a probe (half-open): success closes the circuit, failure
+opens it for another `reset_timeout`. A probe that ends without an answer
+(cancelled, or timed out waiting for a pooled connection) must be reported
+with record_inconclusive(), which also re-opens the circuit, so the breaker
+can never stay half-open with no probe in flight.
+"""
+import time
+import metrics
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of calling the database while the circuit is open"""
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return self.state != self.CLOSED
+
+    def allow(self) -> bool:
+        """True if a call may go ahead; while half-open only the single probe is allowed"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            return True
+        return False
+
+    def check(self):
+        if not self.allow():
+            metrics.increment(f'{self.name}.circuit_rejected')
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            print(f"{self.name} circuit closed")
+        self.state = self.CLOSED
+        self._failures = 0
+        metrics.set_gauge(f'{self.name}.circuit_open', 0)
+
+    def record_failure(self):
+        self._failures += 1
+        if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                print(f"{self.name} circuit opened after {self._failures} failures")
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            metrics.set_gauge(f'{self.name}.circuit_open', 1)
+
+    def record_inconclusive(self):
+        """A call ended without showing whether the database is up; a pending probe re-opens the circuit"""
+        if self.state == self.HALF_OPEN:
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
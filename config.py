@@ -2,6 +2,7 @@ from pathlib import Path
 from dotenv import load_dotenv
 import os
 import logging
+import sys
 from typing import Dict, List
 
 # Load environment variables
@@ -11,6 +12,31 @@ load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 OWNER_CHAT_ID = int(os.getenv("OWNER_CHAT_ID"))
 
+# Update delivery: "polling" (default) or "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+PORT = int(os.getenv("PORT", 10000))
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # public base URL, e.g. https://bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+
+# Outbound message rate limits (Telegram allows ~30 msg/s overall and ~1 msg/s per chat)
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", 25))
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", 1))
+OUTBOUND_CHAT_BURST = float(os.getenv("OUTBOUND_CHAT_BURST", 3))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", 3))
+
+# Owner order feed: "messages" sends one message per order, "board" keeps a single
+# pinned "open orders" message that is edited at most once per OWNER_FEED_WINDOW seconds
+OWNER_FEED_MODE = os.getenv("OWNER_FEED_MODE", "messages").lower()
+OWNER_FEED_WINDOW = float(os.getenv("OWNER_FEED_WINDOW", 3))
+# Open orders the owner never completes are forgotten after OWNER_FEED_ORDER_TTL seconds,
+# or oldest first once more than OWNER_FEED_MAX_ORDERS are open
+OWNER_FEED_ORDER_TTL = float(os.getenv("OWNER_FEED_ORDER_TTL", 24 * 60 * 60))
+OWNER_FEED_MAX_ORDERS = int(os.getenv("OWNER_FEED_MAX_ORDERS", 1000))
+
+# Updates from different users run in parallel, up to this many at once
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", 64))
+
 # Store Configuration
 class StoreStatus:
     OPEN = "open"
@@ -37,30 +63,33 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Order Configuration
+# Order Configuration (default when the menu file doesn't set it)
 MAX_DRINKS_PER_ORDER = 4
 
-# Menu Configuration with Prices
-MENU = {
-    "Coffee": {
-        "Americano": 1.25,
-        "Iced Latte": 1.25,
-        "Hot Latte": 1.00,
-        "Milked Coffee": 1.25
-    },
-    "Matcha": {
-        "Matcha Latte": 1.25,
-        "Matcha Espresso": 1.50,
-        "Strawberry Matcha": 1.50
-    },
-    "Soda": {
-        "Strawberry Soda": 1.25,
-        "Blueberry Soda": 1.25,
-        "Passion Soda": 1.25
-    }
-}
-
-SWEET_LEVELS = ["More sweet", "Normal sweet", "Less sweet", "No sweet"]
+# Order persistence (write-behind group commit)
+ORDER_WRITER_BATCH_SIZE = int(os.getenv("ORDER_WRITER_BATCH_SIZE", 50))
+ORDER_WRITER_MAX_LINGER = float(os.getenv("ORDER_WRITER_MAX_LINGER", 0.05))  # seconds
+
+# In-progress cart sessions
+SESSION_MAX_CARTS = int(os.getenv("SESSION_MAX_CARTS", 10000))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", 6 * 60 * 60))  # seconds
+
+# Cart persistence: "sqlite" (default), "postgres" or "memory"
+CART_BACKEND = os.getenv("CART_BACKEND", "sqlite").lower()
+CART_FLUSH_INTERVAL = float(os.getenv("CART_FLUSH_INTERVAL", 0.5))  # seconds
+
+# Sales table partitioning: one partition per UTC month, created this many months ahead.
+# Partitions older than SALES_RETENTION_MONTHS (0 keeps everything) are detached and
+# either kept as standalone sales_archive_* tables ("archive") or dropped ("drop").
+SALES_PARTITION_MONTHS_AHEAD = int(os.getenv("SALES_PARTITION_MONTHS_AHEAD", 3))
+SALES_RETENTION_MONTHS = int(os.getenv("SALES_RETENTION_MONTHS", 0))
+SALES_RETENTION_ACTION = os.getenv("SALES_RETENTION_ACTION", "archive").lower()
+PARTITION_MAINTENANCE_INTERVAL = float(os.getenv("PARTITION_MAINTENANCE_INTERVAL", 6 * 60 * 60))  # seconds
+
+# /export files larger than this are not sent (Telegram bots can upload at most 50 MB)
+EXPORT_MAX_BYTES = int(os.getenv("EXPORT_MAX_BYTES", 50 * 1024 * 1024))
+# Statement timeout for the export query, instead of the shorter reporting one (0 disables it)
+EXPORT_STATEMENT_TIMEOUT = float(os.getenv("EXPORT_STATEMENT_TIMEOUT", 600))  # seconds
 
 # Order States
 class OrderState:
@@ -71,16 +100,19 @@ class OrderState:
     CONFIRMING_ORDER = "confirming_order"
 
 # Order structure
+# Strings are interned so every cart shares the menu's name objects
 class OrderItem:
-    def __init__(self, category: str, item: str = None, sweetness: str = None):
-        self.category = category
-        self.item = item
-        self.sweetness = sweetness
-        self.price = MENU[category][item] if item is not None else 0.0
+    __slots__ = ("category", "item", "sweetness", "price")
+
+    def __init__(self, category: str, item: str = None, sweetness: str = None, price: float = 0.0):
+        self.category = sys.intern(category)
+        self.item = sys.intern(item) if item is not None else None
+        self.sweetness = sys.intern(sweetness) if sweetness is not None else None
+        self.price = price
 
-    def set_item(self, item: str):
-        self.item = item
-        self.price = MENU[self.category][item]
+    def set_item(self, item: str, price: float):
+        self.item = sys.intern(item)
+        self.price = price
 
     def to_dict(self) -> dict:
         return {
@@ -90,12 +122,19 @@ class OrderItem:
             "price": self.price
         }
 
+    @classmethod
+    def from_dict(cls, data: dict) -> "OrderItem":
+        # Keep the stored price: it is the price the customer was quoted
+        return cls(data["category"], data.get("item"), data.get("sweetness"), data.get("price", 0.0))
+
     def __str__(self) -> str:
         if self.item is None:
             return "Incomplete order item"
         return f"{self.item} ({self.sweetness}) - ${self.price:.2f}"
 
 class UserOrder:
+    __slots__ = ("items", "current_item", "state", "payment_method")
+
     def __init__(self):
         self.items: List[OrderItem] = []
         self.current_item: OrderItem = None
@@ -106,8 +145,8 @@ class UserOrder:
         self.items.append(item)
         self.current_item = None
 
-    def can_add_more(self) -> bool:
-        return len(self.items) < MAX_DRINKS_PER_ORDER
+    def can_add_more(self, max_items: int = MAX_DRINKS_PER_ORDER) -> bool:
+        return len(self.items) < max_items
 
     def get_total_items(self) -> int:
         return len(self.items)
@@ -131,6 +170,62 @@ class UserOrder:
         self.state = OrderState.SELECTING_CATEGORY
         self.payment_method = None
 
+    def to_dict(self) -> dict:
+        return {
+            "items": [item.to_dict() for item in self.items],
+            "current_item": self.current_item.to_dict() if self.current_item is not None else None,
+            "state": self.state,
+            "payment_method": self.payment_method
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "UserOrder":
+        order = cls()
+        order.items = [OrderItem.from_dict(item) for item in data.get("items", [])]
+        if data.get("current_item") is not None:
+            order.current_item = OrderItem.from_dict(data["current_item"])
+        order.state = data.get("state", OrderState.SELECTING_CATEGORY)
+        order.payment_method = data.get("payment_method")
+        return order
+
 # File paths
 BASE_DIR = Path(__file__).resolve().parent
-MENU_IMAGE_PATH = BASE_DIR / "menu.jpg" 
\ No newline at end of file
+MENU_IMAGE_PATH = BASE_DIR / "menu.jpg"
+
+# Menu catalog: "file" (menu.json) or "database" (menu_catalog table)
+MENU_SOURCE = os.getenv("MENU_SOURCE", "file").lower()
+MENU_PATH = Path(os.getenv("MENU_PATH", BASE_DIR / "menu.json"))
+MENU_WATCH_INTERVAL = float(os.getenv("MENU_WATCH_INTERVAL", 30))  # seconds, 0 disables
+
+# Files the bot writes while running (carts, the order spool, cached file_ids) live in
+# DATA_DIR, which docker-compose mounts as a volume so they survive a redeploy
+DATA_DIR = Path(os.getenv("DATA_DIR", BASE_DIR / "data"))
+
+def _data_file(env_name: str, filename: str) -> Path:
+    """Path from env_name, else DATA_DIR/filename (or the file an older version left next to the code)"""
+    if os.getenv(env_name):
+        return Path(os.getenv(env_name))
+    legacy = BASE_DIR / filename
+    if legacy.exists() and not (DATA_DIR / filename).exists():
+        logger.warning(f"Using {legacy}; stop the bot and move it into {DATA_DIR} to keep it across deploys")
+        return legacy
+    return DATA_DIR / filename
+
+CART_DB_PATH = _data_file("CART_DB_PATH", "carts.db")
+# Orders that can't reach Postgres are kept here and replayed once it is back
+ORDER_SPOOL_PATH = _data_file("ORDER_SPOOL_PATH", "order_spool.db")
+ORDER_SPOOL_REPLAY_INTERVAL = float(os.getenv("ORDER_SPOOL_REPLAY_INTERVAL", 10))  # seconds
+ORDER_SPOOL_BATCH_SIZE = int(os.getenv("ORDER_SPOOL_BATCH_SIZE", 100))
+
+# Telegram file_ids of uploaded images, keyed by content hash, so restarts don't re-upload
+MEDIA_CACHE_PATH = _data_file("MEDIA_CACHE_PATH", "media_cache.json")
+# Menu images: size-optimized variants are generated into IMAGE_VARIANT_DIR and sent
+# instead of the originals (needs Pillow). Category images in IMAGES_DIR named after
+# the category (e.g. images/coffee.jpg) are sent together with menu.jpg as one album.
+IMAGES_DIR = Path(os.getenv("IMAGES_DIR", BASE_DIR / "images"))
+IMAGE_VARIANT_DIR = Path(os.getenv("IMAGE_VARIANT_DIR", IMAGES_DIR / ".variants"))
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", 1280))  # Telegram shows photos at most 1280px
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", 80))
+MENU_IMAGE_ALBUM = os.getenv("MENU_IMAGE_ALBUM", "true").lower() in ("1", "true", "yes")
+# Upload the menu image at startup (to the owner's chat) if it has no cached file_id yet
+MENU_IMAGE_WARMUP = os.getenv("MENU_IMAGE_WARMUP", "false").lower() in ("1", "true", "yes") 
\ No newline at end of file
@@ -1,9 +1,18 @@
-from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+import asyncio
 import os
+import uuid
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import psycopg2.extras
+from psycopg2.pool import ThreadedConnectionPool, PoolError
 from dotenv import load_dotenv
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable
+from circuit_breaker import CircuitBreaker
+from migrations import apply_migrations
+from rollups import apply_orders_to_rollups, aggregate_rollups_since
+from sales_items import insert_sale_items, count_items_since
+from summary_cache import SummaryCache
 
 # Load environment variables
 load_dotenv()
@@ -14,201 +23,357 @@ DATABASE_URL = os.getenv('DATABASE_URL')
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL must be set in .env file")
 
-def ensure_tables_exist(conn):
-    """Ensure required tables exist"""
-    try:
-        with conn.cursor() as cur:
-            # Create sales table if it doesn't exist
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS sales (
-                    id SERIAL PRIMARY KEY,
-                    user_id TEXT NOT NULL,
-                    username TEXT NOT NULL,
-                    items JSONB NOT NULL,
-                    total_amount DECIMAL(10,2) NOT NULL,
-                    payment_method TEXT NOT NULL,
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            conn.commit()
-    except Exception as e:
-        print(f"Error ensuring tables exist: {str(e)}")
-        conn.rollback()
+# Connection pool configuration
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 1))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 5))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv('DB_POOL_ACQUIRE_TIMEOUT', 10.0))
+DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', 5))  # seconds
+
+# Circuit breaker: after this many consecutive connection failures, database calls fail fast
+# for DB_BREAKER_RESET_TIMEOUT seconds before one call is let through to probe
+DB_BREAKER_FAILURES = int(os.getenv('DB_BREAKER_FAILURES', 3))
+DB_BREAKER_RESET_TIMEOUT = float(os.getenv('DB_BREAKER_RESET_TIMEOUT', 30))
+
+# Optional reporting database (a replica or a read-only role). Reports use their own pool
+# there, with read-only transactions and a statement timeout; without it they use the primary.
+REPORTING_DATABASE_URL = os.getenv('REPORTING_DATABASE_URL')
+REPORTING_POOL_MAX_SIZE = int(os.getenv('REPORTING_POOL_MAX_SIZE', 2))
+REPORTING_STATEMENT_TIMEOUT = float(os.getenv('REPORTING_STATEMENT_TIMEOUT', 30))  # seconds
+
+# Sales summaries are cached for this many seconds (0 disables the cache)
+SALES_SUMMARY_CACHE_TTL = float(os.getenv('SALES_SUMMARY_CACHE_TTL', 60))
+summary_cache = SummaryCache(SALES_SUMMARY_CACHE_TTL)
+# A summary read from the reporting database can miss orders the primary just committed (and
+# invalidated the cache for), so with REPORTING_DATABASE_URL summaries are cached at most this
+# long; 0 doesn't cache them, leaving replication delay as the only lag
+REPORTING_SUMMARY_CACHE_TTL = float(os.getenv('REPORTING_SUMMARY_CACHE_TTL', 0))
+
+# Errors that mean the database is unreachable, as opposed to a failing statement
+_CONNECTION_ERRORS = (ConnectionError, psycopg2.OperationalError, psycopg2.InterfaceError, PoolError)
+
+def is_connection_error(error: Exception) -> bool:
+    # A statement timeout is an OperationalError too, but the server answered
+    return isinstance(error, _CONNECTION_ERRORS) and \
+        not isinstance(error, psycopg2.extensions.QueryCanceledError)
+
+class DatabasePool:
+    """A connection pool opened once (or lazily, if the database was down at startup).
+
+    The semaphore makes callers wait on the event loop for a free connection
+    instead of failing when the pool is exhausted. The circuit breaker stops
+    callers from each waiting out a connect timeout while the database is down.
+    """
+
+    def __init__(self, name: str, dsn: str, min_size: int, max_size: int, migrate: bool = False,
+                 options: Optional[str] = None):
+        self.name = name
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        # Only the primary applies schema migrations
+        self.migrate = migrate
+        self.options = options
+        self.breaker = CircuitBreaker(f"db.{name}", DB_BREAKER_FAILURES, DB_BREAKER_RESET_TIMEOUT)
+        self._pool: Optional[ThreadedConnectionPool] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._pool is not None
+
+    def _open_pool(self) -> ThreadedConnectionPool:
+        """Open the connection pool and, on the primary, bring the schema up to date (blocking)"""
+        kwargs = {'connect_timeout': DB_CONNECT_TIMEOUT}
+        if self.options:
+            kwargs['options'] = self.options
+        pool = ThreadedConnectionPool(self.min_size, self.max_size, self.dsn, **kwargs)
+        if not self.migrate:
+            return pool
+        try:
+            conn = pool.getconn()
+            try:
+                applied = apply_migrations(conn)
+            finally:
+                pool.putconn(conn)
+        except Exception:
+            pool.closeall()
+            raise
+        if applied:
+            print(f"Schema migrated to version {applied[-1].version}")
+        return pool
+
+    async def open(self) -> bool:
+        async with self._lock:
+            if self._pool is not None:
+                return True
+            try:
+                print(f"Creating {self.name} database connection pool...")
+                self._pool = await asyncio.to_thread(self._open_pool)
+                self._slots = asyncio.Semaphore(self.max_size)
+                print(f"{self.name.capitalize()} database pool ready (min={self.min_size}, max={self.max_size})")
+                return True
+            except Exception as e:
+                print(f"Error connecting to {self.name} database: {str(e)}")
+                print(f"Database URL format: {self.dsn[:10]}...") # Only show start of URL for security
+                return False
+
+    async def close(self):
+        async with self._lock:
+            if self._pool is None:
+                return
+            await asyncio.to_thread(self._pool.closeall)
+            self._pool = None
+            self._slots = None
+            print(f"{self.name.capitalize()} database pool closed")
 
-def get_db_connection():
-    """Get a database connection"""
+    @asynccontextmanager
+    async def acquire(self):
+        """Borrow a pooled connection, waiting at most DB_POOL_ACQUIRE_TIMEOUT seconds"""
+        # Retry pool creation lazily if the database was down at startup
+        if self._pool is None and not await self.open():
+            raise ConnectionError(f"Could not connect to {self.name} database")
+
+        pool, slots = self._pool, self._slots
+        await asyncio.wait_for(slots.acquire(), timeout=DB_POOL_ACQUIRE_TIMEOUT)
+        try:
+            conn = await asyncio.to_thread(pool.getconn)
+            try:
+                yield conn
+            finally:
+                # Drop connections that were closed under us instead of recycling them
+                pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            slots.release()
+
+    async def run(self, func: Callable, *args):
+        """Run func(conn, *args) in a transaction on this pool, failing fast while the circuit is open"""
+        self.breaker.check()
+        # Every exit records an outcome, or a half-open probe would never be released
+        reached = None
+        try:
+            async with self.acquire() as conn:
+                result = await asyncio.to_thread(_run_transaction, conn, func, *args)
+            reached = True
+            return result
+        except asyncio.TimeoutError:
+            # Pool exhausted: the database is busy, not down
+            raise
+        except Exception as e:
+            # Any other error came from a database that answered
+            reached = not is_connection_error(e)
+            raise
+        finally:
+            if reached is None:
+                # Timed out or cancelled
+                self.breaker.record_inconclusive()
+            elif reached:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+def reporting_options(statement_timeout: float = REPORTING_STATEMENT_TIMEOUT) -> str:
+    """Connection options of the reporting pool: read-only transactions with a statement timeout"""
+    return f"-c default_transaction_read_only=on -c statement_timeout={int(statement_timeout * 1000)}"
+
+# The primary takes every write; reports go to the reporting pool when one is configured
+primary_pool = DatabasePool('primary', DATABASE_URL, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, migrate=True)
+reporting_pool: Optional[DatabasePool] = None
+if REPORTING_DATABASE_URL:
+    reporting_pool = DatabasePool('reporting', REPORTING_DATABASE_URL, 1, REPORTING_POOL_MAX_SIZE,
+                                  options=reporting_options())
+
+async def init_db_pool() -> bool:
+    """Create the connection pools once at startup; only the primary has to be reachable"""
+    ready = await primary_pool.open()
+    if reporting_pool is not None and not await reporting_pool.open():
+        print("Reports will use the primary database until the reporting database is reachable")
+    return ready
+
+async def close_db_pool():
+    """Close every pooled connection at shutdown"""
+    if reporting_pool is not None:
+        await reporting_pool.close()
+    await primary_pool.close()
+
+def is_db_ready() -> bool:
+    """True once the primary connection pool is open"""
+    return primary_pool.ready
+
+def acquire_connection():
+    """Borrow a connection from the primary pool"""
+    return primary_pool.acquire()
+
+def _run_transaction(conn, func: Callable, *args):
+    """Run func(conn, *args) inside a transaction (blocking)"""
     try:
-        print(f"Attempting to connect to database...")
-        conn = psycopg2.connect(DATABASE_URL)
-        print("Database connection successful")
-        ensure_tables_exist(conn)
-        return conn
-    except Exception as e:
-        print(f"Error connecting to database: {str(e)}")
-        print(f"Database URL format: {DATABASE_URL[:10]}...") # Only show start of URL for security
-        return None
+        result = func(conn, *args)
+        conn.commit()
+        return result
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+
+async def run_in_transaction(func: Callable, *args):
+    """Run a blocking database function on a pooled connection without blocking the event loop"""
+    return await primary_pool.run(func, *args)
 
-async def save_order(user_id: int, username: str, items: List[Dict], total_amount: float, payment_method: str):
+async def run_read_only(func: Callable, *args):
+    """Like run_in_transaction, but on the reporting database when one is configured and reachable"""
+    if reporting_pool is not None:
+        try:
+            return await reporting_pool.run(func, *args)
+        except Exception as e:
+            # A statement timeout (or any other statement error) is the report's own failure
+            if not is_connection_error(e):
+                raise
+            # Unreachable, dropped connection or circuit open; nothing was read there
+            print(f"Reporting database unavailable, using the primary: {str(e)}")
+    return await primary_pool.run(func, *args)
+
+def _insert_orders(conn, orders: List[tuple]) -> List[Optional[tuple]]:
+    """Insert (user_id, username, items, total_amount, payment_method, order_key, created_at) rows.
+
+    order_key makes the insert idempotent: orders whose key was already saved
+    (e.g. replayed from the spool after a commit whose reply was lost) are
+    skipped and get None in the result, which is otherwise in input order.
+    """
+    with conn.cursor() as cur:
+        keys = psycopg2.extras.execute_values(cur, """
+            INSERT INTO sales_order_keys (order_key) VALUES %s
+            ON CONFLICT (order_key) DO NOTHING
+            RETURNING order_key
+        """, [(order[5],) for order in orders], page_size=len(orders), fetch=True)
+        new_keys = {key for key, in keys}
+        new_orders = [order for order in orders if order[5] in new_keys]
+        if not new_orders:
+            return [None] * len(orders)
+
+        rows = psycopg2.extras.execute_values(cur, """
+            INSERT INTO sales (user_id, username, items, total_amount, payment_method, created_at)
+            VALUES %s
+            RETURNING *
+        """, [
+            (str(user_id), username, psycopg2.extras.Json(items), float(total_amount), payment_method, created_at)
+            for user_id, username, items, total_amount, payment_method, _, created_at in new_orders
+        ], template="(%s, %s, %s::jsonb, %s, %s, %s)", page_size=len(new_orders), fetch=True)
+
+        sale_ids, since = [row[0] for row in rows], min(row[-1] for row in rows)
+        insert_sale_items(cur, sale_ids, since)
+        # Keep the report rollups in step with the insert
+        apply_orders_to_rollups(cur, sale_ids, since)
+
+        saved = dict(zip((order[5] for order in new_orders), rows))
+        return [saved.get(order[5]) for order in orders]
+
+async def save_orders(orders: List[tuple]) -> List[Optional[tuple]]:
+    """Save a batch of orders in a single transaction, returning the inserted rows in order"""
+    rows = await run_in_transaction(_insert_orders, orders)
+    # Committed: cached summaries no longer include every order
+    summary_cache.invalidate()
+    return rows
+
+def new_order_key() -> str:
+    """Idempotency key for a new order; the owner feed also uses it as the order's reference"""
+    return uuid.uuid4().hex
+
+def new_order(user_id: int, username: str, items: List[Dict], total_amount: float, payment_method: str,
+              order_key: Optional[str] = None) -> tuple:
+    """Order tuple for save_orders(), with an idempotency key (a fresh one by default) and the current time"""
+    return (user_id, username, items, total_amount, payment_method, order_key or new_order_key(),
+            datetime.now(timezone.utc))
+
+async def save_order(user_id: int, username: str, items: List[Dict], total_amount: float, payment_method: str,
+                     order_key: Optional[str] = None):
     """Save order to database"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            return None
-            
-        with conn.cursor() as cur:
-            # Create sales table if it doesn't exist
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS sales (
-                    id SERIAL PRIMARY KEY,
-                    user_id TEXT NOT NULL,
-                    username TEXT NOT NULL,
-                    items JSONB NOT NULL,
-                    total_amount DECIMAL(10,2) NOT NULL,
-                    payment_method TEXT NOT NULL,
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Insert the order
-            cur.execute("""
-                INSERT INTO sales (user_id, username, items, total_amount, payment_method)
-                VALUES (%s, %s, %s::jsonb, %s, %s)
-                RETURNING *
-            """, (
-                str(user_id),
-                username,
-                psycopg2.extras.Json(items),
-                float(total_amount),
-                payment_method
-            ))
-            
-            result = cur.fetchone()
-            conn.commit()
-            return result
-            
+        rows = await save_orders([new_order(user_id, username, items, total_amount, payment_method, order_key)])
+        return rows[0]
     except Exception as e:
         print(f"Error saving order: {str(e)}")
-        if conn:
-            conn.rollback()
         return None
-    finally:
-        if conn:
-            conn.close()
+
+def _aggregate_sales_since(conn, start_date: datetime):
+    """Recompute a summary straight from the raw sales rows (used to verify the rollups)"""
+    with conn.cursor() as cur:
+        # Totals for the period, computed server-side
+        cur.execute("""
+            SELECT COALESCE(SUM(total_amount), 0), COUNT(*)
+            FROM sales
+            WHERE created_at >= %s
+        """, (start_date,))
+        total_sales, total_orders = cur.fetchone()
+
+        # Per-item counts, from the sales_items index
+        items_sold = count_items_since(conn, 'item', start_date)
+
+        return float(total_sales), total_orders, items_sold
+
+def _empty_summary(period: str, start_date: datetime, end_date: datetime, error: str = None) -> Dict[str, Any]:
+    summary = {
+        'period': period,
+        'total_sales': 0.0,
+        'total_orders': 0,
+        'items_sold': {},
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat()
+    }
+    if error:
+        summary['error'] = error
+    return summary
+
+def period_start(period: str, now: datetime) -> datetime:
+    """Return the UTC start of a report period, timezone-aware (a naive now is taken as UTC).
+
+    Postgres reads a naive bound in the session TimeZone, while the rollups
+    bucket by UTC day, so bounds always carry their zone.
+    """
+    now = now.astimezone(timezone.utc) if now.tzinfo is not None else now.replace(tzinfo=timezone.utc)
+    if period == 'day':
+        return now.replace(hour=0, minute=0, second=0, microsecond=0)
+    elif period == 'week':
+        start_date = now - timedelta(days=now.weekday())
+        return start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    elif period == 'month':
+        return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    else:  # overall
+        return datetime(2024, 1, 1, tzinfo=timezone.utc)
 
 async def get_sales_summary(period: str = 'day') -> Dict[str, Any]:
     """Get sales summary for the specified period"""
-    conn = None
+    now = datetime.now(timezone.utc)
     try:
-        now = datetime.utcnow()
-        
-        if period == 'day':
-            start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        elif period == 'week':
-            start_date = now - timedelta(days=now.weekday())
-            start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-        elif period == 'month':
-            start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        else:  # overall
-            start_date = datetime(2024, 1, 1)
-            
-        print(f"Getting sales summary for period: {period}")
-        print(f"Start date: {start_date.isoformat()}")
-            
-        conn = get_db_connection()
-        if not conn:
-            print("Failed to get database connection")
-            return {
-                'period': period,
-                'total_sales': 0.0,
-                'total_orders': 0,
-                'items_sold': {},
-                'start_date': start_date.isoformat(),
-                'end_date': now.isoformat(),
-                'error': 'Could not connect to database'
-            }
-            
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            # First check if the table exists
-            cur.execute("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_schema = 'public'
-                    AND table_name = 'sales'
-                );
-            """)
-            table_exists = cur.fetchone()['exists']
-            
-            if not table_exists:
-                print("Sales table does not exist")
-                return {
-                    'period': period,
-                    'total_sales': 0.0,
-                    'total_orders': 0,
-                    'items_sold': {},
-                    'start_date': start_date.isoformat(),
-                    'end_date': now.isoformat(),
-                    'error': 'Sales table does not exist'
-                }
-            
-            # Get all orders for the period
-            query = """
-                SELECT * FROM sales 
-                WHERE created_at >= %s
-                ORDER BY created_at DESC
-            """
-            print(f"Executing query: {query} with start_date: {start_date}")
-            cur.execute(query, (start_date,))
-            
-            orders = cur.fetchall()
-            print(f"Found {len(orders)} orders")
-            
-            if not orders:
-                return {
-                    'period': period,
-                    'total_sales': 0.0,
-                    'total_orders': 0,
-                    'items_sold': {},
-                    'start_date': start_date.isoformat(),
-                    'end_date': now.isoformat()
-                }
-            
-            # Calculate summary
-            total_sales = sum(float(order['total_amount']) for order in orders)
-            total_orders = len(orders)
-            print(f"Total sales: ${total_sales:.2f}, Total orders: {total_orders}")
-            
-            # Calculate items sold
-            items_sold = {}
-            for order in orders:
-                for item in order['items']:
-                    item_name = item.get('item')
-                    if item_name:
-                        items_sold[item_name] = items_sold.get(item_name, 0) + 1
-            
-            # Sort items by quantity sold
-            items_sold = dict(sorted(items_sold.items(), key=lambda x: x[1], reverse=True))
-            print(f"Items sold: {items_sold}")
-            
-            return {
-                'period': period,
-                'total_sales': total_sales,
-                'total_orders': total_orders,
-                'items_sold': items_sold,
-                'start_date': start_date.isoformat(),
-                'end_date': now.isoformat()
-            }
-            
-    except Exception as e:
-        print(f"Error getting sales summary: {str(e)}")
-        return {
+        start_date = period_start(period, now)
+
+        cached = summary_cache.get(period, start_date)
+        if cached is not None:
+            return {**cached, 'end_date': now.isoformat()}
+
+        print(f"Getting sales summary for period: {period}, start date: {start_date.isoformat()}")
+
+        generation = summary_cache.generation
+        try:
+            # Every period starts on a UTC day boundary, so the daily rollups cover it exactly
+            total_sales, total_orders, items_sold = await run_read_only(aggregate_rollups_since, start_date)
+        except (ConnectionError, asyncio.TimeoutError, psycopg2.OperationalError, PoolError) as e:
+            print(f"Failed to get database connection: {str(e)}")
+            return _empty_summary(period, start_date, now, 'Could not connect to database')
+
+        print(f"Total sales: ${total_sales:.2f}, Total orders: {total_orders}")
+
+        summary = {
             'period': period,
-            'total_sales': 0.0,
-            'total_orders': 0,
-            'items_sold': {},
-            'start_date': now.isoformat(),
-            'end_date': now.isoformat(),
-            'error': str(e)
+            'total_sales': total_sales,
+            'total_orders': total_orders,
+            'items_sold': items_sold,
+            'start_date': start_date.isoformat(),
+            'end_date': now.isoformat()
         }
-    finally:
-        if conn:
-            conn.close()
\ No newline at end of file
+        summary_cache.put(period, start_date, summary, generation,
+                          None if reporting_pool is None else REPORTING_SUMMARY_CACHE_TTL)
+        return summary
+
+    except Exception as e:
+        print(f"Error getting sales summary: {str(e)}")
+        return _empty_summary(period, now, now, str(e))
\ No newline at end of file
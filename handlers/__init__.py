@@ -1,5 +1,5 @@
-from .command_handlers import start, store_command
-from .callback_handlers import button_handler
+from .command_handlers import start, store_command, reload_menu_command, done_command
+from .router import button_handler
 from .image_handler import send_menu_image
 
-__all__ = ['start', 'button_handler', 'send_menu_image', 'store_command'] 
\ No newline at end of file
+__all__ = ['start', 'button_handler', 'send_menu_image', 'store_command', 'reload_menu_command', 'done_command'] 
\ No newline at end of file
@@ -1,64 +1,42 @@
+import asyncio
+from typing import Set
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from config import (
-    logger, MENU, SWEET_LEVELS, OWNER_CHAT_ID, 
-    OrderState, OrderItem, UserOrder, MAX_DRINKS_PER_ORDER,
+    logger, OWNER_CHAT_ID,
+    OrderState, OrderItem, UserOrder,
     StoreStatus, state, PaymentMethod, ABA_PAYMENT_LINK
 )
-from database import save_order
+from database import new_order_key
+from order_writer import order_writer
+from session_store import SessionStore
+from keyboards import keyboards
+from catalog import get_catalog
+from outbound import Priority, send_message, reply_text, edit_message_text
+from owner_feed import owner_feed, order_number, PendingOrder
+from cart_store import create_cart_backend
+from rendering import render_order_summary, render_owner_order, render_payment_instructions
 
-# In-memory store for tracking orders
-user_orders: dict[int, UserOrder] = {}
+# Store for tracking orders: bounded in memory, persisted so restarts keep carts
+user_orders = SessionStore(backend=create_cart_backend())
 
-def get_user_order(user_id: int) -> UserOrder:
-    if user_id not in user_orders:
-        user_orders[user_id] = UserOrder()
-    return user_orders[user_id]
+async def get_user_order(user_id: int) -> UserOrder:
+    return await user_orders.get(user_id)
 
 def format_order_summary(order: UserOrder) -> str:
-    summary = "🧋 *Your Order:*\n\n"
-    for idx, item in enumerate(order.items, 1):
-        # Escape the decimal point in price
-        price_str = f"{item.price:.2f}".replace(".", "\\.")
-        summary += f"{idx}\\. {item.item} \\- {item.sweetness} \\- \\${price_str}\n"
-    # Escape the decimal point in total price
-    total_str = f"{order.get_total_price():.2f}".replace(".", "\\.")
-    summary += f"\n💰 *Total: \\${total_str}*"
-    return summary
-
-async def send_order_to_owner(context: ContextTypes.DEFAULT_TYPE, user_id: int, username: str):
-    order = get_user_order(user_id)
-    
-    # Escape special characters for the display name
-    escaped_username = username.replace("_", "\\_").replace("*", "\\*").replace("[", "\\[").replace("]", "\\]").replace(".", "\\.").replace("(", "\\(").replace(")", "\\)").replace("`", "\\`")
-    
-    # Create clickable username link
-    # If username starts with @, use it as is, otherwise use the user_id
-    if username.startswith("@"):
-        username_clean = username[1:]  # Remove @ for the URL
-        # For URLs in MarkdownV2, we don't escape dots in the URL part
-        username_link = f"[{escaped_username}](https://t\\.me/{username_clean})"
-    else:
-        username_link = f"[{escaped_username}](tg://user?id={user_id})"
-    
-    # Create order summary
-    msg = f"📥 *New Order Received from* {username_link}\!\n\n"
-    for idx, item in enumerate(order.items, 1):
-        escaped_item = item.item.replace("_", "\\_").replace("*", "\\*").replace("[", "\\[").replace("]", "\\]").replace("`", "\\`")
-        escaped_sweet = item.sweetness.replace("_", "\\_").replace("*", "\\*").replace("[", "\\[").replace("]", "\\]").replace("`", "\\`")
-        price_str = f"{item.price:.2f}".replace(".", "\\.")
-        msg += f"{idx}\\. `{escaped_item}` \\- `{escaped_sweet}` \\- \\${price_str}\n"
-    total_str = f"{order.get_total_price():.2f}".replace(".", "\\.")
-    msg += f"\n💰 *Total: \\${total_str}*"
-    
-    # Add payment method information
-    payment_info = "💵 *Payment Method:* `Cash`" if order.payment_method == PaymentMethod.CASH else "🏦 *Payment Method:* `ABA Pay`"
-    msg += f"\n{payment_info}"
-    
-    keyboard = [[InlineKeyboardButton("✅ Complete", callback_data=f"done_{user_id}")]]
+    return render_order_summary(order.items, order.get_total_price())
+
+async def send_order_to_owner(context: ContextTypes.DEFAULT_TYPE, order: PendingOrder):
+    """Send one order to the owner as its own message ("messages" feed mode)"""
+    user_id, username = order.user_id, order.username
+    msg = render_owner_order(order.number, user_id, username, order.items, order.total, order.payment_method)
+
+    keyboard = [[InlineKeyboardButton("✅ Complete", callback_data=order.done_data)]]
     try:
-        await context.bot.send_message(
+        await send_message(
+            context.bot,
             chat_id=OWNER_CHAT_ID,
+            priority=Priority.OWNER,
             text=msg,
             parse_mode="MarkdownV2",
             reply_markup=InlineKeyboardMarkup(keyboard)
@@ -66,215 +44,266 @@ async def send_order_to_owner(context: ContextTypes.DEFAULT_TYPE, user_id: int,
     except Exception as e:
         logger.error(f"Failed to send message to owner: {str(e)}")
         # Send a simplified message as fallback
-        simple_msg = f"New Order from {username}:\n"
+        simple_msg = f"New Order #{order.number} from {username}:\n"
         for idx, item in enumerate(order.items, 1):
             simple_msg += f"{idx}. {item.item} - {item.sweetness}\n"
         simple_msg += f"\nPayment: {order.payment_method}"
-        await context.bot.send_message(
+        await send_message(
+            context.bot,
             chat_id=OWNER_CHAT_ID,
+            priority=Priority.OWNER,
             text=simple_msg,
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
 
+# Owner notifications still being sent; referenced so they aren't garbage collected mid-send
+_owner_sends: Set[asyncio.Task] = set()
+
+def _owner_send_done(task: asyncio.Task):
+    _owner_sends.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Failed to notify the owner of an order: {str(task.exception())}")
+
+def notify_owner(context: ContextTypes.DEFAULT_TYPE, order: PendingOrder):
+    """Send the owner's order message in the background.
+
+    The owner chat is rate limited to about one message per second, so in a
+    rush awaiting it would hold the customer's checkout (and their per-user
+    lock) for as long as the owner queue is deep.
+    """
+    task = asyncio.create_task(send_order_to_owner(context, order), name="owner-order")
+    _owner_sends.add(task)
+    task.add_done_callback(_owner_send_done)
+
 async def show_payment_methods(query: Update.callback_query, order: UserOrder):
     """Show payment method selection buttons"""
     summary = format_order_summary(order)
-    keyboard = [
-        [
-            InlineKeyboardButton("💵 Pay by Cash", callback_data="pay_cash"),
-            InlineKeyboardButton("🏦 Pay by ABA", callback_data="pay_aba")
-        ]
-    ]
-    await query.edit_message_text(
+    await edit_message_text(
+        query,
         f"{summary}\n\nPlease select your payment method:",
-        reply_markup=InlineKeyboardMarkup(keyboard),
+        reply_markup=keyboards.payment,
         parse_mode="MarkdownV2"
     )
 
-async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-    user_id = query.from_user.id
-    data = query.data
-    order = get_user_order(user_id)
-
-    # Handle store status changes (owner only)
-    if data.startswith("store_"):
-        if user_id != OWNER_CHAT_ID:
-            await query.edit_message_text("⛔ Sorry, only the store owner can change store status.")
-            return
-            
-        if data == "store_open":
-            state.store_status = StoreStatus.OPEN
-            status_text = "🟢 Store is now OPEN"
-        else:  # store_close
-            state.store_status = StoreStatus.CLOSED
-            status_text = "🔴 Store is now CLOSED"
-            
-        await query.edit_message_text(
-            f"🏪 Store Status Updated\n\n{status_text}"
-        )
+async def handle_store(query: Update.callback_query, context: ContextTypes.DEFAULT_TYPE, action, order: UserOrder):
+    """Handle store status changes (owner only)"""
+    if query.from_user.id != OWNER_CHAT_ID:
+        await edit_message_text(query, "⛔ Sorry, only the store owner can change store status.")
         return
 
-    if data == "order_now":
-        # Check if store is open
-        if state.store_status == StoreStatus.CLOSED:
-            if query.message.photo:
-                # If it's a photo message, send a new message
-                await query.message.reply_text(
-                    "😔 Sorry, the store is currently closed. Please try again later!"
-                )
-            else:
-                # If it's a text message, edit it
-                await query.edit_message_text(
-                    "😔 Sorry, the store is currently closed. Please try again later!"
-                )
-            return
-            
-        # Show categories
-        keyboard = [[InlineKeyboardButton(cat, callback_data=f"cat_{cat}")] for cat in MENU]
+    if action.arg == "open":
+        state.store_status = StoreStatus.OPEN
+        status_text = "🟢 Store is now OPEN"
+    else:  # close
+        state.store_status = StoreStatus.CLOSED
+        status_text = "🔴 Store is now CLOSED"
+
+    await edit_message_text(
+        query,
+        f"🏪 Store Status Updated\n\n{status_text}"
+    )
+
+async def handle_order_now(query: Update.callback_query, context: ContextTypes.DEFAULT_TYPE, action, order: UserOrder):
+    # Check if store is open
+    if state.store_status == StoreStatus.CLOSED:
         if query.message.photo:
-            # If the message has a photo, send a new message
-            await query.message.reply_text(
-                "Choose a category:",
-                reply_markup=InlineKeyboardMarkup(keyboard)
+            # If it's a photo message, send a new message
+            await reply_text(
+                query.message,
+                "😔 Sorry, the store is currently closed. Please try again later!"
             )
         else:
-            # If it's a text message, we can edit it
-            await query.edit_message_text(
-                "What do you want to order?:",
-                reply_markup=InlineKeyboardMarkup(keyboard)
+            # If it's a text message, edit it
+            await edit_message_text(
+                query,
+                "😔 Sorry, the store is currently closed. Please try again later!"
             )
-        order.state = OrderState.SELECTING_CATEGORY
-
-    elif data.startswith("cat_"):
-        category = data[4:]
-        order.current_item = OrderItem(category=category, item=None)
-        # Show items
-        items = MENU[category]
-        keyboard = [[InlineKeyboardButton(item, callback_data=f"item_{item}")] for item in items]
-        await query.edit_message_text(f"{category} Menu:", reply_markup=InlineKeyboardMarkup(keyboard))
-        order.state = OrderState.SELECTING_ITEM
-
-    elif data.startswith("item_"):
-        item = data[5:]
-        order.current_item.set_item(item)
-        # Show sweetness options
-        keyboard = [[InlineKeyboardButton(level, callback_data=f"sweet_{level}")] for level in SWEET_LEVELS]
-        await query.edit_message_text("Choose your sweetness level:", reply_markup=InlineKeyboardMarkup(keyboard))
-        order.state = OrderState.SELECTING_SWEETNESS
-
-    elif data.startswith("sweet_"):
-        sweet = data[6:]
-        order.current_item.sweetness = sweet
-        order.add_item(order.current_item)
-        
-        # Show order summary and options
-        summary = format_order_summary(order)
-        keyboard = []
-        
-        # Add "Order More" button if under limit
-        if order.can_add_more():
-            keyboard.append([InlineKeyboardButton("🛍️ Order More", callback_data="order_more")])
-        
-        # Always add "Confirm Order" button
-        keyboard.append([InlineKeyboardButton("✅ Confirm Order", callback_data="confirm_order")])
-        
-        await query.edit_message_text(
-            f"{summary}\n\nWhat would you like to do?",
-            reply_markup=InlineKeyboardMarkup(keyboard),
-            parse_mode="MarkdownV2"
-        )
-        order.state = OrderState.CONFIRMING_ORDER
+        return
 
-    elif data == "order_more":
-        if not order.can_add_more():
-            await query.edit_message_text(
-                f"You've reached the maximum limit of {MAX_DRINKS_PER_ORDER} drinks per order.",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("✅ Confirm Order", callback_data="confirm_order")]])
-            )
-            return
-            
-        # Show categories again
-        keyboard = [[InlineKeyboardButton(cat, callback_data=f"cat_{cat}")] for cat in MENU]
-        await query.edit_message_text(
-            "Choose another drink category:",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+    # Show categories
+    if query.message.photo:
+        # If the message has a photo, send a new message
+        await reply_text(
+            query.message,
+            "Choose a category:",
+            reply_markup=keyboards.categories
         )
-        order.state = OrderState.SELECTING_CATEGORY
-
-    elif data == "confirm_order":
-        # Show payment method selection
-        await show_payment_methods(query, order)
-        order.state = OrderState.SELECTING_PAYMENT
-
-    elif data.startswith("pay_"):
-        payment_method = data[4:]  # Extract payment method (cash or aba)
-        order.payment_method = payment_method
-        
-        # Send order to owner and save to database
-        username = query.from_user.username or query.from_user.full_name
-        
-        # Save order to database
-        order_items = [item.to_dict() for item in order.items]
-        await save_order(
-            user_id=user_id,
-            username=username,
-            items=order_items,
-            total_amount=order.get_total_price(),
-            payment_method=payment_method
+    else:
+        # If it's a text message, we can edit it
+        await edit_message_text(
+            query,
+            "What do you want to order?:",
+            reply_markup=keyboards.categories
         )
-        
-        # Send order to owner
-        await send_order_to_owner(context, user_id, username)
-        
-        try:
-            if payment_method == PaymentMethod.ABA:
-                # Create clickable link using markdown
-                msg = (
-                    f"{format_order_summary(order)}\n\n"
-                    f"Please complete your payment using this link:\n"
-                    f"[Click here to pay with ABA]({ABA_PAYMENT_LINK})\n\n"
-                    f"Your order will be processed after payment confirmation\\."
-                )
-            else:  # cash
-                msg = (
-                    f"{format_order_summary(order)}\n\n"
-                    f"Thank you\\! Please pay in cash when picking up your order\\."
-                )
-            
-            # For messages with photo, send new message instead of editing
-            if query.message.photo:
-                await query.message.reply_text(
-                    msg,
-                    parse_mode="MarkdownV2"
-                )
-            else:
-                await query.edit_message_text(
-                    msg,
-                    parse_mode="MarkdownV2"
-                )
-        except Exception as e:
-            logger.error(f"Error sending payment confirmation: {str(e)}")
-            # Fallback message without markdown
-            fallback_msg = "Thank you for your order! "
-            if payment_method == PaymentMethod.ABA:
-                fallback_msg += f"Please complete your payment at: {ABA_PAYMENT_LINK}"
-            else:
-                fallback_msg += "Please pay in cash when picking up your order."
-            
-            if query.message.photo:
-                await query.message.reply_text(fallback_msg)
-            else:
-                await query.edit_message_text(fallback_msg)
-        
-        # Clear the order after confirmation
-        order.clear()
-
-    elif data.startswith("done_"):
-        customer_id = int(data[5:])
-        await context.bot.send_message(
-            chat_id=customer_id,
-            text="✅ Your drinks are ready! Please come and pick them up."
+    order.state = OrderState.SELECTING_CATEGORY
+
+async def restart_selection(query: Update.callback_query, order: UserOrder):
+    """Send the customer back to the category list when a button no longer matches their cart"""
+    order.current_item = None
+    order.state = OrderState.SELECTING_CATEGORY
+    await edit_message_text(
+        query,
+        "That selection is no longer available. Please choose a category:",
+        reply_markup=keyboards.categories
+    )
+
+async def handle_stale_menu(query: Update.callback_query, context: ContextTypes.DEFAULT_TYPE, action, order: UserOrder):
+    # Button from an older version of the menu
+    await restart_selection(query, order)
+
+async def handle_category(query: Update.callback_query, context: ContextTypes.DEFAULT_TYPE, action, order: UserOrder):
+    category = action.arg
+    order.current_item = OrderItem(category=category, item=None)
+    # Show items
+    await edit_message_text(query, f"{category} Menu:", reply_markup=keyboards.items[category])
+    order.state = OrderState.SELECTING_ITEM
+
+async def handle_item(query: Update.callback_query, context: ContextTypes.DEFAULT_TYPE, action, order: UserOrder):
+    item = action.arg  # MenuItem from the catalog
+    if order.current_item is None or item.category != order.current_item.category:
+        await restart_selection(query, order)
+        return
+    order.current_item.set_item(item.name, item.price)
+    # Show sweetness options
+    await edit_message_text(query, "Choose your sweetness level:", reply_markup=keyboards.sweetness)
+    order.state = OrderState.SELECTING_SWEETNESS
+
+async def handle_sweetness(query: Update.callback_query, context: ContextTypes.DEFAULT_TYPE, action, order: UserOrder):
+    if order.current_item is None or order.current_item.item is None:
+        await restart_selection(query, order)
+        return
+    order.current_item.sweetness = action.arg
+    order.add_item(order.current_item)
+
+    # Show order summary and options
+    summary = format_order_summary(order)
+
+    # "Order More" only while under the limit; "Confirm Order" always
+    max_drinks = get_catalog().max_drinks_per_order
+    keyboard = keyboards.order_more_or_confirm if order.can_add_more(max_drinks) else keyboards.confirm_only
+
+    await edit_message_text(
+        query,
+        f"{summary}\n\nWhat would you like to do?",
+        reply_markup=keyboard,
+        parse_mode="MarkdownV2"
+    )
+    order.state = OrderState.CONFIRMING_ORDER
+
+async def handle_order_more(query: Update.callback_query, context: ContextTypes.DEFAULT_TYPE, action, order: UserOrder):
+    max_drinks = get_catalog().max_drinks_per_order
+    if not order.can_add_more(max_drinks):
+        await edit_message_text(
+            query,
+            f"You've reached the maximum limit of {max_drinks} drinks per order.",
+            reply_markup=keyboards.confirm_only
         )
-        await query.edit_message_text("✅ Order marked as complete.") 
\ No newline at end of file
+        return
+
+    # Show categories again
+    await edit_message_text(
+        query,
+        "Choose another drink category:",
+        reply_markup=keyboards.categories
+    )
+    order.state = OrderState.SELECTING_CATEGORY
+
+async def handle_confirm_order(query: Update.callback_query, context: ContextTypes.DEFAULT_TYPE, action, order: UserOrder):
+    if not order.items:
+        # Button from an order that was already placed or discarded
+        await restart_selection(query, order)
+        return
+    # Show payment method selection
+    await show_payment_methods(query, order)
+    order.state = OrderState.SELECTING_PAYMENT
+
+async def handle_payment(query: Update.callback_query, context: ContextTypes.DEFAULT_TYPE, action, order: UserOrder):
+    if not order.items:
+        # A double tap, or a tap after the cart was discarded: there is nothing to order
+        await restart_selection(query, order)
+        return
+    user_id = query.from_user.id
+    payment_method = action.arg  # cash or aba
+    order.payment_method = payment_method
+
+    # Send order to owner and save to database
+    username = query.from_user.username or query.from_user.full_name
+
+    # Queue order for the background writer; the customer doesn't wait for the commit
+    order_key = new_order_key()
+    order_items = [item.to_dict() for item in order.items]
+    order_writer.submit(
+        user_id=user_id,
+        username=username,
+        items=order_items,
+        total_amount=order.get_total_price(),
+        payment_method=payment_method,
+        order_key=order_key
+    )
+
+    # Send order to owner: its own message, or the next update of the open orders board
+    pending = owner_feed.add(order_key, user_id, username, order)
+    if owner_feed.board_mode:
+        owner_feed.schedule_refresh(context.bot)
+    else:
+        notify_owner(context, pending)
+
+    try:
+        msg = render_payment_instructions(format_order_summary(order), payment_method, ABA_PAYMENT_LINK)
+
+        # For messages with photo, send new message instead of editing
+        if query.message.photo:
+            await reply_text(
+                query.message,
+                msg,
+                parse_mode="MarkdownV2"
+            )
+        else:
+            await edit_message_text(
+                query,
+                msg,
+                priority=Priority.CUSTOMER,
+                parse_mode="MarkdownV2"
+            )
+    except Exception as e:
+        logger.error(f"Error sending payment confirmation: {str(e)}")
+        # Fallback message without markdown
+        fallback_msg = "Thank you for your order! "
+        if payment_method == PaymentMethod.ABA:
+            fallback_msg += f"Please complete your payment at: {ABA_PAYMENT_LINK}"
+        else:
+            fallback_msg += "Please pay in cash when picking up your order."
+
+        if query.message.photo:
+            await reply_text(query.message, fallback_msg)
+        else:
+            await edit_message_text(query, fallback_msg)
+
+    # Clear the order after confirmation and release the session
+    order.clear()
+    user_orders.discard(user_id)
+
+async def handle_done(query: Update.callback_query, context: ContextTypes.DEFAULT_TYPE, action, order: UserOrder):
+    """Complete orders: "done_all" (board), "done_<order key>_<user>", or "done_<user>" from older messages"""
+    if query.from_user.id != OWNER_CHAT_ID:
+        return
+
+    if action.arg == "all":
+        # The board redraw shows the result
+        await owner_feed.complete_shown(context.bot)
+        return
+
+    order_key, _, customer_id = action.arg.partition("_")
+    if not customer_id:
+        await owner_feed.notify_ready(context.bot, [int(order_key)])
+        await edit_message_text(query, "✅ Order marked as complete.")
+        return
+
+    completed = await owner_feed.complete_button(context.bot, order_key, int(customer_id))
+    if owner_feed.is_board(query.message):
+        return
+    number = order_number(order_key)
+    if completed:
+        await edit_message_text(query, f"✅ Order #{number} marked as complete.")
+    else:
+        await edit_message_text(query, f"ℹ️ Order #{number} was already completed.")
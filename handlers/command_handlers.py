@@ -1,13 +1,16 @@
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update
 from telegram.ext import ContextTypes
 from config import logger, OWNER_CHAT_ID, StoreStatus, state
+from keyboards import keyboards
+from catalog import reload_catalog
 from .image_handler import send_menu_image
+from outbound import reply_text
+from owner_feed import owner_feed
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start command handler"""
+    keyboard_markup = keyboards.order_now
     try:
-        keyboard = [[InlineKeyboardButton("🛒 Order Now", callback_data="order_now")]]
-        keyboard_markup = InlineKeyboardMarkup(keyboard)
         welcome_message = "Hi, welcome to BoBa Slow-Ba Cafe. What would you like to order?\n\nType /help to see all available commands."
         
         # Get or send menu image with welcome message and keyboard
@@ -24,13 +27,15 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             # Fallback if image is not available
             logger.warning("Sending welcome message without menu image")
-            await update.message.reply_text(
+            await reply_text(
+                update.message,
                 welcome_message,
                 reply_markup=keyboard_markup
             )
     except Exception as e:
         logger.error(f"Error in start command: {str(e)}")
-        await update.message.reply_text(
+        await reply_text(
+            update.message,
             "Welcome to BoBa Slow-Ba Cafe! I apologize, but I'm having trouble showing you our menu image. "
             "Please try the Order Now button below.",
             reply_markup=keyboard_markup
@@ -42,22 +47,77 @@ async def store_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Check if the user is the owner
     if user_id != OWNER_CHAT_ID:
-        await update.message.reply_text(
+        await reply_text(
+            update.message,
             "⛔ Sorry, only the store owner can use this command."
         )
         return
 
-    # Create keyboard with store status options
-    keyboard = [
-        [
-            InlineKeyboardButton("🟢 Open Store", callback_data="store_open"),
-            InlineKeyboardButton("🔴 Close Store", callback_data="store_close")
-        ]
-    ]
-    
     current_status = "🟢 Open" if state.store_status == StoreStatus.OPEN else "🔴 Closed"
     
-    await update.message.reply_text(
+    await reply_text(
+        update.message,
         f"🏪 Store Status Management\n\nCurrent status: {current_status}\n\nSelect new status:",
-        reply_markup=InlineKeyboardMarkup(keyboard)
-    ) 
\ No newline at end of file
+        reply_markup=keyboards.store_status
+    )
+
+async def reload_menu_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /reloadmenu command - owner only"""
+    if update.effective_user.id != OWNER_CHAT_ID:
+        await reply_text(
+            update.message,
+            "⛔ Sorry, only the store owner can use this command."
+        )
+        return
+
+    try:
+        changed, catalog, elapsed = await reload_catalog()
+    except Exception as e:
+        logger.error(f"Menu reload failed: {str(e)}")
+        await reply_text(update.message, f"❌ Menu reload failed, the current menu is still active.\n\n{e}")
+        return
+
+    status = "✅ Menu updated" if changed else "ℹ️ Menu unchanged"
+    await reply_text(
+        update.message,
+        f"{status}\n\nVersion: {catalog.version}\n"
+        f"Items: {len(catalog.items)} in {len(catalog.categories)} categories\n"
+        f"Reloaded in {elapsed * 1000:.1f} ms"
+    )
+
+async def done_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /done <order numbers...> or /done all - owner only"""
+    if update.effective_user.id != OWNER_CHAT_ID:
+        await reply_text(
+            update.message,
+            "⛔ Sorry, only the store owner can use this command."
+        )
+        return
+
+    args = [arg.lstrip("#").upper() for arg in context.args or []]
+    not_open, ambiguous = [], []
+    if args == ["ALL"]:
+        order_keys = [pending.order_key for pending in owner_feed.open_orders()]
+    elif args and all(arg.isalnum() for arg in args):
+        order_keys = []
+        for number in args:
+            matches = owner_feed.resolve(number)
+            if len(matches) == 1:
+                order_keys.extend(matches)
+            else:
+                (ambiguous if matches else not_open).append(number)
+    else:
+        await reply_text(update.message, "Usage: /done <order numbers...> or /done all")
+        return
+
+    completed = await owner_feed.complete(context.bot, order_keys)
+
+    text = f"✅ Completed {len(completed)} order(s)"
+    if completed:
+        text += ": " + ", ".join(f"#{pending.number}" for pending in completed)
+    if not_open:
+        text += "\nNot open: " + ", ".join(f"#{number}" for number in not_open)
+    if ambiguous:
+        text += "\nMatches several orders, type more of the number: " + \
+            ", ".join(f"#{number}" for number in ambiguous)
+    await reply_text(update.message, text)
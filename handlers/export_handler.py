@@ -0,0 +1,101 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List, Optional, Tuple
+from telegram import Update
+from telegram.ext import ContextTypes
+from config import logger, OWNER_CHAT_ID, EXPORT_MAX_BYTES
+from database import run_read_only, period_start
+from sales_export import EXPORT_FORMATS, export_sales, parquet_available
+from outbound import Priority, reply_text, send_document
+import metrics
+
+USAGE = (
+    "Usage: /export <from> [to] [csv|parquet]\n"
+    "Dates are YYYY-MM-DD (UTC, both days included), or use day, week, month or overall.\n"
+    "Example: /export 2024-01-01 2024-01-31 parquet"
+)
+
+# One export at a time keeps disk use and database load bounded
+_export_lock = asyncio.Lock()
+
+def parse_export_args(args: List[str], now: datetime) -> Optional[Tuple[datetime, datetime, str]]:
+    """(start, end, format) with end exclusive, or None if the arguments don't parse"""
+    args = list(args)
+    fmt = "csv"
+    if args and args[-1].lower() in EXPORT_FORMATS:
+        fmt = args.pop().lower()
+    if not args or len(args) > 2:
+        return None
+
+    if len(args) == 1 and args[0].lower() in ('day', 'week', 'month', 'overall'):
+        return period_start(args[0].lower(), now), now + timedelta(seconds=1), fmt
+    try:
+        # Dates are UTC days; a naive bound would be read in the database session's TimeZone
+        dates = [datetime.strptime(arg, "%Y-%m-%d").replace(tzinfo=timezone.utc) for arg in args]
+    except ValueError:
+        return None
+    start = dates[0]
+    end = dates[1] + timedelta(days=1) if len(dates) > 1 else now + timedelta(seconds=1)
+    if end <= start:
+        return None
+    return start, end, fmt
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /export <from> [to] [csv|parquet] - owner only"""
+    if update.effective_user.id != OWNER_CHAT_ID:
+        await reply_text(
+            update.message,
+            "⛔ Sorry, only the store owner can use this command."
+        )
+        return
+
+    parsed = parse_export_args(context.args or [], datetime.now(timezone.utc))
+    if parsed is None:
+        await reply_text(update.message, USAGE, priority=Priority.OWNER)
+        return
+    start, end, fmt = parsed
+    if fmt == "parquet" and not parquet_available():
+        await reply_text(update.message, "❌ Parquet export needs pyarrow installed. Use csv instead.",
+                         priority=Priority.OWNER)
+        return
+    if _export_lock.locked():
+        await reply_text(update.message, "⏳ Another export is still running, please wait for it.",
+                         priority=Priority.OWNER)
+        return
+
+    async with _export_lock:
+        await reply_text(update.message, "⏳ Preparing the export...", priority=Priority.OWNER)
+        path: Optional[Path] = None
+        try:
+            started = asyncio.get_running_loop().time()
+            path, rows = await run_read_only(export_sales, start, end, fmt)
+            metrics.observe('export.duration', asyncio.get_running_loop().time() - started)
+            size = path.stat().st_size
+            metrics.increment('export.rows', max(rows, 0))
+            if size > EXPORT_MAX_BYTES:
+                await reply_text(
+                    update.message,
+                    f"❌ The export is {size // (1024 * 1024)} MB, over Telegram's upload limit. "
+                    "Please choose a shorter date range.",
+                    priority=Priority.OWNER
+                )
+                return
+
+            last_day = (end - timedelta(days=1)).date() if end.time() == datetime.min.time() else end.date()
+            await send_document(
+                context.bot,
+                chat_id=update.effective_chat.id,
+                priority=Priority.OWNER,
+                document=path,
+                filename=f"sales_{start:%Y%m%d}_{last_day:%Y%m%d}.{fmt}",
+                caption=f"📦 {rows} orders from {start:%Y-%m-%d} to {last_day:%Y-%m-%d}",
+                read_timeout=120,
+                write_timeout=120
+            )
+        except Exception as e:
+            logger.error(f"Sales export failed: {str(e)}")
+            await reply_text(update.message, f"❌ Export failed: {e}", priority=Priority.OWNER)
+        finally:
+            if path is not None:
+                path.unlink(missing_ok=True)
@@ -1,6 +1,7 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from config import OWNER_CHAT_ID
+from outbound import reply_text
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show available commands"""
@@ -22,6 +23,9 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 /store \\- Manage store status \\(open/close\\)
 /sales \\- View sales reports and statistics
+/reloadmenu \\- Reload the menu and prices without a restart
+/done \\- Complete orders by number, e\\.g\\. /done 3FA9C1 B20E47, or /done all
+/export \\- Download orders as CSV or Parquet, e\\.g\\. /export 2024\\-01\\-01 2024\\-01\\-31
 """
 
     # Format the help message
@@ -31,7 +35,8 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
     help_text += "\nℹ️ Use these commands to interact with the bot\\."
 
-    await update.message.reply_text(
+    await reply_text(
+        update.message,
         help_text,
         parse_mode="MarkdownV2"
     )
\ No newline at end of file
@@ -1,55 +1,167 @@
+import asyncio
+import time
+from pathlib import Path
+from typing import Dict, Optional
 from telegram.ext import ContextTypes
-from config import logger, MENU_IMAGE_PATH
+from config import logger, MENU_IMAGE_PATH, MENU_IMAGE_ALBUM, MENU_WATCH_INTERVAL, OWNER_CHAT_ID
+from catalog import get_catalog
+from image_pipeline import ALBUM_MAX_SIZE, find_category_images, optimize_image
+from media_cache import CachedAlbum, CachedImage, media_cache
+from outbound import Priority, outbound, send_photo, send_media_group, send_message
+import metrics
 
-# Global variable to store the file_id
-MENU_IMAGE_FILE_ID = None
+# The menu image, sent as an optimized variant by its cached file_id once uploaded
+menu_image = CachedImage(MENU_IMAGE_PATH, media_cache, variant=optimize_image)
+
+# Per-category images and the album they form with the menu image
+_category_images: Dict[Path, CachedImage] = {}
+_albums: Dict[tuple, CachedAlbum] = {}
+
+def get_menu_album() -> Optional[CachedAlbum]:
+    """menu.jpg followed by the category images in images/, or None if there are none (blocking)"""
+    if not MENU_IMAGE_ALBUM:
+        return None
+    paths = find_category_images(get_catalog().categories)[:ALBUM_MAX_SIZE - 1]
+    if not paths:
+        return None
+    key = tuple(paths)
+    album = _albums.get(key)
+    if album is None:
+        for path in paths:
+            if path not in _category_images:
+                _category_images[path] = CachedImage(path, media_cache, variant=optimize_image)
+        album = _albums[key] = CachedAlbum([menu_image] + [_category_images[path] for path in paths], media_cache)
+    return album
 
 async def send_menu_image(chat_id: int, context: ContextTypes.DEFAULT_TYPE, caption: str = None, reply_markup = None) -> str:
-    """Send menu image and return its file_id"""
-    global MENU_IMAGE_FILE_ID
-    
+    """Send menu image (or the menu album) and return the first photo's file_id"""
+    started = time.monotonic()
+    file_ids = None
     try:
-        if MENU_IMAGE_FILE_ID:
-            # If we have file_id, use it to send the photo
-            try:
-                await context.bot.send_photo(
-                    chat_id=chat_id,
-                    photo=MENU_IMAGE_FILE_ID,
-                    caption=caption,
-                    reply_markup=reply_markup,
-                    read_timeout=30,
-                    write_timeout=30
+        album = await asyncio.to_thread(get_menu_album)
+        if album is not None:
+            file_ids = await album.send(
+                lambda **kwargs: send_media_group(
+                    context.bot, chat_id=chat_id, read_timeout=60, write_timeout=60, **kwargs
                 )
-                return MENU_IMAGE_FILE_ID
-            except Exception as e:
-                logger.warning(f"Failed to send photo with file_id, trying with local file: {str(e)}")
-                MENU_IMAGE_FILE_ID = None  # Reset file_id if it's invalid
-    
-        if not MENU_IMAGE_PATH.exists():
-            logger.error(f"Menu image not found at {MENU_IMAGE_PATH.absolute()}")
-            return None
-                
-        if MENU_IMAGE_PATH.stat().st_size == 0:
-            logger.error("Menu image file is empty")
-            return None
-                
-        with open(MENU_IMAGE_PATH, 'rb') as photo:
-            try:
-                message = await context.bot.send_photo(
-                    chat_id=chat_id,
-                    photo=photo,
-                    caption=caption,
-                    reply_markup=reply_markup,
-                    read_timeout=30,
-                    write_timeout=30
-                )
-                MENU_IMAGE_FILE_ID = message.photo[-1].file_id
-                logger.info(f"Successfully uploaded menu image, file_id: {MENU_IMAGE_FILE_ID}")
-                return MENU_IMAGE_FILE_ID
-            except Exception as e:
-                logger.error(f"Failed to send photo: {str(e)}")
-                return None
-                    
+            )
+            if not file_ids:
+                logger.warning("Menu album unavailable, sending the menu image only")
+    except Exception as e:
+        logger.error(f"Error sending menu album: {str(e)}")
+
+    if file_ids:
+        metrics.observe('menu.photo_latency', time.monotonic() - started)
+        # Albums can't carry buttons, so the caption and keyboard follow as a message
+        if caption:
+            await send_message(context.bot, chat_id=chat_id, text=caption, reply_markup=reply_markup)
+        return file_ids[0]
+
+    def send(**kwargs):
+        return send_photo(
+            context.bot,
+            chat_id=chat_id,
+            caption=caption,
+            reply_markup=reply_markup,
+            read_timeout=30,
+            write_timeout=30,
+            **kwargs
+        )
+
+    try:
+        file_id = await menu_image.send(send)
     except Exception as e:
         logger.error(f"Error handling menu image: {str(e)}")
-        return None 
\ No newline at end of file
+        return None
+    if file_id:
+        metrics.observe('menu.photo_latency', time.monotonic() - started)
+    return file_id
+
+def _cached_file_ids(album: Optional[CachedAlbum]) -> bool:
+    images = album.images if album is not None else (menu_image,)
+    return all(image.file_id for image in images)
+
+async def warm_up_menu_image(bot):
+    """Upload the menu image (and album) ahead of the first /start, unless this version is already cached.
+
+    The upload goes to the owner's chat without a notification and the
+    messages are deleted again; their file_ids stay valid.
+    """
+    album = await asyncio.to_thread(get_menu_album)
+    if await asyncio.to_thread(_cached_file_ids, album):
+        return
+
+    async def delete(message):
+        try:
+            await outbound.submit(
+                OWNER_CHAT_ID, lambda: bot.delete_message(OWNER_CHAT_ID, message.message_id), Priority.EDIT
+            )
+        except Exception as e:
+            logger.warning(f"Could not delete menu image warm-up message: {str(e)}")
+
+    if album is not None:
+        async def upload_album(**kwargs):
+            messages = await send_media_group(
+                bot,
+                chat_id=OWNER_CHAT_ID,
+                priority=Priority.EDIT,
+                disable_notification=True,
+                read_timeout=60,
+                write_timeout=60,
+                **kwargs
+            )
+            for message in messages:
+                await delete(message)
+            return messages
+
+        if await album.send(upload_album):
+            return
+
+    async def upload(**kwargs):
+        message = await send_photo(
+            bot,
+            chat_id=OWNER_CHAT_ID,
+            priority=Priority.EDIT,
+            disable_notification=True,
+            read_timeout=30,
+            write_timeout=30,
+            **kwargs
+        )
+        await delete(message)
+        return message
+
+    await menu_image.send(upload)
+
+class MenuImageWarmer:
+    """Background task that uploads the menu image at startup and again whenever the file changes"""
+
+    def __init__(self, interval: float = MENU_WATCH_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, bot):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(bot), name="menu-image-warmer")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self, bot):
+        while True:
+            try:
+                await warm_up_menu_image(bot)
+            except Exception as e:
+                logger.error(f"Menu image warm-up failed: {str(e)}")
+            if self.interval <= 0:
+                return
+            await asyncio.sleep(self.interval)
+
+# Global warmer instance
+menu_image_warmer = MenuImageWarmer()
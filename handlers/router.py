@@ -0,0 +1,139 @@
+"""Callback query routing.
+
+callback_data is parsed once into an Action and dispatched through hash
+tables. Every payload the bot issues, except the per-order done_ buttons,
+is precomputed for the current catalog, so parsing it is one exact-match
+lookup. The done_ buttons of open orders are known to the owner feed; older
+ones (after a restart, or past OWNER_FEED_ORDER_TTL) have their format
+checked, and the rest go by the prefix before the first underscore.
+Menu buttons (cat_/item_/sweet_) carry compact catalog ids that are
+resolved here; if they come from an older menu version they become a
+"stale_menu" action that restarts the selection. Any other payload that
+doesn't parse is dropped after answering the query.
+"""
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional
+from telegram import Update
+from telegram.ext import ContextTypes
+from config import logger, PaymentMethod
+from catalog import MenuCatalog, get_catalog, on_catalog_change
+from owner_feed import owner_feed
+import metrics
+from .callback_handlers import (
+    user_orders, get_user_order,
+    handle_store, handle_order_now, handle_category, handle_item, handle_sweetness, handle_stale_menu,
+    handle_order_more, handle_confirm_order, handle_payment, handle_done
+)
+from .sales_handler import handle_sales_period, SALES_PERIODS
+
+class Action(NamedTuple):
+    kind: str
+    # Raw argument, or the resolved catalog entry for menu buttons
+    arg: Any = None
+
+class Route(NamedTuple):
+    handler: Callable[..., Awaitable]
+    # Whether the action works on the user's cart (owner actions don't)
+    uses_cart: bool
+
+# Payloads without an argument
+_EXACT_ACTIONS: Dict[str, Action] = {
+    "order_now": Action("order_now"),
+    "order_more": Action("order_more"),
+    "confirm_order": Action("confirm_order"),
+}
+
+_STALE_MENU = Action("stale_menu")
+
+# Builds an Action from a (kind, arg) tuple without going through the Python-level __new__
+_new_action = tuple.__new__
+
+# Menu buttons, decoded through the current catalog
+_MENU_KINDS = frozenset(("cat", "item", "sweet"))
+
+# Characters of an order key in "done_<order key>_<user>"
+_HEX_DIGITS = b"0123456789abcdef"
+
+# Prefixed payloads: prefix -> the arguments we issue
+_PREFIX_VALUES = {
+    "store": ("open", "close"),
+    "pay": (PaymentMethod.CASH, PaymentMethod.ABA),
+    "sales": SALES_PERIODS,
+}
+
+ROUTES: Dict[str, Route] = {
+    "store": Route(handle_store, uses_cart=False),
+    "order_now": Route(handle_order_now, uses_cart=True),
+    "cat": Route(handle_category, uses_cart=True),
+    "item": Route(handle_item, uses_cart=True),
+    "sweet": Route(handle_sweetness, uses_cart=True),
+    "stale_menu": Route(handle_stale_menu, uses_cart=True),
+    "order_more": Route(handle_order_more, uses_cart=True),
+    "confirm_order": Route(handle_confirm_order, uses_cart=True),
+    "pay": Route(handle_payment, uses_cart=True),
+    "done": Route(handle_done, uses_cart=False),
+    "sales": Route(handle_sales_period, uses_cart=False),
+}
+
+# Every fixed payload of the current catalog -> its Action
+_known_actions: Dict[str, Action] = {}
+
+def _build_known_actions(catalog: MenuCatalog):
+    global _known_actions
+    actions = dict(_EXACT_ACTIONS)
+    actions["done_all"] = Action("done", "all")
+    for prefix, values in _PREFIX_VALUES.items():
+        actions.update((f"{prefix}_{value}", Action(prefix, value)) for value in values)
+    actions.update((catalog.category_data(category), Action("cat", category)) for category in catalog.categories)
+    actions.update((catalog.item_data(item), Action("item", item)) for item in catalog.items)
+    actions.update((catalog.sweetness_data(level), Action("sweet", level)) for level in catalog.sweet_levels)
+    # Swapped in whole, like the keyboards
+    _known_actions = actions
+
+_build_known_actions(get_catalog())
+on_catalog_change(_build_known_actions)
+
+def parse_callback_data(data: Optional[str]) -> Optional[Action]:
+    """Turn callback_data into an Action, or None if it isn't a payload we issue"""
+    if not data:
+        return None
+    action = _known_actions.get(data)
+    if action is not None:
+        return action
+    # Per-order Complete buttons can't be precomputed, but the owner feed knows the open ones
+    if owner_feed.is_open_button(data):
+        return _new_action(Action, ("done", data[5:]))
+    if data.startswith("done_"):
+        # Older buttons: "<order key>_<user>", "<order number>_<user>" or "<user>"
+        arg = data[5:]
+        key, key_sep, user = arg.rpartition("_")
+        # Deleting the hex digits from the key's bytes must leave nothing (non-ASCII never goes away)
+        if not user.isdecimal() or (key_sep and not (key and not key.encode().translate(None, _HEX_DIGITS))):
+            return None
+        return _new_action(Action, ("done", arg))
+    prefix, sep, arg = data.partition("_")
+    if prefix in _MENU_KINDS:
+        value = get_catalog().decode(prefix, arg)
+        return _new_action(Action, (prefix, value)) if value is not None else _STALE_MENU
+    # Every other payload we issue is in _known_actions
+    return None
+
+async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+
+    action = parse_callback_data(query.data)
+    if action is None:
+        metrics.increment('callbacks.rejected')
+        logger.info(f"Ignoring stale or unknown callback data: {query.data!r}")
+        return
+    metrics.increment(f'callbacks.{action.kind}')
+
+    route = ROUTES[action.kind]
+    user_id = query.from_user.id
+    order = await get_user_order(user_id) if route.uses_cart else None
+    try:
+        await route.handler(query, context, action, order)
+    finally:
+        if order is not None:
+            # Coalesced into the next cart flush
+            user_orders.mark_dirty(user_id)
@@ -1,35 +1,33 @@
-from http.server import HTTPServer, BaseHTTPRequestHandler
-import logging
-import os
+import json
+import tornado.web
+import metrics
+from database import is_db_ready
 
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
-logger = logging.getLogger(__name__)
+class HealthCheckHandler(tornado.web.RequestHandler):
+    """Liveness: the event loop is serving requests"""
 
-class HealthCheckHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        if self.path == '/health':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/plain')
-            self.end_headers()
-            self.wfile.write(b"OK")
-            logger.info("Health check request received")
-        else:
-            self.send_response(404)
-            self.send_header('Content-type', 'text/plain')
-            self.end_headers()
-            self.wfile.write(b"Not Found")
+    def get(self):
+        self.set_header('Content-type', 'text/plain')
+        self.write("OK")
 
-def run_health_server(port):
-    server_address = ('', port)
-    httpd = HTTPServer(server_address, HealthCheckHandler)
-    logger.info(f"Starting health check server on port {port}")
-    httpd.serve_forever()
+class ReadinessHandler(tornado.web.RequestHandler):
+    """Readiness: the bot is processing updates and the database pool is open"""
 
-if __name__ == '__main__':
-    # Get port from environment variable or use default
-    port = int(os.getenv('PORT', 10000))
-    run_health_server(port)
\ No newline at end of file
+    def initialize(self, bot_app):
+        self.bot_app = bot_app
+
+    def get(self):
+        checks = {
+            'bot': self.bot_app.running,
+            'database': is_db_ready()
+        }
+        self.set_status(200 if all(checks.values()) else 503)
+        self.set_header('Content-type', 'application/json')
+        self.write(json.dumps(checks))
+
+class MetricsHandler(tornado.web.RequestHandler):
+    """Counters, gauges and timings recorded in the metrics module"""
+
+    def get(self):
+        self.set_header('Content-type', 'application/json')
+        self.write(json.dumps(metrics.snapshot()))
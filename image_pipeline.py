@@ -0,0 +1,103 @@
+"""Size-optimized variants of menu images.
+
+Photos are resized to at most IMAGE_MAX_SIDE pixels and re-encoded as
+progressive JPEGs at IMAGE_QUALITY. Variants are written to
+IMAGE_VARIANT_DIR under a name derived from the source bytes and these
+settings, so they are generated once, reused across restarts, and replaced
+when the source image or the settings change.
+
+Pillow is optional: without it (or if a file can't be decoded) the original
+image is used.
+"""
+import hashlib
+import io
+import os
+import re
+from pathlib import Path
+from typing import Iterable, List
+from config import logger, IMAGES_DIR, IMAGE_VARIANT_DIR, IMAGE_MAX_SIDE, IMAGE_QUALITY
+import metrics
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow not installed: send originals
+    Image = None
+
+# Bump when the encoding below changes, so existing variants are regenerated
+VARIANT_VERSION = 1
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+# Telegram albums hold 2 to 10 photos
+ALBUM_MAX_SIZE = 10
+
+def _variant_key(data: bytes) -> str:
+    settings = f"{VARIANT_VERSION}:{IMAGE_MAX_SIDE}:{IMAGE_QUALITY}".encode()
+    return hashlib.sha256(settings + data).hexdigest()[:16]
+
+def _encode(data: bytes) -> bytes:
+    with Image.open(io.BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE), Image.LANCZOS)
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        out = io.BytesIO()
+        img.save(out, "JPEG", quality=IMAGE_QUALITY, optimize=True, progressive=True)
+    return out.getvalue()
+
+def optimize_image(source: Path) -> Path:
+    """Return the path of an optimized variant of source, generating it if needed.
+
+    Falls back to source itself when Pillow is missing, the image can't be
+    decoded, or re-encoding wouldn't make it smaller.
+    """
+    if Image is None:
+        return source
+    data = source.read_bytes()
+    target = IMAGE_VARIANT_DIR / f"{source.stem}.{_variant_key(data)}.jpg"
+    if target.exists():
+        return target
+
+    try:
+        encoded = _encode(data)
+    except Exception as e:
+        logger.warning(f"Could not optimize {source.name}, sending the original: {str(e)}")
+        return source
+    if len(encoded) >= len(data):
+        return source
+
+    try:
+        IMAGE_VARIANT_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_suffix(".tmp")
+        tmp_path.write_bytes(encoded)
+        os.replace(tmp_path, target)
+    except OSError as e:
+        logger.warning(f"Could not write image variant {target}: {str(e)}")
+        return source
+    _remove_old_variants(source.stem, keep=target)
+    metrics.increment('media.variants_generated')
+    logger.info(f"Optimized {source.name}: {len(data) // 1024} KB -> {len(encoded) // 1024} KB")
+    return target
+
+def _remove_old_variants(stem: str, keep: Path):
+    for path in IMAGE_VARIANT_DIR.glob(f"{stem}.{'?' * 16}.jpg"):
+        if path != keep:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+
+def find_category_images(categories: Iterable[str]) -> List[Path]:
+    """Images in IMAGES_DIR named after a category (e.g. "Milk Tea" -> milk_tea.jpg), in menu order"""
+    paths = []
+    for category in categories:
+        slug = _slug(category)
+        for ext in IMAGE_EXTENSIONS:
+            path = IMAGES_DIR / f"{slug}{ext}"
+            if path.is_file():
+                paths.append(path)
+                break
+    return paths
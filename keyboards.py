@@ -0,0 +1,61 @@
+"""Prebuilt inline keyboards.
+
+Every keyboard the ordering flow shows is built once from the menu catalog
+and shared between callbacks. InlineKeyboardMarkup objects are
+frozen, so handing out the same instance to every user is safe. The
+registry rebuilds itself whenever the catalog is swapped.
+"""
+from typing import Dict, List
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from catalog import MenuCatalog, get_catalog, on_catalog_change
+
+def _column(buttons: List[InlineKeyboardButton]) -> InlineKeyboardMarkup:
+    """One button per row"""
+    return InlineKeyboardMarkup([[button] for button in buttons])
+
+class KeyboardRegistry:
+    def __init__(self, catalog: MenuCatalog = None):
+        self.rebuild(catalog or get_catalog())
+
+    def rebuild(self, catalog: MenuCatalog):
+        """Build every menu-dependent keyboard; existing instances are replaced, never mutated"""
+        confirm = InlineKeyboardButton("✅ Confirm Order", callback_data="confirm_order")
+
+        self.categories = _column([
+            InlineKeyboardButton(cat, callback_data=catalog.category_data(cat)) for cat in catalog.categories
+        ])
+        self.items: Dict[str, InlineKeyboardMarkup] = {
+            cat: _column([InlineKeyboardButton(item.name, callback_data=catalog.item_data(item)) for item in items])
+            for cat, items in catalog.items_by_category.items()
+        }
+        self.sweetness = _column([
+            InlineKeyboardButton(level, callback_data=catalog.sweetness_data(level)) for level in catalog.sweet_levels
+        ])
+        self.order_more_or_confirm = _column([
+            InlineKeyboardButton("🛍️ Order More", callback_data="order_more"),
+            confirm
+        ])
+        self.confirm_only = _column([confirm])
+        self.payment = InlineKeyboardMarkup([[
+            InlineKeyboardButton("💵 Pay by Cash", callback_data="pay_cash"),
+            InlineKeyboardButton("🏦 Pay by ABA", callback_data="pay_aba")
+        ]])
+        self.order_now = _column([InlineKeyboardButton("🛒 Order Now", callback_data="order_now")])
+        self.store_status = InlineKeyboardMarkup([[
+            InlineKeyboardButton("🟢 Open Store", callback_data="store_open"),
+            InlineKeyboardButton("🔴 Close Store", callback_data="store_close")
+        ]])
+        self.sales_periods = InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("📅 Today", callback_data="sales_day"),
+                InlineKeyboardButton("📅 This Week", callback_data="sales_week")
+            ],
+            [
+                InlineKeyboardButton("📅 This Month", callback_data="sales_month"),
+                InlineKeyboardButton("📊 Overall", callback_data="sales_overall")
+            ]
+        ])
+
+# Global registry instance
+keyboards = KeyboardRegistry()
+on_catalog_change(keyboards.rebuild)
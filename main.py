@@ -1,32 +1,88 @@
-from telegram.ext import ApplicationBuilder, CommandHandler, CallbackQueryHandler
-from config import BOT_TOKEN, logger
-from handlers import start, button_handler, store_command
-from handlers.sales_handler import sales_command, sales_button_handler
+import asyncio
+from telegram.ext import Application, ApplicationBuilder, CommandHandler, CallbackQueryHandler
+from config import BOT_TOKEN, BOT_MODE, MAX_CONCURRENT_UPDATES, MENU_IMAGE_WARMUP, logger
+from database import init_db_pool, close_db_pool
+from order_writer import order_writer
+from order_spool import spool_replayer
+from outbound import outbound
+from owner_feed import owner_feed
+from update_processor import PerUserUpdateProcessor
+from webhook_server import start_http_server, stop_http_server, run_webhook
+from catalog import menu_watcher
+from partitions import partition_maintainer
+from handlers import start, button_handler, store_command, reload_menu_command, done_command
+from handlers.callback_handlers import user_orders
+from handlers.image_handler import menu_image_warmer
+from handlers.sales_handler import sales_command
+from handlers.export_handler import export_command
 from handlers.help_handler import help_command
 
+async def post_init(app: Application):
+    # Open the database pool once, before the first update is processed
+    await init_db_pool()
+    # Open the spool first so orders spooled before a restart are saved before new ones
+    await spool_replayer.start()
+    await order_writer.start()
+    await user_orders.start()
+    await menu_watcher.start()
+    partition_maintainer.start()
+    if MENU_IMAGE_WARMUP:
+        # Upload in the background so startup doesn't wait on it
+        menu_image_warmer.start(app.bot)
+    # Health checks (and webhook updates) are served from this event loop
+    start_http_server(app, webhook=BOT_MODE == "webhook")
+
+async def post_stop(app: Application):
+    await owner_feed.stop()
+    await menu_image_warmer.stop()
+    # Let queued messages go out while the bot can still send them
+    await outbound.drain()
+
+async def post_shutdown(app: Application):
+    await stop_http_server()
+    await menu_watcher.stop()
+    await partition_maintainer.stop()
+    # Flush queued orders before the pool goes away
+    await order_writer.stop()
+    await spool_replayer.stop()
+    await user_orders.stop()
+    await close_db_pool()
+
 def main():
     # Create the Application
-    app = ApplicationBuilder().token(BOT_TOKEN)\
+    builder = ApplicationBuilder().token(BOT_TOKEN)\
         .connection_pool_size(8)\
         .pool_timeout(30.0)\
         .connect_timeout(30.0)\
         .read_timeout(30.0)\
         .write_timeout(30.0)\
-        .build()
+        .concurrent_updates(PerUserUpdateProcessor(MAX_CONCURRENT_UPDATES))\
+        .post_init(post_init)\
+        .post_stop(post_stop)\
+        .post_shutdown(post_shutdown)
+    if BOT_MODE == "webhook":
+        # Updates arrive through our own HTTP server, so no long-polling updater
+        builder = builder.updater(None)
+    app = builder.build()
 
     # Add command handlers
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("store", store_command))
     app.add_handler(CommandHandler("sales", sales_command))
     app.add_handler(CommandHandler("help", help_command))
-    
-    # Add callback handlers
-    app.add_handler(CallbackQueryHandler(sales_button_handler, pattern="^sales_"))
+    app.add_handler(CommandHandler("reloadmenu", reload_menu_command))
+    app.add_handler(CommandHandler("done", done_command))
+    app.add_handler(CommandHandler("export", export_command))
+
+    # Add callback handler (every button is routed by handlers.router)
     app.add_handler(CallbackQueryHandler(button_handler))
 
     # Start the bot
-    logger.info("Bot is starting...")
-    app.run_polling()
+    logger.info(f"Bot is starting in {BOT_MODE} mode...")
+    if BOT_MODE == "webhook":
+        asyncio.run(run_webhook(app))
+    else:
+        app.run_polling()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,261 @@
+"""Uploaded image cache.
+
+Telegram returns a file_id for every uploaded photo, and sending that id
+again costs no upload. MediaCache keeps those ids in a small JSON file keyed
+by the SHA-256 of the image bytes, so a restart reuses them and an edited
+image (new hash) is uploaded again automatically.
+
+CachedImage wraps one image file: it notices when the file changes (by
+mtime and size), optionally sends a transformed variant of it (see
+image_pipeline), and makes sure only one upload of a given version runs at
+a time. Callers that arrive during an upload wait for it and then send the
+file_id. CachedAlbum does the same for a group of images sent as one album.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+from telegram import InputMediaPhoto
+from telegram.error import BadRequest
+from config import logger, MEDIA_CACHE_PATH
+import metrics
+
+class MediaCache:
+    """content hash -> Telegram file_id, persisted to a JSON file"""
+
+    def __init__(self, path: Path = MEDIA_CACHE_PATH):
+        self.path = Path(path)
+        self._file_ids: Dict[str, str] = {}
+        self._loaded = False
+
+    def _load(self):
+        self._loaded = True
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self._file_ids = dict(json.load(f))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable media cache {self.path}: {str(e)}")
+
+    def _save(self):
+        # Write to a temporary file first so a crash never leaves half a file
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._file_ids, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not write media cache {self.path}: {str(e)}")
+
+    def get(self, digest: str) -> Optional[str]:
+        if not self._loaded:
+            self._load()
+        return self._file_ids.get(digest)
+
+    def put(self, digest: str, file_id: str):
+        self.put_many({digest: file_id})
+
+    def put_many(self, file_ids: Dict[str, str]):
+        if not self._loaded:
+            self._load()
+        changed = {digest: file_id for digest, file_id in file_ids.items() if self._file_ids.get(digest) != file_id}
+        if changed:
+            self._file_ids.update(changed)
+            self._save()
+
+    def forget(self, digest: str):
+        if not self._loaded:
+            self._load()
+        if self._file_ids.pop(digest, None) is not None:
+            self._save()
+
+class CachedImage:
+    """An image file sent by file_id once it has been uploaded"""
+
+    def __init__(self, path: Path, cache: MediaCache, variant: Optional[Callable[[Path], Path]] = None):
+        self.path = Path(path)
+        self.cache = cache
+        # Maps the source file to the file actually sent (e.g. an optimized copy)
+        self.variant = variant
+        self._stat: Optional[Tuple[float, int]] = None
+        self._sent_path: Optional[Path] = None
+        self._digest: Optional[str] = None
+        # digest() runs in worker threads; one of them hashes while the others wait
+        self._lock = threading.Lock()
+        self._uploads: Dict[str, asyncio.Future] = {}
+
+    def digest(self) -> Optional[str]:
+        """Hash of the bytes that get sent (recomputed only when the file's mtime/size change).
+
+        Returns None if the file is missing or empty. Blocking: call it from a worker thread.
+        """
+        with self._lock:
+            try:
+                st = self.path.stat()
+            except OSError:
+                self._stat = self._sent_path = self._digest = None
+                return None
+            stat = (st.st_mtime, st.st_size)
+            if stat != self._stat:
+                if st.st_size:
+                    self._sent_path = self.variant(self.path) if self.variant else self.path
+                    self._digest = hashlib.sha256(self._sent_path.read_bytes()).hexdigest()
+                else:
+                    self._sent_path = self._digest = None
+                self._stat = stat
+            return self._digest
+
+    def read(self) -> bytes:
+        """Bytes to upload (blocking)"""
+        self.digest()
+        return (self._sent_path or self.path).read_bytes()
+
+    @property
+    def file_id(self) -> Optional[str]:
+        digest = self.digest()
+        return self.cache.get(digest) if digest else None
+
+    async def send(self, send_photo: Callable[..., Awaitable], **kwargs) -> Optional[str]:
+        """Send the image with send_photo(photo=..., **kwargs), uploading it only if needed.
+
+        Returns the file_id, or None if the image is missing or an upload by
+        another caller just failed.
+        """
+        digest = await asyncio.to_thread(self.digest)
+        if digest is None:
+            logger.error(f"Image not found or empty at {self.path.absolute()}")
+            return None
+
+        upload = self._uploads.get(digest)
+        if upload is not None:
+            # Someone is uploading this version right now; wait and reuse their file_id
+            metrics.increment('media.upload_waits')
+            try:
+                await asyncio.shield(upload)
+            except Exception:
+                return None
+
+        file_id = self.cache.get(digest)
+        if file_id:
+            try:
+                await send_photo(photo=file_id, **kwargs)
+                return file_id
+            except BadRequest as e:
+                logger.warning(f"Cached file_id for {self.path.name} was rejected, uploading again: {str(e)}")
+                self.cache.forget(digest)
+            if digest in self._uploads:
+                # Another caller already started the re-upload
+                return await self.send(send_photo, **kwargs)
+
+        return await self._upload(digest, send_photo, **kwargs)
+
+    async def _upload(self, digest: str, send_photo: Callable[..., Awaitable], **kwargs) -> str:
+        future = asyncio.get_running_loop().create_future()
+        self._uploads[digest] = future
+        try:
+            data = await asyncio.to_thread(self.read)
+            message = await send_photo(photo=data, **kwargs)
+            file_id = message.photo[-1].file_id
+            # Key by the bytes actually sent, in case the file changed meanwhile
+            self.cache.put(hashlib.sha256(data).hexdigest(), file_id)
+            metrics.increment('media.uploads')
+            metrics.increment('media.upload_bytes', len(data))
+            logger.info(f"Uploaded {self.path.name} ({len(data) // 1024} KB), file_id: {file_id}")
+            future.set_result(file_id)
+            return file_id
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters see the failure; don't warn about an unretrieved exception if there are none
+            future.exception()
+            raise
+        finally:
+            del self._uploads[digest]
+
+class CachedAlbum:
+    """Several CachedImages sent as one media group"""
+
+    def __init__(self, images: Sequence[CachedImage], cache: MediaCache):
+        self.images = tuple(images)
+        self.cache = cache
+        self._uploads: Dict[Tuple[str, ...], asyncio.Future] = {}
+
+    def digests(self) -> Optional[Tuple[str, ...]]:
+        """Blocking: call it from a worker thread"""
+        digests = tuple(image.digest() for image in self.images)
+        return None if None in digests else digests
+
+    @staticmethod
+    def _media(photos: List, caption: Optional[str]) -> List[InputMediaPhoto]:
+        # An album has a single caption, shown under the first photo
+        return [InputMediaPhoto(photo, caption=caption if i == 0 else None) for i, photo in enumerate(photos)]
+
+    async def send(self, send_media_group: Callable[..., Awaitable], caption: Optional[str] = None,
+                   **kwargs) -> Optional[List[str]]:
+        """Send the album with send_media_group(media=..., **kwargs), uploading only uncached photos.
+
+        Returns the file_ids, or None if an image is missing or an upload by
+        another caller just failed.
+        """
+        key = await asyncio.to_thread(self.digests)
+        if key is None:
+            return None
+
+        upload = self._uploads.get(key)
+        if upload is not None:
+            metrics.increment('media.upload_waits')
+            try:
+                await asyncio.shield(upload)
+            except Exception:
+                return None
+
+        file_ids = [self.cache.get(digest) for digest in key]
+        if all(file_ids):
+            try:
+                await send_media_group(media=self._media(file_ids, caption), **kwargs)
+                return file_ids
+            except BadRequest as e:
+                logger.warning(f"Cached album file_ids were rejected, uploading again: {str(e)}")
+                for digest in key:
+                    self.cache.forget(digest)
+                file_ids = [None] * len(key)
+            if key in self._uploads:
+                return await self.send(send_media_group, caption, **kwargs)
+
+        return await self._upload(key, file_ids, send_media_group, caption, **kwargs)
+
+    async def _upload(self, key: Tuple[str, ...], file_ids: List[Optional[str]],
+                      send_media_group: Callable[..., Awaitable], caption: Optional[str], **kwargs) -> List[str]:
+        future = asyncio.get_running_loop().create_future()
+        self._uploads[key] = future
+        try:
+            # Only photos without a cached file_id are uploaded
+            data = await asyncio.to_thread(
+                lambda: [None if file_id else image.read() for image, file_id in zip(self.images, file_ids)]
+            )
+            photos = [file_id or photo for file_id, photo in zip(file_ids, data)]
+            messages = await send_media_group(media=self._media(photos, caption), **kwargs)
+            new_ids = [message.photo[-1].file_id for message in messages]
+            self.cache.put_many({
+                hashlib.sha256(photo).hexdigest() if photo is not None else digest: file_id
+                for digest, photo, file_id in zip(key, data, new_ids)
+            })
+            uploaded = [photo for photo in data if photo is not None]
+            metrics.increment('media.uploads', len(uploaded))
+            metrics.increment('media.upload_bytes', sum(len(photo) for photo in uploaded))
+            logger.info(f"Uploaded album of {len(new_ids)} photos ({len(uploaded)} new)")
+            future.set_result(new_ids)
+            return new_ids
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._uploads[key]
+
+# Global cache instance
+media_cache = MediaCache()
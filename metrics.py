@@ -0,0 +1,36 @@
+"""In-process counters, gauges and timings for the bot.
+
+Everything is kept in plain dicts so recording a value is cheap; call
+snapshot() to read the current values.
+"""
+from typing import Dict, Any
+
+_counters: Dict[str, int] = {}
+_gauges: Dict[str, float] = {}
+_timings: Dict[str, Dict[str, float]] = {}
+
+def increment(name: str, value: int = 1):
+    _counters[name] = _counters.get(name, 0) + value
+
+def set_gauge(name: str, value: float):
+    _gauges[name] = value
+
+def observe(name: str, seconds: float):
+    """Record one duration sample (count, total and max are kept)"""
+    timing = _timings.get(name)
+    if timing is None:
+        timing = _timings[name] = {'count': 0, 'total': 0.0, 'max': 0.0}
+    timing['count'] += 1
+    timing['total'] += seconds
+    if seconds > timing['max']:
+        timing['max'] = seconds
+
+def snapshot() -> Dict[str, Any]:
+    return {
+        'counters': dict(_counters),
+        'gauges': dict(_gauges),
+        'timings': {
+            name: {**timing, 'avg': timing['total'] / timing['count'] if timing['count'] else 0.0}
+            for name, timing in _timings.items()
+        }
+    }
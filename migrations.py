@@ -0,0 +1,176 @@
+"""Versioned schema migrations.
+
+The schema is created and changed only here, once, when the connection pool
+opens, so request paths never run DDL or existence checks. Each migration
+has a number and is applied at most once; the numbers already applied are
+recorded in the schema_migrations table. A Postgres advisory lock makes a
+second bot instance starting at the same time wait instead of racing.
+
+Migrations are append-only: never edit one that has shipped, add a new one.
+The first migrations use IF NOT EXISTS so databases created before this
+runner existed are adopted as they are.
+
+Usage:
+    python migrations.py            # apply pending migrations
+    python migrations.py status     # show applied and pending migrations
+"""
+from typing import Callable, List, NamedTuple, Sequence, Set, Union
+import asyncio
+import sys
+from partitions import partition_sales
+from rollups import backfill_rollups
+from sales_items import create_sales_items
+
+# Arbitrary key for pg_advisory_xact_lock, shared by every instance of the bot
+_MIGRATION_LOCK_ID = 0x626f6261
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    # SQL statements, or a function called with a cursor
+    steps: Union[Sequence[str], Callable]
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "create sales", [
+        """
+        CREATE TABLE IF NOT EXISTS sales (
+            id SERIAL PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            username TEXT NOT NULL,
+            items JSONB NOT NULL,
+            total_amount DECIMAL(10,2) NOT NULL,
+            payment_method TEXT NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        # Every report filters on created_at
+        "CREATE INDEX IF NOT EXISTS idx_sales_created_at ON sales (created_at)",
+    ]),
+    Migration(2, "create sales rollups", [
+        """
+        CREATE TABLE IF NOT EXISTS sales_rollup_daily (
+            day DATE PRIMARY KEY,
+            revenue DECIMAL(12,2) NOT NULL DEFAULT 0,
+            order_count INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS sales_rollup_hourly (
+            hour TIMESTAMP PRIMARY KEY,
+            revenue DECIMAL(12,2) NOT NULL DEFAULT 0,
+            order_count INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS sales_rollup_daily_items (
+            day DATE NOT NULL,
+            item TEXT NOT NULL,
+            sweetness TEXT NOT NULL DEFAULT '',
+            quantity INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, item, sweetness)
+        )
+        """,
+    ]),
+    # Menu document used when MENU_SOURCE=database
+    Migration(3, "create menu_catalog", [
+        """
+        CREATE TABLE IF NOT EXISTS menu_catalog (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            document JSONB NOT NULL,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    # Carts for CART_BACKEND=postgres
+    Migration(4, "create carts", [
+        """
+        CREATE TABLE IF NOT EXISTS carts (
+            user_id BIGINT PRIMARY KEY,
+            data JSONB NOT NULL,
+            updated_at DOUBLE PRECISION NOT NULL
+        )
+        """,
+        # Expired carts are purged by updated_at at startup
+        "CREATE INDEX IF NOT EXISTS idx_carts_updated_at ON carts (updated_at)",
+    ]),
+    # Copies existing rows into monthly partitions
+    Migration(5, "partition sales by month", partition_sales),
+    # Backfills the line items of existing orders
+    Migration(6, "create sales_items", create_sales_items),
+    # Idempotency keys of saved orders, so a replayed order is never inserted twice.
+    # Kept outside the partitioned sales table, where a unique key would need created_at.
+    Migration(7, "create sales_order_keys", [
+        """
+        CREATE TABLE IF NOT EXISTS sales_order_keys (
+            order_key TEXT PRIMARY KEY,
+            saved_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    # Migration 2 created the rollups empty, so orders placed before it were missing from
+    # every report; recompute them from sales (retired months keep their rollup rows)
+    Migration(8, "backfill sales rollups", backfill_rollups),
+]
+
+def _applied_versions(cur) -> Set[int]:
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute("SELECT version FROM schema_migrations")
+    return {version for version, in cur.fetchall()}
+
+def apply_migrations(conn) -> List[Migration]:
+    """Apply every pending migration in one transaction; returns the ones applied (blocking)"""
+    try:
+        with conn.cursor() as cur:
+            # Held until commit, so concurrent starts apply each migration once
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (_MIGRATION_LOCK_ID,))
+            applied = _applied_versions(cur)
+            pending = [migration for migration in MIGRATIONS if migration.version not in applied]
+            for migration in pending:
+                print(f"Applying migration {migration.version}: {migration.name}")
+                if callable(migration.steps):
+                    migration.steps(cur)
+                else:
+                    for statement in migration.steps:
+                        cur.execute(statement)
+                cur.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                    (migration.version, migration.name)
+                )
+        conn.commit()
+        return pending
+    except Exception:
+        conn.rollback()
+        raise
+
+def migration_status(conn) -> List[tuple]:
+    """(version, name, applied) for every known migration"""
+    with conn.cursor() as cur:
+        applied = _applied_versions(cur)
+    return [(migration.version, migration.name, migration.version in applied) for migration in MIGRATIONS]
+
+async def _main(argv: List[str]) -> int:
+    from database import init_db_pool, close_db_pool, run_in_transaction
+
+    if argv and argv[0] != 'status':
+        print(__doc__)
+        return 2
+
+    # Opening the pool applies pending migrations
+    if not await init_db_pool():
+        return 1
+    try:
+        if argv:
+            for version, name, applied in await run_in_transaction(migration_status):
+                print(f"{version:4d}  {'applied' if applied else 'pending'}  {name}")
+        return 0
+    finally:
+        await close_db_pool()
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
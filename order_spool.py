@@ -0,0 +1,327 @@
+"""Local spool for orders that could not be saved to Postgres.
+
+When the database is unreachable (or its circuit breaker is open) the
+order writer appends orders to an append-only SQLite file in WAL mode
+instead of dropping them. SpoolReplayer drains the spool back to Postgres
+in batches, oldest first, once the database answers again. Every order
+carries an idempotency key, so a batch that was committed but not yet
+removed from the spool (e.g. the bot crashed in between) is not inserted
+twice when it is replayed.
+
+While the spool holds orders, new orders are appended behind them, so
+orders still reach Postgres in checkout order.
+
+An order that fails on its own (the database answered, but rejected it) is
+moved to the dead_orders table of the same file instead of being dropped or
+blocking the orders behind it. Fix the cause, then requeue them with
+`python order_spool.py retry`.
+
+Usage:
+    python order_spool.py status    # spooled and dead-lettered order counts
+    python order_spool.py dead      # print the dead-lettered orders
+    python order_spool.py retry     # move dead-lettered orders back into the spool
+"""
+import asyncio
+import json
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional, Tuple
+from config import logger, ORDER_SPOOL_PATH, ORDER_SPOOL_REPLAY_INTERVAL, ORDER_SPOOL_BATCH_SIZE
+from database import save_orders, is_connection_error
+import metrics
+
+def should_spool(error: BaseException) -> bool:
+    """True if a failed save says nothing about the orders: the database is unreachable or too busy"""
+    return is_connection_error(error) or isinstance(error, asyncio.TimeoutError)
+
+def _payload(order: tuple) -> str:
+    user_id, username, items, total_amount, payment_method, _, created_at = order
+    return json.dumps({
+        "user_id": user_id,
+        "username": username,
+        "items": items,
+        "total_amount": total_amount,
+        "payment_method": payment_method,
+        "created_at": created_at.isoformat()
+    })
+
+def _order(order_key: str, payload: str) -> tuple:
+    data = json.loads(payload)
+    return (
+        data["user_id"], data["username"], data["items"], data["total_amount"],
+        data["payment_method"], order_key, datetime.fromisoformat(data["created_at"])
+    )
+
+class OrderSpool:
+    """Append-only queue of order tuples in a local SQLite file"""
+
+    def __init__(self, path: Path = ORDER_SPOOL_PATH):
+        self.path = Path(path)
+        self.pending = 0
+        self.dead = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # An acknowledged order must survive a power loss
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS spooled_orders (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                order_key TEXT NOT NULL UNIQUE,
+                payload TEXT NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS dead_orders (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                order_key TEXT NOT NULL UNIQUE,
+                payload TEXT NOT NULL,
+                error TEXT NOT NULL,
+                failed_at TEXT NOT NULL
+            )
+        """)
+        self._conn = conn
+        self._count()
+
+    def _count(self):
+        self.pending = self._conn.execute("SELECT COUNT(*) FROM spooled_orders").fetchone()[0]
+        self.dead = self._conn.execute("SELECT COUNT(*) FROM dead_orders").fetchone()[0]
+
+    def _ensure_open(self):
+        # The writer may spool before start() ran (or after a failed open)
+        if self._conn is None:
+            self._open()
+
+    def _transaction(self, statements: List[tuple]):
+        """Run (sql, rows) pairs in one transaction and refresh the counts (lock held).
+
+        rows is a list of parameter tuples, or None for a statement without parameters.
+        """
+        conn = self._conn
+        conn.execute("BEGIN")
+        try:
+            for sql, rows in statements:
+                if rows is None:
+                    conn.execute(sql)
+                else:
+                    conn.executemany(sql, rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._count()
+
+    def _append(self, orders: List[tuple]):
+        with self._lock:
+            self._ensure_open()
+            self._transaction([(
+                "INSERT OR IGNORE INTO spooled_orders (order_key, payload) VALUES (?, ?)",
+                [(order[5], _payload(order)) for order in orders]
+            )])
+
+    def _dead_letter(self, orders: List[tuple], error: str, spool_ids: List[int]):
+        with self._lock:
+            self._ensure_open()
+            failed_at = datetime.now(timezone.utc).isoformat()
+            self._transaction([
+                (
+                    "INSERT OR REPLACE INTO dead_orders (order_key, payload, error, failed_at) VALUES (?, ?, ?, ?)",
+                    [(order[5], _payload(order), error, failed_at) for order in orders]
+                ),
+                ("DELETE FROM spooled_orders WHERE id = ?", [(spool_id,) for spool_id in spool_ids]),
+            ])
+
+    def _dead_orders(self) -> List[Tuple[str, str, tuple]]:
+        with self._lock:
+            self._ensure_open()
+            rows = self._conn.execute(
+                "SELECT order_key, payload, error, failed_at FROM dead_orders ORDER BY id"
+            ).fetchall()
+        return [(failed_at, error, _order(order_key, payload)) for order_key, payload, error, failed_at in rows]
+
+    def _requeue_dead(self) -> int:
+        with self._lock:
+            self._ensure_open()
+            requeued = self.dead
+            self._transaction([
+                ("""
+                    INSERT OR IGNORE INTO spooled_orders (order_key, payload)
+                    SELECT order_key, payload FROM dead_orders ORDER BY id
+                """, None),
+                ("DELETE FROM dead_orders", None),
+            ])
+            return requeued
+
+    def _refresh(self):
+        with self._lock:
+            self._ensure_open()
+            self._count()
+
+    def _peek(self, limit: int) -> List[Tuple[int, tuple]]:
+        with self._lock:
+            self._ensure_open()
+            rows = self._conn.execute(
+                "SELECT id, order_key, payload FROM spooled_orders ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+        return [(spool_id, _order(order_key, payload)) for spool_id, order_key, payload in rows]
+
+    def _remove(self, spool_ids: List[int]):
+        with self._lock:
+            self._transaction([("DELETE FROM spooled_orders WHERE id = ?", [(spool_id,) for spool_id in spool_ids])])
+
+    def _close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    async def open(self):
+        await asyncio.to_thread(self._open)
+        metrics.set_gauge('order_spool.pending', self.pending)
+        metrics.set_gauge('order_spool.dead', self.dead)
+
+    async def append(self, orders: List[tuple]):
+        await asyncio.to_thread(self._append, orders)
+        metrics.increment('order_spool.spooled', len(orders))
+        metrics.set_gauge('order_spool.pending', self.pending)
+
+    async def peek(self, limit: int) -> List[Tuple[int, tuple]]:
+        """Up to limit of the oldest (spool id, order tuple) pairs"""
+        return await asyncio.to_thread(self._peek, limit)
+
+    async def remove(self, spool_ids: List[int]):
+        await asyncio.to_thread(self._remove, spool_ids)
+        metrics.set_gauge('order_spool.pending', self.pending)
+
+    async def dead_letter(self, orders: List[tuple], error: str, spool_ids: List[int] = ()):
+        """Set aside orders the database rejected (removing them from the spool if they were spooled)"""
+        await asyncio.to_thread(self._dead_letter, orders, error, list(spool_ids))
+        metrics.increment('order_spool.dead_lettered', len(orders))
+        metrics.set_gauge('order_spool.pending', self.pending)
+        metrics.set_gauge('order_spool.dead', self.dead)
+
+    async def refresh(self):
+        """Re-read the counts, which `python order_spool.py retry` changes from outside the bot"""
+        await asyncio.to_thread(self._refresh)
+
+    async def close(self):
+        await asyncio.to_thread(self._close)
+
+class SpoolReplayer:
+    """Background task that drains the spool to Postgres once it is reachable"""
+
+    def __init__(self, spool: OrderSpool, interval: float = ORDER_SPOOL_REPLAY_INTERVAL,
+                 batch_size: int = ORDER_SPOOL_BATCH_SIZE):
+        self.spool = spool
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None:
+            await self.spool.open()
+            if self.spool.pending:
+                logger.warning(f"{self.spool.pending} spooled orders are waiting to be saved")
+            if self.spool.dead:
+                logger.warning(f"{self.spool.dead} orders were rejected by the database, "
+                               "see python order_spool.py dead")
+            self._task = asyncio.create_task(self._run(), name="order-spool-replayer")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.spool.close()
+
+    async def _replay(self, batch: List[Tuple[int, tuple]]) -> int:
+        """Save a batch of spooled orders and remove them from the spool; returns how many were saved.
+
+        If the database rejects the batch, it is retried in halves so only the
+        orders that fail on their own are dead-lettered. Unreachable-database
+        errors are raised, leaving the rest spooled for the next attempt.
+        """
+        try:
+            rows = await save_orders([order for _, order in batch])
+        except Exception as e:
+            if should_spool(e):
+                raise
+            if len(batch) == 1:
+                spool_id, order = batch[0]
+                logger.error(f"Spooled order {order[5]} was rejected, moving it to the dead letters: {str(e)}")
+                await self.spool.dead_letter([order], str(e), [spool_id])
+                return 0
+            middle = len(batch) // 2
+            return await self._replay(batch[:middle]) + await self._replay(batch[middle:])
+
+        await self.spool.remove([spool_id for spool_id, _ in batch])
+        duplicates = sum(row is None for row in rows)
+        if duplicates:
+            logger.info(f"Skipped {duplicates} spooled orders that were already saved")
+        metrics.increment('order_spool.replayed', len(batch))
+        return len(batch)
+
+    async def drain(self) -> int:
+        """Replay spooled orders until the spool is empty or the database fails; returns how many were replayed"""
+        replayed = 0
+        await self.spool.refresh()
+        while self.spool.pending:
+            batch = await self.spool.peek(self.batch_size)
+            if not batch:
+                break
+            replayed += await self._replay(batch)
+        if replayed:
+            logger.info(f"Replayed {replayed} spooled orders")
+        return replayed
+
+    async def _run(self):
+        while True:
+            try:
+                await self.drain()
+            except Exception as e:
+                if should_spool(e):
+                    logger.warning(f"Database still unavailable, {self.spool.pending} orders spooled")
+                else:
+                    logger.error(f"Spool replay failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+# Global spool and replayer instances
+order_spool = OrderSpool()
+spool_replayer = SpoolReplayer(order_spool)
+
+async def _main(argv: List[str]) -> int:
+    if not argv or argv[0] not in ('status', 'dead', 'retry'):
+        print(__doc__)
+        return 2
+
+    spool = OrderSpool()
+    await spool.open()
+    try:
+        if argv[0] == 'status':
+            print(f"{spool.pending} spooled, {spool.dead} dead-lettered ({spool.path})")
+        elif argv[0] == 'dead':
+            for failed_at, error, order in await asyncio.to_thread(spool._dead_orders):
+                user_id, username, items, total_amount, payment_method, order_key, created_at = order
+                print(f"{order_key}  {created_at.isoformat()}  {username} ({user_id})  "
+                      f"${float(total_amount):.2f} {payment_method}  {len(items)} items")
+                print(f"    failed {failed_at}: {error}")
+        else:
+            requeued = await asyncio.to_thread(spool._requeue_dead)
+            print(f"Moved {requeued} dead-lettered orders back into the spool")
+        return 0
+    finally:
+        await spool.close()
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
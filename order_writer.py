@@ -0,0 +1,148 @@
+import asyncio
+from typing import Dict, List, Optional
+from config import logger, ORDER_WRITER_BATCH_SIZE, ORDER_WRITER_MAX_LINGER
+from database import save_order, save_orders, new_order
+from order_spool import order_spool, should_spool
+
+# Marks the end of the queue when the writer is stopped
+_STOP = object()
+
+class OrderWriter:
+    """Write-behind queue that persists orders with group commit.
+
+    Orders are queued in checkout order and flushed by one background task,
+    one multi-row INSERT per batch, so batches commit in the same order the
+    orders were placed. Batches that can't reach the database (or time out
+    waiting for a connection), and every batch while earlier ones are still
+    spooled, go to the local order spool. A batch the database rejects is
+    retried in halves, so one bad order is dead-lettered on its own instead
+    of taking the rest of its batch down with it.
+    """
+
+    def __init__(self, batch_size: int = ORDER_WRITER_BATCH_SIZE, max_linger: float = ORDER_WRITER_MAX_LINGER):
+        self.batch_size = batch_size
+        self.max_linger = max_linger
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(), name="order-writer")
+        logger.info(f"Order writer started (batch size {self.batch_size}, linger {self.max_linger}s)")
+
+    async def stop(self):
+        """Flush everything still queued, then stop the writer"""
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+        logger.info("Order writer drained and stopped")
+
+    def submit(self, user_id: int, username: str, items: List[Dict], total_amount: float, payment_method: str,
+               order_key: Optional[str] = None) -> asyncio.Future:
+        """Queue an order without waiting for the commit; the future resolves to the saved row (or None)"""
+        if not self.running:
+            # Writer not started (or already stopped): fall back to a direct save
+            return asyncio.ensure_future(save_order(user_id, username, items, total_amount, payment_method, order_key))
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((new_order(user_id, username, items, total_amount, payment_method, order_key), future))
+        return future
+
+    async def _next_batch(self) -> tuple:
+        """Wait for one order, then gather more until the batch is full or the linger time runs out"""
+        batch = []
+        stopping = False
+
+        entry = await self._queue.get()
+        if entry is _STOP:
+            return batch, True
+        batch.append(entry)
+
+        deadline = asyncio.get_running_loop().time() + self.max_linger
+        while len(batch) < self.batch_size:
+            try:
+                # Take whatever is already queued without waiting
+                entry = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if entry is _STOP:
+                stopping = True
+                break
+            batch.append(entry)
+
+        return batch, stopping
+
+    async def _flush(self, batch: list):
+        rows = await self._save([order for order, _ in batch])
+        for (_, future), row in zip(batch, rows):
+            if not future.done():
+                future.set_result(row)
+
+    async def _save(self, orders: list) -> list:
+        """Save orders in checkout order; returns their rows, None for orders spooled or set aside"""
+        if order_spool.pending:
+            # Stay behind the spooled orders so they are saved first
+            await self._spool(orders)
+            return [None] * len(orders)
+        try:
+            return await save_orders(orders)
+        except Exception as e:
+            if should_spool(e):
+                logger.warning(f"Database unavailable, spooling {len(orders)} orders: {str(e)}")
+                await self._spool(orders)
+                return [None] * len(orders)
+            if len(orders) == 1:
+                logger.error(f"Order {orders[0][5]} was rejected, moving it to the dead letters: {str(e)}")
+                await self._dead_letter(orders, str(e))
+                return [None]
+            # Inserts are idempotent and the failed batch rolled back, so the halves can be retried
+            logger.warning(f"Batch of {len(orders)} orders was rejected, retrying in halves: {str(e)}")
+            middle = len(orders) // 2
+            return await self._save(orders[:middle]) + await self._save(orders[middle:])
+
+    @staticmethod
+    async def _spool(orders: list):
+        try:
+            await order_spool.append(orders)
+        except Exception as e:
+            logger.error(f"Failed to spool {len(orders)} orders, they are lost: {str(e)}")
+
+    @staticmethod
+    async def _dead_letter(orders: list, error: str):
+        try:
+            await order_spool.dead_letter(orders, error)
+        except Exception as e:
+            logger.error(f"Failed to set aside {len(orders)} rejected orders, they are lost: {str(e)}")
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._next_batch()
+            if batch:
+                await self._flush(batch)
+
+        # Drain anything queued behind the stop marker
+        leftover = []
+        while not self._queue.empty():
+            entry = self._queue.get_nowait()
+            if entry is not _STOP:
+                leftover.append(entry)
+        for start in range(0, len(leftover), self.batch_size):
+            await self._flush(leftover[start:start + self.batch_size])
+
+# Global writer instance
+order_writer = OrderWriter()
\ No newline at end of file
@@ -0,0 +1,219 @@
+"""Rate-limited outbound message scheduler.
+
+Every message the bot sends or edits goes through here so that bursts stay
+inside Telegram's flood limits:
+
+- a global token bucket (OUTBOUND_GLOBAL_RATE messages/second) that hands
+  out tokens by priority, so owner notifications go before cosmetic edits;
+- a per-chat token bucket (OUTBOUND_CHAT_RATE, bursts of OUTBOUND_CHAT_BURST),
+  with sends to one chat kept in submission order;
+- on RetryAfter the chat is paused for the requested time and the send is
+  retried (up to OUTBOUND_MAX_RETRIES times);
+- an edit of a message that is still waiting to be sent is replaced by the
+  newer edit instead of being sent twice.
+
+Queue depth and send latency are recorded in the metrics module.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from enum import IntEnum
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional
+from telegram.error import RetryAfter
+from config import (
+    logger, OUTBOUND_GLOBAL_RATE, OUTBOUND_CHAT_RATE, OUTBOUND_CHAT_BURST, OUTBOUND_MAX_RETRIES
+)
+import metrics
+
+class Priority(IntEnum):
+    OWNER = 0      # order notifications to the owner
+    CUSTOMER = 1   # confirmations and replies a customer is waiting for
+    EDIT = 2       # in-place edits of menu messages
+
+class _PriorityTokenBucket:
+    """Token bucket whose waiters are served highest priority first"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._waiters: List[tuple] = []
+        self._order = itertools.count()
+        self._pump: Optional[asyncio.Task] = None
+
+    async def acquire(self, priority: int):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run(), name="outbound-bucket")
+        await future
+
+    async def _run(self):
+        while self._waiters:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self._tokens -= 1
+                future.set_result(None)
+
+class _ChatState:
+    """Per-chat FIFO lock and token bucket"""
+    __slots__ = ("lock", "users", "tokens", "updated", "paused_until")
+
+    def __init__(self, burst: float):
+        self.lock = asyncio.Lock()
+        self.users = 0
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+class _Job:
+    __slots__ = ("send", "future", "started")
+
+    def __init__(self, send: Callable[[], Awaitable], future: asyncio.Future):
+        self.send = send
+        self.future = future
+        self.started = False
+
+class OutboundScheduler:
+    def __init__(self, global_rate: float = OUTBOUND_GLOBAL_RATE, chat_rate: float = OUTBOUND_CHAT_RATE,
+                 chat_burst: float = OUTBOUND_CHAT_BURST, max_retries: int = OUTBOUND_MAX_RETRIES):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._global = _PriorityTokenBucket(global_rate, global_rate)
+        self._chats: Dict[Hashable, _ChatState] = {}
+        self._pending_edits: Dict[Hashable, _Job] = {}
+        self._tasks: set = set()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._tasks)
+
+    def submit(self, chat_id: int, send: Callable[[], Awaitable], priority: Priority = Priority.CUSTOMER,
+               coalesce_key: Hashable = None) -> asyncio.Future:
+        """Schedule send() for chat_id; the returned future resolves to its result.
+
+        Jobs with the same coalesce_key that haven't started yet are merged:
+        the newest send() wins and every caller gets its result.
+        """
+        if coalesce_key is not None:
+            job = self._pending_edits.get(coalesce_key)
+            if job is not None and not job.started:
+                job.send = send
+                metrics.increment('outbound.coalesced')
+                return job.future
+
+        job = _Job(send, asyncio.get_running_loop().create_future())
+        if coalesce_key is not None:
+            self._pending_edits[coalesce_key] = job
+
+        task = asyncio.create_task(self._run_job(chat_id, job, priority, coalesce_key, time.monotonic()))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        metrics.set_gauge('outbound.queue_depth', len(self._tasks))
+        return job.future
+
+    async def drain(self, timeout: float = 10.0):
+        """Wait for queued sends to finish (used at shutdown)"""
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
+
+    async def _wait_chat_token(self, chat: _ChatState):
+        while True:
+            now = time.monotonic()
+            if now < chat.paused_until:
+                await asyncio.sleep(chat.paused_until - now)
+                continue
+            chat.tokens = min(self.chat_burst, chat.tokens + (now - chat.updated) * self.chat_rate)
+            chat.updated = now
+            if chat.tokens >= 1:
+                chat.tokens -= 1
+                return
+            await asyncio.sleep((1 - chat.tokens) / self.chat_rate)
+
+    async def _run_job(self, chat_id: int, job: _Job, priority: Priority, coalesce_key: Hashable, submitted: float):
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _ChatState(self.chat_burst)
+        chat.users += 1
+        try:
+            # Taking the chat lock is the first await, so sends to one chat keep their order
+            async with chat.lock:
+                attempt = 0
+                while True:
+                    await self._wait_chat_token(chat)
+                    await self._global.acquire(priority)
+                    if attempt == 0:
+                        # From here on a newer edit can no longer replace this one
+                        job.started = True
+                        if coalesce_key is not None and self._pending_edits.get(coalesce_key) is job:
+                            del self._pending_edits[coalesce_key]
+                    try:
+                        result = await job.send()
+                        break
+                    except RetryAfter as e:
+                        attempt += 1
+                        retry_after = float(e.retry_after)
+                        metrics.increment('outbound.retry_after')
+                        logger.warning(f"Flood limit hit for chat {chat_id}, retrying in {retry_after}s")
+                        chat.paused_until = time.monotonic() + retry_after
+                        if attempt > self.max_retries:
+                            raise
+            metrics.observe('outbound.send_latency', time.monotonic() - submitted)
+            if not job.future.done():
+                job.future.set_result(result)
+        except Exception as e:
+            metrics.increment('outbound.failed')
+            if not job.future.done():
+                job.future.set_exception(e)
+                # Mark retrieved so fire-and-forget sends don't log "exception never retrieved"
+                job.future.exception()
+        finally:
+            chat.users -= 1
+            if chat.users == 0 and self._chats.get(chat_id) is chat:
+                del self._chats[chat_id]
+            metrics.set_gauge('outbound.queue_depth', len(self._tasks) - 1)
+
+# Global scheduler instance
+outbound = OutboundScheduler()
+
+# Convenience wrappers for the calls the handlers make
+
+def send_message(bot, chat_id: int, text: str, priority: Priority = Priority.CUSTOMER, **kwargs) -> asyncio.Future:
+    return outbound.submit(chat_id, lambda: bot.send_message(chat_id=chat_id, text=text, **kwargs), priority)
+
+def send_photo(bot, chat_id: int, priority: Priority = Priority.CUSTOMER, **kwargs) -> asyncio.Future:
+    return outbound.submit(chat_id, lambda: bot.send_photo(chat_id=chat_id, **kwargs), priority)
+
+def send_document(bot, chat_id: int, priority: Priority = Priority.CUSTOMER, **kwargs) -> asyncio.Future:
+    return outbound.submit(chat_id, lambda: bot.send_document(chat_id=chat_id, **kwargs), priority)
+
+def send_media_group(bot, chat_id: int, priority: Priority = Priority.CUSTOMER, **kwargs) -> asyncio.Future:
+    return outbound.submit(chat_id, lambda: bot.send_media_group(chat_id=chat_id, **kwargs), priority)
+
+def reply_text(message, text: str, priority: Priority = Priority.CUSTOMER, **kwargs) -> asyncio.Future:
+    return outbound.submit(message.chat_id, lambda: message.reply_text(text, **kwargs), priority)
+
+def edit_message_text(query, text: str, priority: Priority = Priority.EDIT, **kwargs) -> asyncio.Future:
+    """Edit the message a callback query came from; pending edits of the same message are coalesced"""
+    message = query.message
+    key = ("edit", message.chat_id, message.message_id) if message is not None else None
+    chat_id = message.chat_id if message is not None else query.from_user.id
+    return outbound.submit(chat_id, lambda: query.edit_message_text(text, **kwargs), priority, coalesce_key=key)
+def edit_bot_message(bot, chat_id: int, message_id: int, text: str, priority: Priority = Priority.EDIT,
+                     **kwargs) -> asyncio.Future:
+    """Edit a message the bot sent earlier; pending edits of the same message are coalesced"""
+    return outbound.submit(
+        chat_id,
+        lambda: bot.edit_message_text(text, chat_id=chat_id, message_id=message_id, **kwargs),
+        priority,
+        coalesce_key=("edit", chat_id, message_id)
+    )
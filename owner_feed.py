@@ -0,0 +1,287 @@
+"""Owner order feed.
+
+Checked-out orders are kept in an in-memory index keyed by their order key
+(the idempotency key they are saved with) until the owner marks them
+complete. The owner sees the start of the key as the order number; keys
+never repeat, so neither do order numbers across restarts. Orders nobody
+completes are forgotten after OWNER_FEED_ORDER_TTL seconds, or oldest first
+beyond OWNER_FEED_MAX_ORDERS.
+
+In "messages" mode every order is still sent to the owner as its own
+message. In "board" mode new orders are collected for OWNER_FEED_WINDOW
+seconds and shown on a single pinned "open orders" message that is edited
+in place, so a rush costs a few edits instead of a message per order.
+
+Orders can be completed one at a time, several at once with /done, or with
+the board's "Complete all" button. Each customer is notified once, and the
+notifications go out in parallel through the outbound scheduler.
+
+The index lives in memory only: after a restart the board starts empty, but
+"done_<order>_<user>" buttons on older messages still reach the customer.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
+from config import (
+    logger, OWNER_CHAT_ID, OWNER_FEED_MODE, OWNER_FEED_WINDOW, OWNER_FEED_ORDER_TTL, OWNER_FEED_MAX_ORDERS,
+    PaymentMethod, UserOrder
+)
+from outbound import Priority, outbound, send_message, edit_bot_message
+import metrics
+
+# Keep the board inside Telegram's 4096 character / 100 button limits
+BOARD_MAX_ORDERS = 15
+BOARD_BUTTONS_PER_ROW = 4
+MESSAGE_MAX_LENGTH = 4096
+
+# How many completed orders to remember, so a double tap doesn't notify twice
+COMPLETED_MEMORY = 1000
+
+READY_MESSAGE = "✅ Your drinks are ready! Please come and pick them up."
+
+# Characters of the order key shown to the owner as the order number
+ORDER_NUMBER_LENGTH = 6
+
+def order_number(order_key: str) -> str:
+    return order_key[:ORDER_NUMBER_LENGTH].upper()
+
+class PendingOrder:
+    """Snapshot of a checked-out order waiting to be completed"""
+    __slots__ = ("order_key", "user_id", "username", "items", "total", "payment_method", "placed_at", "done_data")
+
+    def __init__(self, order_key: str, user_id: int, username: str, order: UserOrder):
+        self.order_key = order_key
+        self.user_id = user_id
+        self.username = username
+        # The cart is cleared right after checkout, so keep our own tuple of items
+        self.items = tuple(order.items)
+        self.total = order.get_total_price()
+        self.payment_method = order.payment_method
+        self.placed_at = time.time()
+        # Complete button payload; the user id is included so it still works if the index was lost
+        self.done_data = f"done_{order_key}_{user_id}"
+
+    @property
+    def number(self) -> str:
+        return order_number(self.order_key)
+
+class OwnerFeed:
+    def __init__(self, mode: str = OWNER_FEED_MODE, window: float = OWNER_FEED_WINDOW,
+                 chat_id: int = OWNER_CHAT_ID, order_ttl: float = OWNER_FEED_ORDER_TTL,
+                 max_orders: int = OWNER_FEED_MAX_ORDERS):
+        if mode not in ("messages", "board"):
+            logger.warning(f"Unknown OWNER_FEED_MODE {mode!r}, using messages")
+            mode = "messages"
+        self.mode = mode
+        self.window = window
+        self.chat_id = chat_id
+        self.order_ttl = order_ttl
+        self.max_orders = max_orders
+        self._orders: Dict[str, PendingOrder] = {}  # insertion order is checkout order
+        # Complete button payloads of the open orders -> order key
+        self._buttons: Dict[str, str] = {}
+        self._completed: "OrderedDict[Tuple[str, int], None]" = OrderedDict()
+        self._board_message_id: Optional[int] = None
+        # Orders visible on the board, which is what "Complete all" applies to
+        self._shown: Tuple[str, ...] = ()
+        self._dirty = False
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def board_mode(self) -> bool:
+        return self.mode == "board"
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def is_board(self, message) -> bool:
+        return message is not None and self._board_message_id is not None \
+            and message.message_id == self._board_message_id
+
+    def add(self, order_key: str, user_id: int, username: str, order: UserOrder) -> PendingOrder:
+        pending = PendingOrder(order_key, user_id, username, order)
+        self._orders[order_key] = pending
+        self._buttons[pending.done_data] = order_key
+        self._expire(pending.placed_at)
+        metrics.set_gauge('owner_feed.open_orders', len(self._orders))
+        return pending
+
+    def _expire(self, now: float):
+        """Forget orders past their TTL, and the oldest beyond max_orders"""
+        expired = 0
+        for pending in list(self._orders.values()):
+            if now - pending.placed_at < self.order_ttl and len(self._orders) <= self.max_orders:
+                break
+            del self._orders[pending.order_key]
+            del self._buttons[pending.done_data]
+            expired += 1
+        if expired:
+            metrics.increment('owner_feed.expired', expired)
+
+    def is_open_button(self, data: str) -> bool:
+        """True if data is the Complete button payload of an open order"""
+        return data in self._buttons
+
+    def open_orders(self) -> List[PendingOrder]:
+        return list(self._orders.values())
+
+    def resolve(self, number: str) -> List[str]:
+        """Keys of the open orders an order number typed by the owner matches (a prefix of the key)"""
+        prefix = number.lstrip("#").lower()
+        if not prefix:
+            return []
+        return [order_key for order_key in self._orders if order_key.startswith(prefix)]
+
+    def take(self, order_keys: Iterable[str]) -> List[PendingOrder]:
+        """Remove the given orders from the index and return the ones that were open"""
+        taken = []
+        for order_key in order_keys:
+            pending = self._orders.pop(order_key, None)
+            if pending is None:
+                continue
+            del self._buttons[pending.done_data]
+            taken.append(pending)
+            self._completed[(pending.order_key, pending.user_id)] = None
+        while len(self._completed) > COMPLETED_MEMORY:
+            self._completed.popitem(last=False)
+        metrics.set_gauge('owner_feed.open_orders', len(self._orders))
+        return taken
+
+    async def notify_ready(self, bot, user_ids: Iterable[int]) -> int:
+        """Tell each customer once that their drinks are ready; returns how many were reached"""
+        user_ids = list(dict.fromkeys(user_ids))
+        results = await asyncio.gather(
+            *(send_message(bot, chat_id=user_id, text=READY_MESSAGE) for user_id in user_ids),
+            return_exceptions=True
+        )
+        reached = 0
+        for user_id, result in zip(user_ids, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to notify customer {user_id}: {str(result)}")
+            else:
+                reached += 1
+        metrics.increment('owner_feed.notified', reached)
+        return reached
+
+    async def complete(self, bot, order_keys: Iterable[str]) -> List[PendingOrder]:
+        """Close the given orders, redraw the board and notify their customers"""
+        done = self.take(order_keys)
+        if done:
+            metrics.increment('owner_feed.completed', len(done))
+            self.schedule_refresh(bot, delay=0)
+            await self.notify_ready(bot, [pending.user_id for pending in done])
+        return done
+
+    async def complete_shown(self, bot) -> List[PendingOrder]:
+        """Complete every order currently visible on the board"""
+        return await self.complete(bot, self._shown)
+
+    async def complete_button(self, bot, order_key: str, user_id: int) -> bool:
+        """Handle a per-order Complete button; returns False if the order was already completed"""
+        pending = self._orders.get(order_key)
+        if pending is not None and pending.user_id == user_id:
+            await self.complete(bot, [order_key])
+            return True
+        if (order_key, user_id) in self._completed:
+            return False
+        # Placed before a restart (or expired): the button still knows who to notify
+        await self.notify_ready(bot, [user_id])
+        return True
+
+    def render_board(self) -> Tuple[str, Optional[InlineKeyboardMarkup], Tuple[str, ...]]:
+        """Board text, keyboard and the keys of the orders it shows"""
+        orders = self.open_orders()
+        if not orders:
+            return "📋 Open orders\n\nNo open orders.", None, ()
+
+        shown = orders[:BOARD_MAX_ORDERS]
+        lines = [f"📋 Open orders ({len(orders)})"]
+        for pending in shown:
+            payment = "ABA Pay" if pending.payment_method == PaymentMethod.ABA else "Cash"
+            placed = time.strftime("%H:%M", time.localtime(pending.placed_at))
+            lines.append(f"\n#{pending.number} {pending.username} · {payment} · ${pending.total:.2f} · {placed}")
+            lines.extend(f"   • {item.item} - {item.sweetness}" for item in pending.items)
+        if len(orders) > len(shown):
+            lines.append(f"\n…and {len(orders) - len(shown)} more. Use /done <order numbers> to complete them.")
+        text = "\n".join(lines)
+        if len(text) > MESSAGE_MAX_LENGTH:
+            text = text[:MESSAGE_MAX_LENGTH - 1] + "…"
+
+        buttons = [InlineKeyboardButton(f"✅ #{pending.number}", callback_data=pending.done_data) for pending in shown]
+        rows = [buttons[i:i + BOARD_BUTTONS_PER_ROW] for i in range(0, len(buttons), BOARD_BUTTONS_PER_ROW)]
+        rows.append([InlineKeyboardButton("✅ Complete all", callback_data="done_all")])
+        return text, InlineKeyboardMarkup(rows), tuple(pending.order_key for pending in shown)
+
+    def schedule_refresh(self, bot, delay: Optional[float] = None):
+        """Redraw the board after delay seconds (the batching window by default).
+
+        Changes made while a redraw is pending or running are picked up by it,
+        so a burst of orders results in one or two edits.
+        """
+        if not self.board_mode:
+            return
+        self._dirty = True
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        self._refresh_task = asyncio.create_task(
+            self._refresh(bot, self.window if delay is None else delay), name="owner-board"
+        )
+
+    async def stop(self):
+        if self._refresh_task is None:
+            return
+        self._refresh_task.cancel()
+        try:
+            await self._refresh_task
+        except asyncio.CancelledError:
+            pass
+        self._refresh_task = None
+
+    async def _refresh(self, bot, delay: float):
+        if delay > 0:
+            await asyncio.sleep(delay)
+        while self._dirty:
+            self._dirty = False
+            try:
+                await self._draw(bot)
+            except Exception as e:
+                logger.error(f"Failed to update order board: {str(e)}")
+
+    async def _draw(self, bot):
+        text, markup, shown = self.render_board()
+        if self._board_message_id is not None:
+            try:
+                await edit_bot_message(
+                    bot, self.chat_id, self._board_message_id, text,
+                    priority=Priority.OWNER, reply_markup=markup
+                )
+                self._shown = shown
+                metrics.increment('owner_feed.board_edits')
+                return
+            except BadRequest as e:
+                if "not modified" in str(e).lower():
+                    self._shown = shown
+                    return
+                logger.warning(f"Order board message is gone ({str(e)}), posting a new one")
+                self._board_message_id = None
+        if not shown:
+            # Nothing to show and no board yet
+            return
+
+        message = await send_message(bot, chat_id=self.chat_id, text=text, priority=Priority.OWNER, reply_markup=markup)
+        self._board_message_id = message.message_id
+        self._shown = shown
+        try:
+            await outbound.submit(
+                self.chat_id,
+                lambda: bot.pin_chat_message(self.chat_id, message.message_id, disable_notification=True),
+                Priority.OWNER
+            )
+        except Exception as e:
+            logger.warning(f"Could not pin the order board: {str(e)}")
+
+# Global feed instance
+owner_feed = OwnerFeed()
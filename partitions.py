@@ -0,0 +1,256 @@
+"""Monthly range partitions of the sales tables.
+
+`sales` and `sales_items` are partitioned by created_at, one partition per
+UTC month (sales_p2024_01, sales_items_p2024_01, ...), plus a <table>_default
+partition that only catches rows no monthly partition covers. Queries with
+a created_at lower bound (report recomputes, rollup updates) read only the
+partitions they need, and old months can be retired as whole tables instead
+of by bulk DELETE.
+
+PartitionMaintainer creates the current and the next
+SALES_PARTITION_MONTHS_AHEAD months in the background, and applies the
+retention policy: with SALES_RETENTION_MONTHS set, older partitions are
+detached and kept as <table>_archive_YYYY_MM tables, or dropped when
+SALES_RETENTION_ACTION=drop. The rollups keep their totals either way.
+
+Usage:
+    python partitions.py status      # list partitions with estimated row counts
+    python partitions.py maintain    # create upcoming partitions and apply retention now
+"""
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence, Tuple
+import asyncio
+import re
+import sys
+from config import (
+    logger, SALES_PARTITION_MONTHS_AHEAD, SALES_RETENTION_MONTHS, SALES_RETENTION_ACTION,
+    PARTITION_MAINTENANCE_INTERVAL
+)
+
+# Tables partitioned by month, in the order their partitions are created
+PARTITIONED_TABLES = ("sales", "sales_items")
+
+def month_start(value: datetime) -> datetime:
+    """First instant of value's UTC month (naive values are taken as UTC)"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    value = value.astimezone(timezone.utc)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+def partition_name(month: datetime, table: str = "sales") -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+def default_partition(table: str = "sales") -> str:
+    return f"{table}_default"
+
+def _bound(month: datetime) -> str:
+    # Partition bounds must be literals; these come from datetimes, never user input
+    return f"'{month:%Y-%m-%d} 00:00:00+00'"
+
+def _exists(cur, name: str) -> bool:
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (name,))
+    return cur.fetchone()[0]
+
+def create_partition(cur, month: datetime, table: str = "sales") -> bool:
+    """Create the partition of table for one month; returns False if it already exists"""
+    name = partition_name(month, table)
+    if _exists(cur, name):
+        return False
+    upper = add_months(month, 1)
+    default = default_partition(table)
+    cur.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    # Rows that landed in the default partition move to their month, or the attach would fail
+    cur.execute(f"LOCK TABLE {default} IN EXCLUSIVE MODE")
+    cur.execute(f"""
+        WITH moved AS (
+            DELETE FROM {default} WHERE created_at >= %s AND created_at < %s RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """, (month, upper))
+    cur.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ({_bound(month)}) TO ({_bound(upper)})")
+    return True
+
+def create_partitions_between(cur, first: datetime, last: datetime, table: str = "sales") -> List[str]:
+    """Create the partitions of table for every month from first's through last's"""
+    created = []
+    month = month_start(first)
+    while month <= month_start(last):
+        if create_partition(cur, month, table):
+            created.append(partition_name(month, table))
+        month = add_months(month, 1)
+    return created
+
+def ensure_partitions(cur, now: datetime, months_ahead: int = SALES_PARTITION_MONTHS_AHEAD,
+                      tables: Sequence[str] = PARTITIONED_TABLES) -> List[str]:
+    """Create partitions from now's month through months_ahead months later; returns the new ones"""
+    last = add_months(month_start(now), months_ahead)
+    created = []
+    for table in tables:
+        created.extend(create_partitions_between(cur, now, last, table))
+    return created
+
+def list_partitions(cur, table: str = "sales") -> List[Tuple[str, Optional[datetime]]]:
+    """(name, month) of every attached partition, oldest first; month is None for the default partition"""
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+    """, (table,))
+    pattern = re.compile(rf"^{table}_p(\d{{4}})_(\d{{2}})$")
+    partitions = []
+    for name, in cur.fetchall():
+        match = pattern.match(name)
+        month = datetime(int(match[1]), int(match[2]), 1, tzinfo=timezone.utc) if match else None
+        partitions.append((name, month))
+    partitions.sort(key=lambda partition: (partition[1] is None, partition[1] or datetime.min, partition[0]))
+    return partitions
+
+def apply_retention(cur, now: datetime, months: int = SALES_RETENTION_MONTHS,
+                    action: str = SALES_RETENTION_ACTION) -> List[str]:
+    """Detach (and archive or drop) partitions for months before the last `months`; returns their names"""
+    if months <= 0:
+        return []
+    cutoff = add_months(month_start(now), -months)
+    retired = []
+    for table in PARTITIONED_TABLES:
+        for name, month in list_partitions(cur, table):
+            if month is None or month >= cutoff:
+                continue
+            cur.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+            if action == "drop":
+                cur.execute(f"DROP TABLE {name}")
+            else:
+                cur.execute(f"ALTER TABLE {name} RENAME TO {table}_archive_{month:%Y_%m}")
+            retired.append(name)
+    return retired
+
+def maintain_partitions(conn, now: datetime = None) -> Tuple[List[str], List[str]]:
+    """Create upcoming partitions and apply retention; returns (created, retired) (blocking)"""
+    now = now or datetime.now(timezone.utc)
+    with conn.cursor() as cur:
+        created = ensure_partitions(cur, now)
+        retired = apply_retention(cur, now)
+    return created, retired
+
+def partition_sales(cur):
+    """Migration step: turn an unpartitioned sales table into a monthly partitioned one.
+
+    The old rows are copied into the new table (ids and the id sequence are
+    kept) and the old table is dropped, all in the migration's transaction.
+    """
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = 'sales'::regclass")
+    if cur.fetchone()[0] == 'p':
+        return
+
+    cur.execute("LOCK TABLE sales IN ACCESS EXCLUSIVE MODE")
+    cur.execute("ALTER TABLE sales RENAME TO sales_unpartitioned")
+    cur.execute("ALTER TABLE sales_unpartitioned RENAME CONSTRAINT sales_pkey TO sales_unpartitioned_pkey")
+    cur.execute("ALTER INDEX IF EXISTS idx_sales_created_at RENAME TO idx_sales_unpartitioned_created_at")
+
+    # The partition key has to be part of the primary key
+    cur.execute("""
+        CREATE TABLE sales (
+            id INTEGER NOT NULL DEFAULT nextval('sales_id_seq'),
+            user_id TEXT NOT NULL,
+            username TEXT NOT NULL,
+            items JSONB NOT NULL,
+            total_amount DECIMAL(10,2) NOT NULL,
+            payment_method TEXT NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    cur.execute("CREATE INDEX idx_sales_created_at ON sales (created_at)")
+    # Keep the sequence alive when the old table is dropped
+    cur.execute("ALTER SEQUENCE sales_id_seq OWNED BY sales.id")
+    cur.execute(f"CREATE TABLE {default_partition()} PARTITION OF sales DEFAULT")
+
+    now = datetime.now(timezone.utc)
+    cur.execute("SELECT MIN(created_at) FROM sales_unpartitioned")
+    create_partitions_between(cur, cur.fetchone()[0] or now, now)
+    ensure_partitions(cur, now, tables=("sales",))
+
+    cur.execute("""
+        INSERT INTO sales (id, user_id, username, items, total_amount, payment_method, created_at)
+        SELECT id, user_id, username, items, total_amount, payment_method, COALESCE(created_at, CURRENT_TIMESTAMP)
+        FROM sales_unpartitioned
+    """)
+    cur.execute("DROP TABLE sales_unpartitioned")
+
+class PartitionMaintainer:
+    """Background task that keeps upcoming partitions created and applies retention"""
+
+    def __init__(self, interval: float = PARTITION_MAINTENANCE_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="partition-maintainer")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def maintain(self):
+        from database import run_in_transaction
+
+        created, retired = await run_in_transaction(maintain_partitions)
+        if created:
+            logger.info(f"Created sales partitions: {', '.join(created)}")
+        if retired:
+            logger.info(f"Retired sales partitions ({SALES_RETENTION_ACTION}): {', '.join(retired)}")
+
+    async def _run(self):
+        while True:
+            try:
+                await self.maintain()
+            except Exception as e:
+                logger.error(f"Sales partition maintenance failed: {str(e)}")
+            if self.interval <= 0:
+                return
+            await asyncio.sleep(self.interval)
+
+# Global maintainer instance
+partition_maintainer = PartitionMaintainer()
+
+def _partition_status(conn) -> List[tuple]:
+    with conn.cursor() as cur:
+        partitions = [partition for table in PARTITIONED_TABLES for partition in list_partitions(cur, table)]
+        cur.execute(
+            "SELECT relname, reltuples::bigint FROM pg_class WHERE relname = ANY(%s)",
+            ([name for name, _ in partitions],)
+        )
+        estimates = dict(cur.fetchall())
+    return [(name, max(estimates.get(name, 0), 0)) for name, _ in partitions]
+
+async def _main(argv: List[str]) -> int:
+    from database import init_db_pool, close_db_pool, run_in_transaction
+
+    if not argv or argv[0] not in ('status', 'maintain'):
+        print(__doc__)
+        return 2
+
+    if not await init_db_pool():
+        return 1
+    try:
+        if argv[0] == 'maintain':
+            await partition_maintainer.maintain()
+        for name, rows in await run_in_transaction(_partition_status):
+            print(f"{name:24s} ~{rows} rows")
+        return 0
+    finally:
+        await close_db_pool()
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
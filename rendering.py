@@ -0,0 +1,211 @@
+"""MarkdownV2 rendering.
+
+Every message sent with parse_mode="MarkdownV2" is built here. Text is
+escaped with one str.replace per special character it actually contains,
+the backslash first so later escapes are not escaped again. On strings as
+short as ours that beats a str.translate pass, which maps every character
+through a dict lookup. Plain text has 19 special characters, `code` spans
+only ` and \\, and link URLs only ) and \\.
+
+Item names, sweetness levels and prices from the menu are escaped once per
+catalog version, and so is the rendered line of every drink and sweetness
+combination; renders only look them up. Total lines and the customer part
+of the owner's header are cached as they are first rendered. Anything else
+(items kept in a cart from an older menu) is escaped on the fly. Messages
+are assembled from the templates below with one f-string.
+"""
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Iterable, Optional
+from config import PaymentMethod
+from catalog import MenuCatalog, get_catalog, on_catalog_change
+
+# Characters MarkdownV2 reserves outside of entities; the backslash (which escapes itself) must stay first
+SPECIAL_CHARS = "\\_*[]()~`>#+-=|{}.!"
+
+_TEXT_ESCAPES = tuple((char, "\\" + char) for char in SPECIAL_CHARS)
+
+def escape(text: str) -> str:
+    """Escape text for use outside of entities"""
+    for char, escaped in _TEXT_ESCAPES:
+        if char in text:
+            text = text.replace(char, escaped)
+    return text
+
+def escape_code(text: str) -> str:
+    """Escape text for use inside a `code` span"""
+    return text.replace("\\", "\\\\").replace("`", "\\`")
+
+def escape_url(url: str) -> str:
+    """Escape the URL part of an inline link"""
+    return url.replace("\\", "\\\\").replace(")", "\\)")
+
+def _price(amount: float) -> str:
+    # A formatted amount has only digits, "$", "." and "-", so two replaces escape it
+    return f"${amount:.2f}".replace(".", "\\.").replace("-", "\\-")
+
+# Templates: {placeholders} are filled with already-escaped fragments
+ORDER_SUMMARY_HEADER = "🧋 *Your Order:*\n"
+ORDER_SUMMARY_ITEM = "{item} \\- {sweetness} \\- {price}"
+ORDER_TOTAL = "\n💰 *Total: {total}*"
+
+# The order number goes in between; the rest of the header only depends on the customer
+OWNER_ORDER_TITLE = "📥 *New Order \\#"
+OWNER_ORDER_FROM = " from* {user_link}\\!\n"
+OWNER_ORDER_ITEM = "`{item}` \\- `{sweetness}` \\- {price}"
+
+# Most carts add up to a handful of totals; stop caching new ones past this many
+TOTAL_CACHE_SIZE = 1024
+
+class Fragments:
+    """Escaped menu strings, rebuilt whenever the catalog is swapped"""
+
+    def __init__(self, catalog: MenuCatalog = None):
+        self.rebuild(catalog or get_catalog())
+
+    def rebuild(self, catalog: MenuCatalog):
+        names = {item.name for item in catalog.items}
+        # New dicts are swapped in whole, so a render in progress never sees a half-built cache
+        self._text: Dict[str, str] = {name: escape(name) for name in (*names, *catalog.sweet_levels)}
+        self._code: Dict[str, str] = {name: escape_code(name) for name in (*names, *catalog.sweet_levels)}
+        self._prices: Dict[float, str] = {item.price: _price(item.price) for item in catalog.items}
+        # Every line a cart of menu drinks can render to, keyed by (item, sweetness, price)
+        combinations = [(item.name, level, item.price) for item in catalog.items for level in catalog.sweet_levels]
+        self._summary_items: Dict[tuple, str] = {
+            key: self._render_item(ORDER_SUMMARY_ITEM, self.text, *key) for key in combinations
+        }
+        self._owner_items: Dict[tuple, str] = {
+            key: self._render_item(OWNER_ORDER_ITEM, self.code, *key) for key in combinations
+        }
+        self._totals: Dict[float, str] = {}
+
+    def text(self, value: str) -> str:
+        escaped = self._text.get(value)
+        return escaped if escaped is not None else escape(value)
+
+    def code(self, value: str) -> str:
+        escaped = self._code.get(value)
+        return escaped if escaped is not None else escape_code(value)
+
+    def price(self, amount: float) -> str:
+        escaped = self._prices.get(amount)
+        return escaped if escaped is not None else _price(amount)
+
+    def _render_item(self, template: str, escaper, name: str, sweetness: str, price: float) -> str:
+        return template.format(item=escaper(name), sweetness=escaper(sweetness), price=self.price(price))
+
+    def _numbered(self, items: Iterable, rendered: Dict[tuple, str], template: str, escaper) -> str:
+        lines = []
+        for idx, item in enumerate(items, 1):
+            key = (item.item, item.sweetness, item.price)
+            line = rendered.get(key)
+            if line is None:
+                line = self._render_item(template, escaper, *key)
+            lines.append(f"{idx}\\. {line}\n")
+        return "".join(lines)
+
+    def summary_lines(self, items: Iterable) -> str:
+        """OrderItems as the numbered lines of the customer's order summary, each ending in a newline"""
+        return self._numbered(items, self._summary_items, ORDER_SUMMARY_ITEM, self.text)
+
+    def owner_lines(self, items: Iterable) -> str:
+        """OrderItems as the numbered lines of the owner's order message, each ending in a newline"""
+        return self._numbered(items, self._owner_items, OWNER_ORDER_ITEM, self.code)
+
+    def total(self, amount: float) -> str:
+        """The total line shown under a cart"""
+        line = self._totals.get(amount)
+        if line is None:
+            line = ORDER_TOTAL.format(total=_price(amount))
+            if len(self._totals) < TOTAL_CACHE_SIZE:
+                self._totals[amount] = line
+        return line
+
+# Global fragment cache, kept in step with the menu
+fragments = Fragments()
+on_catalog_change(fragments.rebuild)
+
+OWNER_PAYMENT = {
+    PaymentMethod.CASH: "💵 *Payment Method:* `Cash`",
+    PaymentMethod.ABA: "🏦 *Payment Method:* `ABA Pay`",
+}
+
+ABA_PAYMENT_FOOTER = (
+    "Please complete your payment using this link:\n"
+    "[Click here to pay with ABA]({link})\n\n"
+    "Your order will be processed after payment confirmation\\."
+)
+CASH_PAYMENT_FOOTER = "Thank you\\! Please pay in cash when picking up your order\\."
+
+SALES_PERIOD_NAMES = {
+    'day': 'Today',
+    'week': 'This Week',
+    'month': 'This Month',
+    'overall': 'Overall'
+}
+SALES_HEADER = "📊 *Sales Summary \\- {period}*\n_{start} to {end}_\n"
+SALES_TOTALS = "💰 *Total Sales: {total}*\n📦 *Total Orders: {orders}*\n"
+SALES_ITEM_LINE = "• {item}: {quantity} sold"
+
+def render_order_summary(items: Iterable, total: float) -> str:
+    """The customer's cart with numbered lines and the total"""
+    return f"{ORDER_SUMMARY_HEADER}\n{fragments.summary_lines(items)}{fragments.total(total)}"
+
+def render_payment_instructions(summary: str, payment_method: str, payment_link: str) -> str:
+    """Checkout confirmation: the rendered summary followed by how to pay"""
+    if payment_method == PaymentMethod.ABA:
+        footer = ABA_PAYMENT_FOOTER.format(link=escape_url(payment_link))
+    else:
+        footer = CASH_PAYMENT_FOOTER
+    return f"{summary}\n\n{footer}"
+
+def render_user_link(user_id: int, username: str) -> str:
+    """Clickable name: t.me link for @usernames, otherwise a tg://user link"""
+    if username.startswith("@"):
+        handle = username[1:]
+        if handle.replace("_", "").isalnum():
+            # Telegram usernames are letters, digits and underscores: only "_" needs escaping
+            escaped = handle.replace("_", "\\_")
+            return f"[@{escaped}](https://t.me/{handle})"
+        url = f"https://t.me/{handle}"
+    else:
+        url = f"tg://user?id={user_id}"
+    return f"[{escape(username)}]({escape_url(url)})"
+
+@lru_cache(maxsize=1024)
+def _owner_order_from(user_id: int, username: str) -> str:
+    return OWNER_ORDER_FROM.format(user_link=render_user_link(user_id, username))
+
+def render_owner_order(order_number: str, user_id: int, username: str, items: Iterable, total: float,
+                       payment_method: Optional[str]) -> str:
+    """New-order notification for the owner"""
+    # Order numbers are hex, so there is usually nothing to escape
+    number = order_number if order_number.isalnum() else escape(order_number)
+    payment = OWNER_PAYMENT.get(payment_method, OWNER_PAYMENT[PaymentMethod.ABA])
+    return (f"{OWNER_ORDER_TITLE}{number}{_owner_order_from(user_id, username)}\n"
+            f"{fragments.owner_lines(items)}{fragments.total(total)}\n{payment}")
+
+def render_sales_summary(summary: dict) -> str:
+    """Sales report for one period, as returned by get_sales_summary()"""
+    if not summary:
+        return escape("❌ Error fetching sales data")
+
+    start_date = datetime.fromisoformat(summary['start_date'])
+    end_date = datetime.fromisoformat(summary['end_date'])
+    lines = [
+        SALES_HEADER.format(
+            period=escape(SALES_PERIOD_NAMES[summary['period']]),
+            start=escape(start_date.strftime('%Y-%m-%d')),
+            end=escape(end_date.strftime('%Y-%m-%d'))
+        ),
+        SALES_TOTALS.format(total=_price(summary['total_sales']), orders=summary['total_orders'])
+    ]
+    if summary['items_sold']:
+        lines.append("*Top Selling Items:*")
+        lines.extend(
+            SALES_ITEM_LINE.format(item=fragments.text(item), quantity=quantity)
+            for item, quantity in summary['items_sold'].items()
+        )
+    if 'error' in summary:
+        lines.append(f"\n⚠️ *Error:* {escape(summary['error'])}")
+    return "\n".join(lines)
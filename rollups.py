@@ -0,0 +1,163 @@
+"""Incrementally maintained sales rollups.
+
+Daily and hourly revenue/order counts plus daily per-item/per-sweetness
+counts are updated in the same transaction that inserts the order, so
+reports read a handful of rollup rows instead of scanning `sales`. The
+rollup tables are created, and filled from the orders already in `sales`,
+by migrations.py.
+
+Usage:
+    python rollups.py backfill          # rebuild rollups from existing sales rows
+    python rollups.py check [period]    # compare rollups with a raw recompute
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Sequence
+import asyncio
+import sys
+from server_cursor import iter_rows
+
+# Rollup buckets are UTC days/hours, matching the UTC period boundaries in get_sales_summary.
+# Each statement aggregates the sales rows matched by {where} and merges them into the rollup.
+_ROLLUP_DAILY_SQL = """
+    INSERT INTO sales_rollup_daily (day, revenue, order_count)
+    SELECT (created_at AT TIME ZONE 'UTC')::date, SUM(total_amount), COUNT(*)
+    FROM sales
+    WHERE {where}
+    GROUP BY 1
+    ON CONFLICT (day) DO UPDATE SET
+        revenue = sales_rollup_daily.revenue + EXCLUDED.revenue,
+        order_count = sales_rollup_daily.order_count + EXCLUDED.order_count
+"""
+
+_ROLLUP_HOURLY_SQL = """
+    INSERT INTO sales_rollup_hourly (hour, revenue, order_count)
+    SELECT date_trunc('hour', created_at AT TIME ZONE 'UTC'), SUM(total_amount), COUNT(*)
+    FROM sales
+    WHERE {where}
+    GROUP BY 1
+    ON CONFLICT (hour) DO UPDATE SET
+        revenue = sales_rollup_hourly.revenue + EXCLUDED.revenue,
+        order_count = sales_rollup_hourly.order_count + EXCLUDED.order_count
+"""
+
+_ROLLUP_ITEMS_SQL = """
+    INSERT INTO sales_rollup_daily_items (day, item, sweetness, quantity)
+    SELECT (sales.created_at AT TIME ZONE 'UTC')::date,
+           elem->>'item',
+           COALESCE(elem->>'sweetness', ''),
+           COUNT(*)
+    FROM sales, jsonb_array_elements(sales.items) AS elem
+    WHERE {where}
+    AND elem->>'item' IS NOT NULL
+    GROUP BY 1, 2, 3
+    ON CONFLICT (day, item, sweetness) DO UPDATE SET
+        quantity = sales_rollup_daily_items.quantity + EXCLUDED.quantity
+"""
+
+def _apply_rollups(cur, where: str, params: Sequence = ()):
+    for sql in (_ROLLUP_DAILY_SQL, _ROLLUP_HOURLY_SQL, _ROLLUP_ITEMS_SQL):
+        cur.execute(sql.format(where=where), params)
+
+def apply_orders_to_rollups(cur, sale_ids: List[int], since: datetime):
+    """Fold freshly inserted sales rows into the rollups (call inside the insert transaction).
+
+    since is the earliest created_at among them, so only the current partition is read.
+    """
+    if sale_ids:
+        _apply_rollups(cur, "sales.id = ANY(%s) AND sales.created_at >= %s", (list(sale_ids), since))
+
+def backfill_rollups(cur) -> int:
+    """Recompute the rollups of every day still held in sales; returns the number of orders folded in.
+
+    Days before the oldest sales row (months retired by partitions.py) keep
+    their rollup rows, so their totals survive. Also a migration step.
+    """
+    # Block concurrent inserts so no order is counted twice or missed
+    cur.execute("LOCK TABLE sales IN SHARE MODE")
+    cur.execute("SELECT date_trunc('day', MIN(created_at) AT TIME ZONE 'UTC'), COUNT(*) FROM sales")
+    first_day, orders = cur.fetchone()
+    if first_day is None:
+        return 0
+
+    # first_day is a UTC midnight without a zone; compare it as UTC whatever the session TimeZone
+    cur.execute("DELETE FROM sales_rollup_hourly WHERE hour >= %s", (first_day,))
+    cur.execute("DELETE FROM sales_rollup_daily WHERE day >= %s", (first_day.date(),))
+    cur.execute("DELETE FROM sales_rollup_daily_items WHERE day >= %s", (first_day.date(),))
+    _apply_rollups(cur, "sales.created_at >= (%s::timestamp AT TIME ZONE 'UTC')", (first_day,))
+    return orders
+
+def rebuild_rollups(conn) -> int:
+    """Recompute the rollups from the raw sales rows; returns the number of orders folded in"""
+    with conn.cursor() as cur:
+        return backfill_rollups(cur)
+
+def aggregate_rollups_since(conn, start_date: datetime):
+    """Return (total_sales, total_orders, items_sold) for UTC days from start_date onwards"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT COALESCE(SUM(revenue), 0), COALESCE(SUM(order_count), 0)
+            FROM sales_rollup_daily
+            WHERE day >= %s
+        """, (start_date.date(),))
+        total_sales, total_orders = cur.fetchone()
+
+    # One row per item ever sold, so stream it rather than fetchall()
+    items_sold = {
+        item: int(quantity)
+        for item, quantity in iter_rows(conn, """
+            SELECT item, SUM(quantity) AS quantity
+            FROM sales_rollup_daily_items
+            WHERE day >= %s
+            GROUP BY item
+            ORDER BY quantity DESC, item
+        """, (start_date.date(),))
+    }
+    return float(total_sales), int(total_orders), items_sold
+
+async def check_rollups(period: str = 'overall') -> Dict[str, Any]:
+    """Compare rollup totals for a period against a raw recompute from sales"""
+    from database import run_read_only, period_start, _aggregate_sales_since
+
+    start_date = period_start(period, datetime.now(timezone.utc))
+    rollup = await run_read_only(aggregate_rollups_since, start_date)
+    raw = await run_read_only(_aggregate_sales_since, start_date)
+
+    mismatches = {}
+    for name, rolled, recomputed in zip(('total_sales', 'total_orders', 'items_sold'), rollup, raw):
+        if name == 'total_sales':
+            matches = round(rolled, 2) == round(recomputed, 2)
+        else:
+            matches = rolled == recomputed
+        if not matches:
+            mismatches[name] = {'rollup': rolled, 'raw': recomputed}
+
+    return {
+        'period': period,
+        'start_date': start_date.isoformat(),
+        'consistent': not mismatches,
+        'mismatches': mismatches
+    }
+
+async def _main(argv: List[str]) -> int:
+    from database import init_db_pool, close_db_pool, run_in_transaction
+
+    if not argv or argv[0] not in ('backfill', 'check'):
+        print(__doc__)
+        return 2
+
+    if not await init_db_pool():
+        return 1
+    try:
+        if argv[0] == 'backfill':
+            orders = await run_in_transaction(rebuild_rollups)
+            print(f"Rollups rebuilt from {orders} orders")
+            return 0
+
+        result = await check_rollups(argv[1] if len(argv) > 1 else 'overall')
+        print(result)
+        return 0 if result['consistent'] else 1
+    finally:
+        await close_db_pool()
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
\ No newline at end of file
@@ -0,0 +1,101 @@
+"""Streaming export of the sales table.
+
+Orders in a date range are streamed out of Postgres with COPY ... TO STDOUT
+straight into a temporary file, a chunk at a time, so memory use doesn't
+depend on how many orders the range holds. The CSV can then be converted
+to Parquet (zstd-compressed, columnar) batch by batch when pyarrow is
+installed.
+"""
+from datetime import datetime
+from pathlib import Path
+from typing import Tuple
+import os
+import tempfile
+from config import EXPORT_STATEMENT_TIMEOUT
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet exports are unavailable without pyarrow
+    pa = None
+
+EXPORT_FORMATS = ("csv", "parquet")
+
+# Bytes copied per read/write while streaming
+COPY_CHUNK_SIZE = 256 * 1024
+
+# One row per order; timestamps in UTC without an offset so every reader parses them alike
+_EXPORT_SQL = """
+    COPY (
+        SELECT id,
+               to_char(created_at AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS.US') AS created_at_utc,
+               user_id,
+               username,
+               payment_method,
+               total_amount,
+               items
+        FROM sales
+        WHERE created_at >= %s AND created_at < %s
+        ORDER BY created_at, id
+    ) TO STDOUT WITH (FORMAT csv, HEADER)
+"""
+
+def parquet_available() -> bool:
+    return pa is not None
+
+def copy_sales_csv(conn, start: datetime, end: datetime, target: Path,
+                   statement_timeout: float = EXPORT_STATEMENT_TIMEOUT) -> int:
+    """Write orders with start <= created_at < end to target as CSV; returns the row count (blocking)"""
+    with conn.cursor() as cur:
+        # A large range legitimately runs longer than the reporting statement timeout,
+        # but still gets a limit of its own (on the primary fallback too)
+        cur.execute("SET LOCAL statement_timeout = %s", (int(statement_timeout * 1000),))
+        sql = cur.mogrify(_EXPORT_SQL, (start, end)).decode()
+        with open(target, "w", encoding="utf-8", newline="") as f:
+            cur.copy_expert(sql, f, size=COPY_CHUNK_SIZE)
+        return cur.rowcount
+
+def csv_to_parquet(source: Path, target: Path):
+    """Convert an export CSV to Parquet one block at a time (blocking)"""
+    convert_options = pa_csv.ConvertOptions(column_types={
+        "id": pa.int64(),
+        "created_at_utc": pa.timestamp("us"),
+        "user_id": pa.string(),
+        "username": pa.string(),
+        "payment_method": pa.string(),
+        "total_amount": pa.float64(),
+        "items": pa.string(),
+    })
+    reader = pa_csv.open_csv(
+        source, read_options=pa_csv.ReadOptions(block_size=COPY_CHUNK_SIZE * 4), convert_options=convert_options
+    )
+    with pq.ParquetWriter(target, reader.schema, compression="zstd") as writer:
+        for batch in reader:
+            writer.write_batch(batch)
+
+def export_sales(conn, start: datetime, end: datetime, fmt: str = "csv") -> Tuple[Path, int]:
+    """Export a date range to a temporary file; returns (path, row count) (blocking).
+
+    The caller deletes the file once it has been sent.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}")
+    fd, csv_name = tempfile.mkstemp(prefix="sales-", suffix=".csv")
+    os.close(fd)
+    csv_path = Path(csv_name)
+    try:
+        rows = copy_sales_csv(conn, start, end, csv_path)
+        if fmt == "csv":
+            return csv_path, rows
+        parquet_path = csv_path.with_suffix(".parquet")
+        try:
+            csv_to_parquet(csv_path, parquet_path)
+        except Exception:
+            parquet_path.unlink(missing_ok=True)
+            raise
+        csv_path.unlink()
+        return parquet_path, rows
+    except Exception:
+        csv_path.unlink(missing_ok=True)
+        raise
@@ -0,0 +1,127 @@
+"""Normalized order line items.
+
+Every drink of an order is also stored as a row of sales_items (written in
+the same transaction as the sales row), so per-item, per-category and
+per-sweetness questions are answered from indexes on (item, created_at),
+(category, created_at) and (sweetness, created_at) instead of unpacking the
+JSONB items of every order in range. Like sales, the table is partitioned
+by month (see partitions.py).
+
+Usage:
+    python sales_items.py backfill                   # rebuild sales_items from the JSONB items
+    python sales_items.py breakdown <column> [period] # counts by item, category or sweetness
+"""
+from datetime import datetime, timezone
+from typing import Dict, List
+import asyncio
+import sys
+from partitions import create_partitions_between, default_partition, ensure_partitions
+from server_cursor import iter_rows
+
+BREAKDOWN_COLUMNS = ("item", "category", "sweetness")
+
+# Unpacks the JSONB items of the sales rows matched by {where}, keeping their order
+_INSERT_ITEMS_SQL = """
+    INSERT INTO sales_items (sale_id, line_no, created_at, category, item, sweetness, price)
+    SELECT sales.id,
+           elem.line_no,
+           sales.created_at,
+           COALESCE(elem.value->>'category', ''),
+           elem.value->>'item',
+           COALESCE(elem.value->>'sweetness', ''),
+           COALESCE((elem.value->>'price')::numeric, 0)
+    FROM sales, jsonb_array_elements(sales.items) WITH ORDINALITY AS elem(value, line_no)
+    WHERE {where}
+    AND elem.value->>'item' IS NOT NULL
+"""
+
+def create_sales_items(cur):
+    """Migration step: create the partitioned sales_items table and fill it from existing orders"""
+    cur.execute("""
+        CREATE TABLE sales_items (
+            sale_id INTEGER NOT NULL,
+            line_no SMALLINT NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            category TEXT NOT NULL DEFAULT '',
+            item TEXT NOT NULL,
+            sweetness TEXT NOT NULL DEFAULT '',
+            price DECIMAL(10,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (sale_id, line_no, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    # Leading column is the breakdown key, so grouped counts over a range are index-only scans
+    cur.execute("CREATE INDEX idx_sales_items_item ON sales_items (item, created_at)")
+    cur.execute("CREATE INDEX idx_sales_items_category ON sales_items (category, created_at)")
+    cur.execute("CREATE INDEX idx_sales_items_sweetness ON sales_items (sweetness, created_at)")
+    cur.execute(f"CREATE TABLE {default_partition('sales_items')} PARTITION OF sales_items DEFAULT")
+
+    now = datetime.now(timezone.utc)
+    cur.execute("SELECT MIN(created_at) FROM sales")
+    create_partitions_between(cur, cur.fetchone()[0] or now, now, "sales_items")
+    ensure_partitions(cur, now, tables=("sales_items",))
+    cur.execute(_INSERT_ITEMS_SQL.format(where="TRUE"))
+
+def insert_sale_items(cur, sale_ids: List[int], since: datetime):
+    """Write the line items of freshly inserted sales rows (call inside the insert transaction)"""
+    if sale_ids:
+        cur.execute(
+            _INSERT_ITEMS_SQL.format(where="sales.id = ANY(%s) AND sales.created_at >= %s"),
+            (list(sale_ids), since)
+        )
+
+def rebuild_sale_items(conn) -> int:
+    """Recreate every line item from the JSONB items; returns the number of rows written"""
+    with conn.cursor() as cur:
+        # Block concurrent inserts so no order is missed or written twice
+        cur.execute("LOCK TABLE sales IN SHARE MODE")
+        cur.execute("TRUNCATE sales_items")
+        cur.execute(_INSERT_ITEMS_SQL.format(where="TRUE"))
+        return cur.rowcount
+
+def count_items_since(conn, column: str, start_date: datetime) -> Dict[str, int]:
+    """Drinks sold since start_date grouped by item, category or sweetness, most sold first"""
+    if column not in BREAKDOWN_COLUMNS:
+        raise ValueError(f"unknown breakdown column {column!r}")
+    return {
+        key: quantity
+        for key, quantity in iter_rows(conn, f"""
+            SELECT {column}, COUNT(*) AS quantity
+            FROM sales_items
+            WHERE created_at >= %s
+            GROUP BY 1
+            ORDER BY quantity DESC, 1
+        """, (start_date,))
+    }
+
+def count_item_since(conn, item: str, start_date: datetime) -> int:
+    """How many of one drink were sold since start_date"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM sales_items WHERE item = %s AND created_at >= %s", (item, start_date))
+        return cur.fetchone()[0]
+
+async def _main(argv: List[str]) -> int:
+    from database import init_db_pool, close_db_pool, run_in_transaction, run_read_only, period_start
+
+    if not argv or argv[0] not in ('backfill', 'breakdown') or \
+            (argv[0] == 'breakdown' and (len(argv) < 2 or argv[1] not in BREAKDOWN_COLUMNS)):
+        print(__doc__)
+        return 2
+
+    if not await init_db_pool():
+        return 1
+    try:
+        if argv[0] == 'backfill':
+            rows = await run_in_transaction(rebuild_sale_items)
+            print(f"sales_items rebuilt with {rows} line items")
+            return 0
+
+        start_date = period_start(argv[2] if len(argv) > 2 else 'overall', datetime.now(timezone.utc))
+        counts = await run_read_only(count_items_since, argv[1], start_date)
+        for key, quantity in counts.items():
+            print(f"{quantity:8d}  {key or '-'}")
+        return 0
+    finally:
+        await close_db_pool()
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
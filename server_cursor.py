@@ -0,0 +1,29 @@
+"""Streaming reads through server-side cursors.
+
+iter_rows() runs a query through a named (server-side) cursor and fetches
+its rows in fetchmany() batches as plain tuples, so a read only ever holds
+one batch in memory no matter how many rows the query returns. Callers
+aggregate as they go instead of calling fetchall().
+
+Named cursors only live inside a transaction, so call it from a function
+run by database.run_in_transaction().
+"""
+from typing import Iterator, Sequence
+import itertools
+import os
+
+# Rows fetched per round trip
+STREAM_BATCH_SIZE = int(os.getenv('DB_STREAM_BATCH_SIZE', 2000))
+
+_cursor_ids = itertools.count(1)
+
+def iter_rows(conn, sql: str, params: Sequence = (), batch_size: int = STREAM_BATCH_SIZE) -> Iterator[tuple]:
+    """Yield the rows of sql one at a time, fetching batch_size rows per round trip (blocking)"""
+    with conn.cursor(name=f"stream_{next(_cursor_ids)}") as cur:
+        cur.itersize = batch_size
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
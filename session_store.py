@@ -0,0 +1,165 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from config import logger, UserOrder, SESSION_MAX_CARTS, SESSION_IDLE_TTL, CART_FLUSH_INTERVAL
+
+class SessionStore:
+    """Per-user carts with LRU and idle-TTL eviction.
+
+    Sessions are kept in least-recently-used order, so expired or surplus
+    carts are always at the front and eviction never scans the whole store.
+
+    With a persistence backend the in-memory copy stays authoritative:
+    changed carts are only marked dirty and written in one batch every
+    CART_FLUSH_INTERVAL seconds, and a cart missing from memory (e.g. after
+    a restart) is reloaded from the backend on first access.
+    """
+
+    def __init__(self, max_sessions: int = SESSION_MAX_CARTS, idle_ttl: float = SESSION_IDLE_TTL,
+                 backend=None, flush_interval: float = CART_FLUSH_INTERVAL):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self._sessions: "OrderedDict[int, list]" = OrderedDict()  # user_id -> [last_seen, order]
+        # Writes waiting for the next flush: user_id -> order to save, or None to delete
+        self._pending: Dict[int, Optional[UserOrder]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, user_id: int) -> bool:
+        return self.peek(user_id) is not None
+
+    async def start(self):
+        """Open the backend, drop carts that expired while we were down and start flushing"""
+        if self.backend is None or self._flush_task is not None:
+            return
+        await self.backend.open()
+        try:
+            purged = await self.backend.purge(time.time() - self.idle_ttl)
+        except Exception as e:
+            # e.g. Postgres is down at boot: keep carts in memory, flushes retry until it is back
+            # (expired carts left behind are still ignored when loaded)
+            logger.error(f"Failed to purge expired carts: {str(e)}")
+            purged = 0
+        if purged:
+            logger.info(f"Purged {purged} expired carts")
+        self._flush_task = asyncio.create_task(self._flush_loop(), name="cart-flush")
+
+    async def stop(self):
+        """Write every pending change and close the backend"""
+        if self._flush_task is None:
+            return
+        self._flush_task.cancel()
+        try:
+            await self._flush_task
+        except asyncio.CancelledError:
+            pass
+        self._flush_task = None
+        await self.flush()
+        await self.backend.close()
+
+    async def get(self, user_id: int) -> UserOrder:
+        """Return the user's cart, creating or reloading it if needed, and mark it as recently used"""
+        now = time.monotonic()
+        entry = self._sessions.get(user_id)
+        if entry is not None and now - entry[0] < self.idle_ttl:
+            entry[0] = now
+            self._sessions.move_to_end(user_id)
+            return entry[1]
+
+        order = None
+        if entry is None:
+            order = await self._restore(user_id)
+            # Another callback may have created the session while we were loading
+            entry = self._sessions.get(user_id)
+            if entry is not None and time.monotonic() - entry[0] < self.idle_ttl:
+                entry[0] = time.monotonic()
+                self._sessions.move_to_end(user_id)
+                return entry[1]
+
+        if order is None:
+            order = UserOrder()
+        now = time.monotonic()
+        self._sessions[user_id] = [now, order]
+        self._sessions.move_to_end(user_id)
+        self._evict(now)
+        return order
+
+    def peek(self, user_id: int) -> Optional[UserOrder]:
+        """Return the user's cart without creating or refreshing it"""
+        entry = self._sessions.get(user_id)
+        if entry is None or time.monotonic() - entry[0] >= self.idle_ttl:
+            return None
+        return entry[1]
+
+    def mark_dirty(self, user_id: int):
+        """Schedule the user's cart to be written on the next flush"""
+        if self.backend is None:
+            return
+        entry = self._sessions.get(user_id)
+        if entry is not None:
+            self._pending[user_id] = entry[1]
+
+    def discard(self, user_id: int):
+        self._sessions.pop(user_id, None)
+        if self.backend is not None:
+            self._pending[user_id] = None
+
+    async def flush(self):
+        """Write all pending carts in one backend call"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        now = time.time()
+        upserts = {
+            user_id: (now, json.dumps(order.to_dict(), separators=(",", ":")))
+            for user_id, order in pending.items() if order is not None
+        }
+        deletes = [user_id for user_id, order in pending.items() if order is None]
+        try:
+            await self.backend.save(upserts, deletes)
+        except Exception as e:
+            logger.error(f"Failed to persist {len(pending)} carts: {str(e)}")
+            # Retry on the next flush, without overwriting newer changes
+            for user_id, order in pending.items():
+                self._pending.setdefault(user_id, order)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def _restore(self, user_id: int) -> Optional[UserOrder]:
+        if self.backend is None:
+            return None
+        if user_id in self._pending:
+            # Evicted from memory but not written yet
+            return self._pending[user_id]
+        try:
+            row = await self.backend.load(user_id)
+        except Exception as e:
+            logger.error(f"Failed to load cart for {user_id}: {str(e)}")
+            return None
+        if row is None:
+            return None
+        updated_at, data = row
+        if time.time() - updated_at >= self.idle_ttl:
+            return None
+        return UserOrder.from_dict(json.loads(data))
+
+    def _evict(self, now: float):
+        sessions = self._sessions
+        while sessions:
+            user_id, (last_seen, order) = next(iter(sessions.items()))
+            expired = now - last_seen >= self.idle_ttl
+            if len(sessions) <= self.max_sessions and not expired:
+                break
+            del sessions[user_id]
+            if self.backend is not None and expired:
+                # Abandoned cart: forget it in the backend too
+                self._pending[user_id] = None
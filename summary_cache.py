@@ -0,0 +1,52 @@
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+import metrics
+
+class SummaryCache:
+    """TTL cache for sales summaries, cleared whenever an order is committed.
+
+    Entries are keyed by (period, period start), so once a period rolls over
+    (midnight, Monday, the 1st) the old window is simply never looked up again.
+    put() can store an entry for less than the default TTL (e.g. a summary
+    read from a replica, which may not have every committed order yet).
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        # (period, start) -> (expires at, summary)
+        self._entries: Dict[Tuple[str, datetime], Tuple[float, Dict[str, Any]]] = {}
+        # Bumped on every invalidation so results computed before a write are not stored
+        self.generation = 0
+
+    def get(self, period: str, start_date: datetime) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get((period, start_date))
+        if entry is not None and time.monotonic() < entry[0]:
+            metrics.increment('summary_cache.hits')
+            return entry[1]
+        metrics.increment('summary_cache.misses')
+        return None
+
+    def put(self, period: str, start_date: datetime, summary: Dict[str, Any], generation: int,
+            ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or generation != self.generation:
+            return
+        # Drop windows that have rolled over for this period
+        for key in [key for key in self._entries if key[0] == period]:
+            del self._entries[key]
+        self._entries[(period, start_date)] = (time.monotonic() + ttl, summary)
+
+    def invalidate(self):
+        self.generation += 1
+        self._entries.clear()
+        metrics.increment('summary_cache.invalidations')
+
+    def stats(self) -> Dict[str, int]:
+        counters = metrics.snapshot()['counters']
+        return {
+            'hits': counters.get('summary_cache.hits', 0),
+            'misses': counters.get('summary_cache.misses', 0),
+            'invalidations': counters.get('summary_cache.invalidations', 0),
+            'entries': len(self._entries)
+        }
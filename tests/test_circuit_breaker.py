@@ -0,0 +1,54 @@
+import asyncio
+import pytest
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from database import DatabasePool
+
+def test_opens_after_threshold_and_probes_after_reset():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only the one probe is let through
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_inconclusive_probe_reopens():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_inconclusive()
+    assert breaker.state == CircuitBreaker.OPEN
+    # The next call probes again instead of being rejected forever
+    assert breaker.allow()
+
+def _tripped_pool(acquire):
+    pool = DatabasePool("test", "postgresql://unused", 1, 1)
+    pool.breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    pool.breaker.record_failure()
+    pool.acquire = acquire
+    return pool
+
+@pytest.mark.parametrize("error", [asyncio.TimeoutError, asyncio.CancelledError])
+def test_probe_that_times_out_or_is_cancelled_does_not_wedge_the_breaker(error):
+    def acquire():
+        raise error()
+    pool = _tripped_pool(acquire)
+
+    async def probe():
+        with pytest.raises(error):
+            await pool.run(lambda conn: None)
+    asyncio.run(probe())
+
+    assert pool.breaker.state == CircuitBreaker.OPEN
+    assert pool.breaker.allow()
+
+def test_open_circuit_fails_fast():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
@@ -0,0 +1,26 @@
+from datetime import datetime, timedelta, timezone
+from handlers.export_handler import parse_export_args
+
+NOW = datetime(2024, 3, 14, 17, 30, tzinfo=timezone.utc)
+
+def test_date_range_is_utc_and_includes_the_last_day():
+    start, end, fmt = parse_export_args(["2024-01-01", "2024-01-31", "parquet"], NOW)
+    assert (start, end, fmt) == (
+        datetime(2024, 1, 1, tzinfo=timezone.utc), datetime(2024, 2, 1, tzinfo=timezone.utc), "parquet"
+    )
+    assert start.utcoffset() == end.utcoffset() == timedelta(0)
+
+def test_open_range_ends_now():
+    start, end, fmt = parse_export_args(["2024-03-01"], NOW)
+    assert start == datetime(2024, 3, 1, tzinfo=timezone.utc)
+    assert end == NOW + timedelta(seconds=1) and fmt == "csv"
+
+def test_period_names():
+    start, end, _ = parse_export_args(["month"], NOW)
+    assert start == datetime(2024, 3, 1, tzinfo=timezone.utc) and end > NOW
+
+def test_bad_arguments():
+    assert parse_export_args([], NOW) is None
+    assert parse_export_args(["2024-13-01"], NOW) is None
+    assert parse_export_args(["2024-02-01", "2024-01-01"], NOW) is None
+    assert parse_export_args(["a", "b", "c"], NOW) is None
@@ -0,0 +1,79 @@
+import asyncio
+import pytest
+import order_spool as spool_module
+import order_writer as writer_module
+from order_spool import OrderSpool, SpoolReplayer
+from order_writer import OrderWriter
+
+class Rejected(Exception):
+    """Stands in for a statement error: the database answered but refused the order"""
+
+def _order(index: int) -> tuple:
+    return writer_module.new_order(index, f"user{index}", [{"item": "Latte"}], 2.5, "cash")
+
+@pytest.fixture
+def spool(tmp_path, monkeypatch):
+    spool = OrderSpool(tmp_path / "order_spool.db")
+    monkeypatch.setattr(writer_module, "order_spool", spool)
+    yield spool
+    asyncio.run(spool.close())
+
+def _fake_save(saved: list, fail):
+    async def save_orders(orders):
+        for order in orders:
+            error = fail(order)
+            if error is not None:
+                raise error
+        saved.extend(orders)
+        return [("row", order[5]) for order in orders]
+    return save_orders
+
+def test_pool_timeout_spools_the_batch(spool, monkeypatch):
+    saved = []
+    monkeypatch.setattr(writer_module, "save_orders", _fake_save(saved, lambda order: asyncio.TimeoutError()))
+    orders = [_order(i) for i in range(5)]
+
+    async def flush():
+        futures = [asyncio.get_running_loop().create_future() for _ in orders]
+        await OrderWriter()._flush(list(zip(orders, futures)))
+        return [future.result() for future in futures]
+
+    assert asyncio.run(flush()) == [None] * 5
+    assert spool.pending == 5 and spool.dead == 0 and not saved
+
+def test_rejected_order_is_dead_lettered_alone(spool, monkeypatch):
+    saved = []
+    orders = [_order(i) for i in range(50)]
+    poison = orders[17][5]
+    monkeypatch.setattr(writer_module, "save_orders",
+                        _fake_save(saved, lambda order: Rejected("bad order") if order[5] == poison else None))
+
+    async def flush():
+        futures = [asyncio.get_running_loop().create_future() for _ in orders]
+        await OrderWriter()._flush(list(zip(orders, futures)))
+        return [future.result() for future in futures]
+
+    rows = asyncio.run(flush())
+    assert [order[5] for order in saved] == [order[5] for order in orders if order[5] != poison]
+    assert rows[17] is None and all(row is not None for i, row in enumerate(rows) if i != 17)
+    assert spool.pending == 0 and spool.dead == 1
+    (_, error, dead), = spool._dead_orders()
+    assert dead[5] == poison and error == "bad order"
+
+def test_replay_dead_letters_a_rejected_order_and_keeps_going(spool, monkeypatch):
+    saved = []
+    orders = [_order(i) for i in range(10)]
+    poison = orders[3][5]
+    monkeypatch.setattr(spool_module, "save_orders",
+                        _fake_save(saved, lambda order: Rejected("bad order") if order[5] == poison else None))
+
+    async def replay():
+        await spool.append(orders)
+        return await SpoolReplayer(spool, batch_size=4).drain()
+
+    assert asyncio.run(replay()) == 9
+    assert [order[5] for order in saved] == [order[5] for order in orders if order[5] != poison]
+    assert spool.pending == 0 and spool.dead == 1
+
+    assert spool._requeue_dead() == 1
+    assert spool.pending == 1 and spool.dead == 0
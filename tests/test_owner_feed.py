@@ -0,0 +1,70 @@
+import asyncio
+from config import OrderItem, UserOrder
+from database import new_order_key
+from handlers.router import parse_callback_data
+from owner_feed import OwnerFeed
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+def _order() -> UserOrder:
+    order = UserOrder()
+    order.add_item(OrderItem("Coffee", "Latte", "50%", 2.5))
+    order.payment_method = "cash"
+    return order
+
+def test_order_numbers_do_not_repeat_across_restarts():
+    before_restart = OwnerFeed(mode="messages").add(new_order_key(), 42, "alice", _order())
+    after_restart = OwnerFeed(mode="messages").add(new_order_key(), 42, "alice", _order())
+    assert before_restart.order_key != after_restart.order_key
+    assert before_restart.done_data != after_restart.done_data
+
+def test_done_button_payload_fits_and_routes():
+    pending = OwnerFeed(mode="messages").add(new_order_key(), 9_999_999_999, "alice", _order())
+    assert len(pending.done_data.encode()) <= 64
+    action = parse_callback_data(pending.done_data)
+    assert action.kind == "done" and action.arg == f"{pending.order_key}_9999999999"
+
+def test_only_open_orders_have_open_buttons():
+    feed = OwnerFeed(mode="messages", order_ttl=60)
+    taken = feed.add(new_order_key(), 1, "a", _order())
+    stale = feed.add(new_order_key(), 2, "b", _order())
+    feed.take([taken.order_key])
+    stale.placed_at -= 120
+    current = feed.add(new_order_key(), 3, "c", _order())
+    assert [feed.is_open_button(pending.done_data) for pending in (taken, stale, current)] == [False, False, True]
+    # Buttons the feed no longer knows still route
+    assert parse_callback_data(taken.done_data).arg == f"{taken.order_key}_1"
+
+def test_resolve_by_number_prefix():
+    feed = OwnerFeed(mode="messages")
+    first = feed.add("ab12" + "0" * 28, 1, "a", _order())
+    feed.add("ab34" + "0" * 28, 2, "b", _order())
+    assert feed.resolve(f"#{first.number}") == [first.order_key]
+    assert len(feed.resolve("AB")) == 2
+    assert feed.resolve("ffff") == []
+
+def test_uncompleted_orders_expire():
+    feed = OwnerFeed(mode="messages", order_ttl=60, max_orders=3)
+    stale = feed.add(new_order_key(), 1, "a", _order())
+    stale.placed_at -= 120
+    for user_id in range(2, 6):
+        feed.add(new_order_key(), user_id, "u", _order())
+    assert stale.order_key not in {pending.order_key for pending in feed.open_orders()}
+    assert len(feed) == 3
+
+def test_old_button_does_not_complete_a_new_order(monkeypatch):
+    feed = OwnerFeed(mode="messages")
+    notified = []
+
+    async def notify_ready(bot, user_ids):
+        notified.extend(user_ids)
+        return len(notified)
+    monkeypatch.setattr(feed, "notify_ready", notify_ready)
+
+    new = feed.add(new_order_key(), 42, "alice", _order())
+    # A "done_1_42" button from before the restart
+    assert asyncio.run(feed.complete_button(FakeBot(), "1", 42))
+    assert [pending.order_key for pending in feed.open_orders()] == [new.order_key]
+    assert notified == [42]
@@ -0,0 +1,23 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from database import period_start
+
+PHNOM_PENH = timezone(timedelta(hours=7))
+
+@pytest.mark.parametrize("period, expected", [
+    ("day", datetime(2024, 3, 14, tzinfo=timezone.utc)),
+    ("week", datetime(2024, 3, 11, tzinfo=timezone.utc)),
+    ("month", datetime(2024, 3, 1, tzinfo=timezone.utc)),
+    ("overall", datetime(2024, 1, 1, tzinfo=timezone.utc)),
+])
+def test_period_start_is_an_aware_utc_boundary(period, expected):
+    now = datetime(2024, 3, 14, 17, 30, tzinfo=timezone.utc)
+    start = period_start(period, now)
+    assert start == expected
+    assert start.utcoffset() == timedelta(0)
+
+def test_local_and_naive_now_give_the_same_utc_day():
+    # 00:30 on the 15th in Phnom Penh is still the 14th in UTC
+    local = datetime(2024, 3, 15, 0, 30, tzinfo=PHNOM_PENH)
+    naive = datetime(2024, 3, 14, 17, 30)
+    assert period_start("day", local) == period_start("day", naive) == datetime(2024, 3, 14, tzinfo=timezone.utc)
@@ -0,0 +1,89 @@
+import asyncio
+import psycopg2
+import pytest
+import database
+from circuit_breaker import CircuitOpenError
+from summary_cache import SummaryCache
+
+class StubPool:
+    """Records the calls routed to it and answers with its name, or raises the given error"""
+
+    def __init__(self, name: str, error: Exception = None):
+        self.name = name
+        self.error = error
+        self.calls = []
+
+    async def run(self, func, *args):
+        self.calls.append((func, args))
+        if self.error is not None:
+            raise self.error
+        return func(self.name, *args)
+
+def _report(conn, period):
+    return conn, period
+
+@pytest.fixture
+def pools(monkeypatch):
+    def install(reporting_error=None, with_reporting=True):
+        primary = StubPool("primary")
+        reporting = StubPool("reporting", reporting_error) if with_reporting else None
+        monkeypatch.setattr(database, "primary_pool", primary)
+        monkeypatch.setattr(database, "reporting_pool", reporting)
+        return primary, reporting
+    return install
+
+def test_reads_go_to_the_reporting_pool(pools):
+    primary, reporting = pools()
+    assert asyncio.run(database.run_read_only(_report, "day")) == ("reporting", "day")
+    assert not primary.calls
+
+def test_reads_use_the_primary_without_a_reporting_database(pools):
+    primary, _ = pools(with_reporting=False)
+    assert asyncio.run(database.run_read_only(_report, "week")) == ("primary", "week")
+
+def test_writes_always_go_to_the_primary(pools):
+    primary, reporting = pools()
+    assert asyncio.run(database.run_in_transaction(_report, "month")) == ("primary", "month")
+    assert not reporting.calls
+
+@pytest.mark.parametrize("error", [
+    CircuitOpenError("db.reporting circuit is open"),
+    ConnectionError("Could not connect to reporting database"),
+    psycopg2.OperationalError("server closed the connection unexpectedly"),
+    psycopg2.InterfaceError("connection already closed"),
+])
+def test_unreachable_reporting_database_falls_back_to_the_primary(pools, error):
+    primary, reporting = pools(reporting_error=error)
+    assert asyncio.run(database.run_read_only(_report, "day")) == ("primary", "day")
+    assert len(reporting.calls) == len(primary.calls) == 1
+
+@pytest.mark.parametrize("error", [
+    psycopg2.extensions.QueryCanceledError("canceling statement due to statement timeout"),
+    ValueError("bad report"),
+])
+def test_report_errors_are_not_retried_on_the_primary(pools, error):
+    primary, _ = pools(reporting_error=error)
+    with pytest.raises(type(error)):
+        asyncio.run(database.run_read_only(_report, "day"))
+    assert not primary.calls
+
+@pytest.fixture
+def summaries(monkeypatch):
+    monkeypatch.setattr(database, "summary_cache", SummaryCache(60))
+    monkeypatch.setattr(database, "aggregate_rollups_since", lambda conn, start_date: (1.25, 1, {"Latte": 1}))
+
+def _summary_reads(pool):
+    return sum(func is database.aggregate_rollups_since for func, _ in pool.calls)
+
+def test_summaries_from_the_primary_are_cached(pools, summaries):
+    primary, _ = pools(with_reporting=False)
+    for _ in range(2):
+        assert asyncio.run(database.get_sales_summary("day"))["total_orders"] == 1
+    assert _summary_reads(primary) == 1
+
+def test_summaries_from_the_reporting_database_are_not_cached_past_a_commit(pools, summaries):
+    # The replica may not have the orders whose commit invalidated the cache yet
+    _, reporting = pools()
+    for _ in range(2):
+        assert asyncio.run(database.get_sales_summary("day"))["total_orders"] == 1
+    assert _summary_reads(reporting) == 2
@@ -0,0 +1,127 @@
+"""Read routing against two real Postgres instances.
+
+Set TEST_PRIMARY_DATABASE_URL and TEST_REPORTING_DATABASE_URL to two
+databases on different servers (neither is migrated or written to);
+the tests are skipped otherwise.
+"""
+import asyncio
+import os
+import psycopg2
+import pytest
+import database
+from circuit_breaker import CircuitBreaker
+from database import DatabasePool, reporting_options
+
+PRIMARY_URL = os.getenv("TEST_PRIMARY_DATABASE_URL")
+REPORTING_URL = os.getenv("TEST_REPORTING_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(
+    not (PRIMARY_URL and REPORTING_URL),
+    reason="set TEST_PRIMARY_DATABASE_URL and TEST_REPORTING_DATABASE_URL to run against Postgres"
+)
+
+def _read_only_setting(conn) -> str:
+    with conn.cursor() as cur:
+        cur.execute("SHOW default_transaction_read_only")
+        return cur.fetchone()[0]
+
+def _create_table(conn):
+    with conn.cursor() as cur:
+        cur.execute("CREATE TABLE read_routing_test (id integer)")
+
+def _sleep(conn, seconds: float):
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_sleep(%s)", (seconds,))
+
+def _terminate_reporting_connections():
+    """Drop every other connection to the reporting database, as a restart of the server would"""
+    conn = psycopg2.connect(REPORTING_URL)
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT pg_terminate_backend(pid) FROM pg_stat_activity
+                WHERE datname = current_database() AND pid <> pg_backend_pid()
+            """)
+    finally:
+        conn.close()
+
+@pytest.fixture
+def pools(monkeypatch):
+    """Open a primary and a reporting pool, install them in database and close them afterwards"""
+    opened = []
+
+    async def install(reporting_url: str = REPORTING_URL, statement_timeout: float = 30):
+        primary = DatabasePool('primary', PRIMARY_URL, 1, 2)
+        reporting = DatabasePool('reporting', reporting_url, 1, 2, options=reporting_options(statement_timeout))
+        monkeypatch.setattr(database, "primary_pool", primary)
+        monkeypatch.setattr(database, "reporting_pool", reporting)
+        opened.extend([primary, reporting])
+        assert await primary.open()
+        return primary, reporting
+
+    async def close():
+        for pool in opened:
+            await pool.close()
+
+    install.close = close
+    return install
+
+def test_reads_run_read_only_on_the_reporting_database(pools):
+    async def scenario():
+        await pools()
+        try:
+            assert await database.run_read_only(_read_only_setting) == "on"
+            assert await database.run_in_transaction(_read_only_setting) == "off"
+        finally:
+            await pools.close()
+
+    asyncio.run(scenario())
+
+def test_writes_on_the_reporting_pool_fail_as_read_only(pools):
+    async def scenario():
+        _, reporting = await pools()
+        try:
+            with pytest.raises(psycopg2.errors.ReadOnlySqlTransaction):
+                await reporting.run(_create_table)
+        finally:
+            await pools.close()
+
+    asyncio.run(scenario())
+
+def test_statement_timeout_applies_on_the_reporting_database(pools):
+    async def scenario():
+        _, reporting = await pools(statement_timeout=0.2)
+        try:
+            # The report's own failure: not retried on the primary, and the server did answer
+            with pytest.raises(psycopg2.extensions.QueryCanceledError):
+                await database.run_read_only(_sleep, 2)
+            assert reporting.breaker.state == CircuitBreaker.CLOSED
+        finally:
+            await pools.close()
+
+    asyncio.run(scenario())
+
+def test_dropped_reporting_connections_fall_back_to_the_primary(pools):
+    async def scenario():
+        await pools()
+        try:
+            assert await database.run_read_only(_read_only_setting) == "on"
+            _terminate_reporting_connections()
+            assert await database.run_read_only(_read_only_setting) == "off"
+        finally:
+            await pools.close()
+
+    asyncio.run(scenario())
+
+def test_stopped_reporting_database_falls_back_to_the_primary(pools):
+    async def scenario():
+        # Nothing listens on port 1: connecting fails like it does to a stopped server
+        unreachable = psycopg2.extensions.make_dsn(REPORTING_URL, port=1, connect_timeout=2)
+        await pools(reporting_url=unreachable)
+        try:
+            assert await database.run_read_only(_read_only_setting) == "off"
+        finally:
+            await pools.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,99 @@
+import random
+import re
+import pytest
+from catalog import MenuCatalog
+from config import OrderItem
+from rendering import (
+    SPECIAL_CHARS, Fragments, escape, escape_code, escape_url, render_order_summary, render_owner_order,
+    render_user_link
+)
+
+# Seeded random strings stand in for a property-testing library; the alphabet
+# is weighted towards the characters the escapers care about
+ALPHABET = SPECIAL_CHARS + "abcXYZ019 @/:?&%\n\t" + "éßкт🧋😀"
+CASES = 2000
+
+def _strings(seed: int, max_length: int = 40):
+    rng = random.Random(seed)
+    for _ in range(CASES):
+        yield "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, max_length)))
+
+def _unescape(text: str) -> str:
+    return re.sub(r"\\(.)", r"\1", text, flags=re.DOTALL)
+
+def _unescaped(text: str, special: str) -> list:
+    """Special characters in escaped output that are not preceded by an escaping backslash"""
+    found, i = [], 0
+    while i < len(text):
+        if text[i] == "\\":
+            i += 2
+            continue
+        if text[i] in special:
+            found.append(text[i])
+        i += 1
+    return found
+
+def _baseline_escape_markdown(text: str) -> str:
+    # The replace loop the handlers used before rendering.py
+    for char in ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']:
+        text = text.replace(char, f"\\{char}")
+    return text
+
+def test_escape_round_trips():
+    for text in _strings(1):
+        assert _unescape(escape(text)) == text
+        assert _unescape(escape_code(text)) == text
+        assert _unescape(escape_url(text)) == text
+
+def test_escaped_output_has_no_bare_special_chars():
+    for text in _strings(2):
+        assert _unescaped(escape(text), SPECIAL_CHARS) == []
+        assert _unescaped(escape_code(text), "`\\") == []
+        assert _unescaped(escape_url(text), ")\\") == []
+
+def test_escape_only_touches_special_chars():
+    for text in _strings(3):
+        assert len(escape(text)) == len(text) + sum(text.count(char) for char in SPECIAL_CHARS)
+        assert escape_code(text).replace("\\`", "`").replace("\\\\", "\\") == text
+
+def test_escape_matches_baseline_replace_loop():
+    # The old loop never escaped backslashes, so compare on text without them
+    for text in _strings(4):
+        text = text.replace("\\", "")
+        assert escape(text) == _baseline_escape_markdown(text)
+
+def test_fragments_match_escaping_on_the_fly():
+    rng = random.Random(5)
+    names = list(dict.fromkeys(text for text in _strings(6, max_length=12) if text))[:50]
+    menu = {"Odd_[cat]": {name: round(rng.uniform(0, 20), 2) for name in names}}
+    catalog = MenuCatalog(menu, ["Less.sweet", "*No* sweet"])
+    cached = Fragments(catalog)
+    for item in catalog.items:
+        assert cached.text(item.name) == escape(item.name)
+        assert cached.code(item.name) == escape_code(item.name)
+        assert cached.price(item.price) == escape(f"${item.price:.2f}")
+    for level in catalog.sweet_levels:
+        assert cached.text(level) == escape(level)
+    # Strings outside the catalog are escaped on the fly
+    assert cached.text("not_on_menu") == "not\\_on\\_menu"
+    assert cached.price(0.125) == escape("$0.12")
+
+def test_rendered_messages_escape_user_text():
+    items = [OrderItem("Coffee", "Iced_Latte (L)", "50%", 1.25)]
+    summary = render_order_summary(items, 1.25)
+    assert "Iced\\_Latte \\(L\\)" in summary
+    assert "$1\\.25" in summary
+
+    message = render_owner_order("3FA9C1", 7, "@bad_user.name", items, 1.25, "cash")
+    assert "[@bad\\_user\\.name](https://t.me/bad_user.name)" in message
+    assert "`Iced_Latte (L)`" in message
+
+@pytest.mark.parametrize("username", ["@boba_fan_99", "@x", "@bad_user.name", "@odd)name", "Alice (A)"])
+def test_user_links_match_escaping_on_the_fly(username):
+    url = f"https://t.me/{username[1:]}" if username.startswith("@") else "tg://user?id=7"
+    assert render_user_link(7, username) == f"[{escape(username)}]({escape_url(url)})"
+
+def test_cached_totals_render_like_new_ones():
+    cached = Fragments()
+    for amount in (1.25, 1.25, 0.0, 1234.5):
+        assert cached.total(amount) == f"\n💰 *Total: {escape(f'${amount:.2f}')}*"
@@ -0,0 +1,44 @@
+import pytest
+from catalog import MenuCatalog, get_catalog, swap_catalog
+from handlers.router import ROUTES, parse_callback_data
+from keyboards import keyboards
+
+@pytest.fixture
+def restore_catalog():
+    current = get_catalog()
+    yield
+    swap_catalog(current)
+
+def _payloads(markup):
+    return [button.callback_data for row in markup.inline_keyboard for button in row]
+
+def test_every_issued_button_parses_to_a_route():
+    markups = [keyboards.categories, keyboards.sweetness, keyboards.order_more_or_confirm, keyboards.payment,
+               keyboards.order_now, keyboards.store_status, keyboards.sales_periods, *keyboards.items.values()]
+    for markup in markups:
+        for data in _payloads(markup):
+            action = parse_callback_data(data)
+            assert action is not None and action.kind in ROUTES, data
+
+def test_menu_buttons_resolve_to_catalog_entries():
+    current = get_catalog()
+    item = current.items[0]
+    assert parse_callback_data(current.item_data(item)).arg == item
+    assert parse_callback_data(current.category_data(item.category)).arg == item.category
+    assert parse_callback_data(current.sweetness_data(current.sweet_levels[0])).arg == current.sweet_levels[0]
+
+def test_buttons_from_a_replaced_menu_are_stale(restore_catalog):
+    old = get_catalog()
+    old_item_data = old.item_data(old.items[0])
+    swap_catalog(MenuCatalog({"Tea": {"Jasmine": 1.0}}, ["Normal"]))
+    assert parse_callback_data(old_item_data).kind == "stale_menu"
+    new = get_catalog()
+    assert parse_callback_data(new.item_data(new.items[0])).arg.name == "Jasmine"
+
+@pytest.mark.parametrize("data, valid", [
+    ("done_all", True), ("done_3fa9c1_42", True), ("done_42", True),
+    ("done_", False), ("done_3FA9C1_42", False), ("done_3fa9c1", False), ("done_a_b_42", False),
+    ("pay_card", False), ("sales_year", False), ("store_", False), ("nonsense", False),
+])
+def test_prefixed_payloads_are_validated(data, valid):
+    assert (parse_callback_data(data) is not None) == valid
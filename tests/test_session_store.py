@@ -0,0 +1,41 @@
+import asyncio
+from config import OrderItem
+from session_store import SessionStore
+
+class UnreachableBackend:
+    """A cart backend whose database is down"""
+
+    def __init__(self):
+        self.saved = []
+
+    async def open(self):
+        pass
+
+    async def load(self, user_id):
+        raise ConnectionError("database is down")
+
+    async def save(self, upserts, deletes):
+        raise ConnectionError("database is down")
+
+    async def purge(self, older_than):
+        raise ConnectionError("database is down")
+
+    async def close(self):
+        pass
+
+def test_start_with_an_unreachable_backend_keeps_carts_in_memory():
+    async def scenario():
+        store = SessionStore(backend=UnreachableBackend(), flush_interval=3600)
+        await store.start()
+        try:
+            order = await store.get(42)
+            order.add_item(OrderItem("Coffee", "Latte", "50%", 2.5))
+            store.mark_dirty(42)
+            await store.flush()
+            # The failed write stays pending and the cart is still served from memory
+            assert 42 in store._pending
+            assert (await store.get(42)).items == order.items
+        finally:
+            await store.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,46 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from config import OrderItem, UserOrder
+from handlers import callback_handlers
+from handlers.router import parse_callback_data
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = {"edits": [], "orders": [], "owner": []}
+
+    async def edit_message_text(query, text, **kwargs):
+        calls["edits"].append(text)
+
+    def submit(**kwargs):
+        calls["orders"].append(kwargs)
+
+    monkeypatch.setattr(callback_handlers, "edit_message_text", edit_message_text)
+    monkeypatch.setattr(callback_handlers.order_writer, "submit", submit)
+    monkeypatch.setattr(callback_handlers, "notify_owner", lambda context, order: calls["owner"].append(order))
+    monkeypatch.setattr(callback_handlers.owner_feed, "add", lambda *args: SimpleNamespace(args=args))
+    return calls
+
+def _query():
+    user = SimpleNamespace(id=42, username="alice", full_name="Alice")
+    return SimpleNamespace(from_user=user, message=SimpleNamespace(photo=None))
+
+@pytest.mark.parametrize("data", ["pay_cash", "pay_aba", "confirm_order"])
+def test_stale_checkout_on_an_empty_cart_is_rejected(calls, data):
+    action = parse_callback_data(data)
+    handler = {"pay": callback_handlers.handle_payment,
+               "confirm_order": callback_handlers.handle_confirm_order}[action.kind]
+    asyncio.run(handler(_query(), SimpleNamespace(bot=None), action, UserOrder()))
+
+    assert not calls["orders"] and not calls["owner"]
+    assert calls["edits"] == ["That selection is no longer available. Please choose a category:"]
+
+def test_payment_with_items_places_one_order(calls):
+    order = UserOrder()
+    order.add_item(OrderItem("Coffee", "Latte", "50%", 2.5))
+    asyncio.run(callback_handlers.handle_payment(_query(), SimpleNamespace(bot=None),
+                                                 parse_callback_data("pay_cash"), order))
+
+    assert len(calls["orders"]) == len(calls["owner"]) == 1
+    assert calls["orders"][0]["total_amount"] == 2.5
+    assert not order.items
@@ -0,0 +1,69 @@
+import asyncio
+import random
+from telegram import CallbackQuery, Update, User
+from update_processor import PerUserUpdateProcessor
+
+USERS = 1000
+TAPS_PER_USER = 20
+MAX_CONCURRENT = 64
+
+def _tap(update_id: int, user_id: int) -> Update:
+    return Update(update_id, callback_query=CallbackQuery(str(update_id), User(user_id, "user", False), "chat"))
+
+def test_stress_per_user_order_and_global_limit():
+    """20,000 callbacks from 1,000 users: per-user serial and in order, bounded overall"""
+    processor = PerUserUpdateProcessor(MAX_CONCURRENT)
+    rng = random.Random(9)
+    seen = {user_id: [] for user_id in range(USERS)}
+    active_users = set()
+    stats = {"overlaps": 0, "running": 0, "peak": 0}
+
+    async def handle(user_id: int, seq: int):
+        if user_id in active_users:
+            stats["overlaps"] += 1
+        active_users.add(user_id)
+        stats["running"] += 1
+        stats["peak"] = max(stats["peak"], stats["running"])
+        # A handler awaits a few times (cart load, outbound send) before it finishes
+        for _ in range(rng.randint(0, 3)):
+            await asyncio.sleep(0)
+        seen[user_id].append(seq)
+        stats["running"] -= 1
+        active_users.discard(user_id)
+
+    async def run():
+        # Interleave users the way a lunch rush arrives
+        arrivals = [(user_id, seq) for seq in range(TAPS_PER_USER) for user_id in range(USERS)]
+        tasks = [
+            asyncio.create_task(processor.process_update(_tap(index, user_id), handle(user_id, seq)))
+            for index, (user_id, seq) in enumerate(arrivals)
+        ]
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+
+    assert stats["overlaps"] == 0
+    assert all(taps == list(range(TAPS_PER_USER)) for taps in seen.values())
+    # Users ran in parallel, but never more than the processor allows
+    assert 1 < stats["peak"] <= MAX_CONCURRENT
+    assert processor._user_locks == {}
+
+def test_slow_user_does_not_block_others():
+    processor = PerUserUpdateProcessor(4)
+    finished = []
+
+    async def handle(name: str, delay: float):
+        await asyncio.sleep(delay)
+        finished.append(name)
+
+    async def run():
+        slow = [asyncio.create_task(processor.process_update(_tap(i, 1), handle(f"slow{i}", 0.05)))
+                for i in range(3)]
+        await asyncio.sleep(0)
+        fast = asyncio.create_task(processor.process_update(_tap(10, 2), handle("fast", 0)))
+        await asyncio.wait_for(fast, timeout=0.04)
+        await asyncio.gather(*slow)
+
+    asyncio.run(run())
+    assert finished[0] == "fast"
+    assert finished[1:] == ["slow0", "slow1", "slow2"]
@@ -0,0 +1,59 @@
+from typing import Awaitable, Dict, Hashable, Optional
+import asyncio
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+import metrics
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Process updates concurrently, but one at a time and in arrival order per user.
+
+    Each user gets a lock that is held while their update runs, so two taps
+    from the same user can never interleave on their shared UserOrder, while
+    other users keep being served. The global slot (max_concurrent_updates)
+    is only taken once the user's lock is held, so a user with a backlog of
+    taps does not tie up slots that other users could use.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # key -> [lock, number of updates holding or waiting for it]
+        self._user_locks: Dict[Hashable, list] = {}
+
+    @staticmethod
+    def _key(update: object) -> Optional[Hashable]:
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user is not None:
+            return update.effective_user.id
+        if update.effective_chat is not None:
+            return ("chat", update.effective_chat.id)
+        return None
+
+    async def process_update(self, update: object, coroutine: Awaitable):
+        key = self._key(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+
+        # Taking the lock is the first await, so arrival order is lock order
+        entry = self._user_locks.get(key)
+        if entry is None:
+            entry = self._user_locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        metrics.set_gauge('updates.active_users', len(self._user_locks))
+        try:
+            async with entry[0]:
+                await super().process_update(update, coroutine)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._user_locks[key]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable):
+        await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
@@ -0,0 +1,103 @@
+"""In-process HTTP server for Telegram webhooks and health checks.
+
+One tornado server runs on the bot's own event loop. It always serves
+/health, /ready and /metrics, and in webhook mode it also receives updates
+from Telegram on WEBHOOK_PATH. Webhook requests must carry the secret token
+registered with Telegram; without WEBHOOK_SECRET a random one is generated
+at startup, so the endpoint is never open to forged updates.
+"""
+import asyncio
+import hmac
+import json
+import secrets
+import signal
+from typing import Optional
+import tornado.web
+from tornado.httpserver import HTTPServer
+from telegram import Update
+from telegram.ext import Application
+from config import logger, PORT, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET
+from health_check import HealthCheckHandler, ReadinessHandler, MetricsHandler
+import metrics
+
+# Registered with set_webhook; Telegram sends it back on every update
+_webhook_secret = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+
+class TelegramWebhookHandler(tornado.web.RequestHandler):
+    """Accept an update from Telegram and hand it to the application's update queue"""
+
+    def initialize(self, bot_app: Application):
+        self.bot_app = bot_app
+
+    async def post(self):
+        token = self.request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not hmac.compare_digest(token.encode(), _webhook_secret.encode()):
+            metrics.increment('webhook.rejected')
+            raise tornado.web.HTTPError(403)
+        try:
+            update = Update.de_json(json.loads(self.request.body), self.bot_app.bot)
+        except Exception as e:
+            logger.warning(f"Rejected malformed webhook payload: {str(e)}")
+            raise tornado.web.HTTPError(400)
+
+        metrics.increment('webhook.updates')
+        await self.bot_app.update_queue.put(update)
+        self.set_status(200)
+
+_server: Optional[HTTPServer] = None
+
+def start_http_server(bot_app: Application, webhook: bool):
+    """Start serving on PORT from the running event loop"""
+    global _server
+    routes = [
+        (r"/health", HealthCheckHandler),
+        (r"/ready", ReadinessHandler, {"bot_app": bot_app}),
+        (r"/metrics", MetricsHandler),
+    ]
+    if webhook:
+        routes.append((WEBHOOK_PATH, TelegramWebhookHandler, {"bot_app": bot_app}))
+
+    _server = HTTPServer(tornado.web.Application(routes))
+    _server.listen(PORT)
+    logger.info(f"HTTP server listening on port {PORT} ({'webhook' if webhook else 'health only'})")
+
+async def stop_http_server():
+    global _server
+    if _server is None:
+        return
+    _server.stop()
+    await _server.close_all_connections()
+    _server = None
+
+async def run_webhook(bot_app: Application):
+    """Run the bot in webhook mode until SIGINT/SIGTERM, mirroring run_polling's lifecycle hooks"""
+    if not WEBHOOK_URL:
+        raise ValueError("WEBHOOK_URL must be set when BOT_MODE=webhook")
+    if not WEBHOOK_SECRET:
+        logger.info("WEBHOOK_SECRET is not set, using a random secret token for this run")
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    await bot_app.initialize()
+    if bot_app.post_init:
+        await bot_app.post_init(bot_app)
+    try:
+        await bot_app.bot.set_webhook(
+            url=f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+            secret_token=_webhook_secret,
+            allowed_updates=Update.ALL_TYPES
+        )
+        await bot_app.start()
+        logger.info("Bot is running in webhook mode")
+        await stop_event.wait()
+    finally:
+        if bot_app.running:
+            await bot_app.stop()
+        if bot_app.post_stop:
+            await bot_app.post_stop(bot_app)
+        await bot_app.shutdown()
+        if bot_app.post_shutdown:
+            await bot_app.post_shutdown(bot_app)